@@ -41,6 +41,9 @@ target_metadata = [Base.metadata]
 def include_object(object, name, type_, reflected, compare_to):
     if type_ == "table" and object.schema != "ccs" and object.schema != None:
         return False
+    # Staging/previous copies of Reconciliation managed by swap publishing
+    if type_ == "table" and name.endswith(("_staging", "_previous", "_retired")):
+        return False
     return True
 
 
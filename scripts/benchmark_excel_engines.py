@@ -0,0 +1,238 @@
+"""
+Benchmark of the spreadsheet engines FileReadersService can read workbooks with.
+
+Generates workbooks shaped like the Inflair recon report and the Promeus invoice
+report and parses each with every installed engine, in a fresh process per run,
+reporting parse time and peak resident memory.
+
+    python scripts/benchmark_excel_engines.py --rows 200000
+
+Set CCS_EXCEL_ENGINE to the engine to use per deployment from these numbers.
+"""
+
+import argparse
+import multiprocessing
+import os
+import queue
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from openpyxl import Workbook  # noqa: E402
+
+from common.stage_metrics import peak_rss_mb  # noqa: E402
+from services.ccs_file_readers_service import calamine_available  # noqa: E402
+
+INFLAIR_RECON_COLUMNS = [
+    "Facility",
+    "Flt Date",
+    "Flt No.",
+    "Flt Inv",
+    "Class",
+    "Item Group",
+    "Item code",
+    "Item Desc",
+    "A/L Bill Code",
+    "A/L Bill Desc",
+    "Bill Catg",
+    "Unit",
+    "PAX",
+    "Qty",
+    "Unit Price",
+    "Total Amount",
+]
+
+PROMEUS_INVOICE_COLUMNS = [
+    "SUPPLIER",
+    "FLIGHT DATE",
+    "FLIGHT NO.",
+    "DEP",
+    "ARR",
+    "CLASS",
+    "INVOICED PAX",
+    "SERVICE CODE",
+    "SUPPLIER CODE",
+    "SERVICE DESCRIPTION",
+    "AIRCRAFT",
+    "QTY",
+    "UNIT PRICE",
+    "SUBTOTAL",
+    "TAX",
+    "TOTAL INC TAX",
+    "CURRENCY",
+    "ITEM STATUS",
+    "INVOICE STATUS",
+    "INVOICE DATE",
+    "PAID DATE",
+]
+
+
+def write_inflair_recon(path, rows):
+    """Title rows, the "Facility" header and rows, as the recon report export"""
+    random.seed(1)
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(["Airline Billing Recon Report"])
+    sheet.append([])
+    sheet.append(INFLAIR_RECON_COLUMNS)
+    first_date = date(2024, 1, 1)
+    for row in range(rows):
+        qty = random.randint(1, 200)
+        price = round(random.uniform(0.5, 40), 3)
+        flight_date = first_date + timedelta(days=row % 365)
+        sheet.append(
+            [
+                "LIS",
+                flight_date.strftime("%d/%m/%Y"),
+                random.randint(1, 999),
+                f"INV{row // 40:07d}",
+                random.choice(["Y", "C", "W"]),
+                "MEALS",
+                f"IT{random.randint(1, 500):04d}",
+                "Hot meal with dessert",
+                f"BC{random.randint(1, 80):03d}",
+                "Meal service",
+                "F",
+                "EA",
+                random.randint(20, 300),
+                qty,
+                price,
+                round(qty * price, 2),
+            ]
+        )
+    sheet.append(["Total"])
+    sheet.append(["Printed"])
+    workbook.save(path)
+
+
+def write_promeus_invoice(path, rows):
+    """Header row and rows, as the Promeus invoice history export"""
+    random.seed(2)
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(PROMEUS_INVOICE_COLUMNS)
+    first_date = date(2024, 1, 1)
+    for row in range(rows):
+        qty = random.randint(1, 200)
+        price = round(random.uniform(0.5, 40), 3)
+        subtotal = round(qty * price, 2)
+        flight_date = first_date + timedelta(days=row % 365)
+        sheet.append(
+            [
+                "Inflair",
+                flight_date,
+                f"TP{random.randint(1, 999):04d}",
+                "LIS",
+                random.choice(["OPO", "FAO", "MAD", "LHR"]),
+                random.choice(["Y", "C"]),
+                random.randint(20, 300),
+                f"BC{random.randint(1, 80):03d}",
+                f"S{random.randint(1, 99):03d}",
+                "Meal service",
+                "A320",
+                qty,
+                price,
+                subtotal,
+                round(subtotal * 0.06, 2),
+                round(subtotal * 1.06, 2),
+                "EUR",
+                "Open",
+                "Issued",
+                flight_date + timedelta(days=30),
+                None,
+            ]
+        )
+    workbook.save(path)
+
+
+WORKBOOKS = {
+    "inflair_recon": (write_inflair_recon, {"header": None}),
+    "promeus_invoice": (write_promeus_invoice, {"header": 0}),
+}
+
+
+def _parse(path, engine, read_kwargs, results):
+    """Put (seconds, peak RSS growth in MB, rows, error) of one parse on results"""
+    try:
+        import pandas as pd
+
+        baseline = peak_rss_mb()
+        started = time.perf_counter()
+        df = pd.read_excel(path, engine=engine, **read_kwargs)
+        seconds = time.perf_counter() - started
+        results.put((seconds, peak_rss_mb() - baseline, len(df), None))
+    except Exception as e:
+        results.put((None, None, None, f"{type(e).__name__}: {e}"))
+
+
+def measure(path, engine, read_kwargs):
+    """
+    (seconds, peak RSS growth in MB, rows, error) of one parse in a fresh
+    process; error is None unless the parse raised or the process died
+    """
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    process = context.Process(target=_parse, args=(path, engine, read_kwargs, results))
+    process.start()
+    while True:
+        try:
+            result = results.get(timeout=1)
+            break
+        except queue.Empty:
+            if process.is_alive():
+                continue
+        # The process is gone; a result it put just before exiting may
+        # still be in transit
+        try:
+            result = results.get(timeout=1)
+        except queue.Empty:
+            result = (None, None, None, f"exited with code {process.exitcode}")
+        break
+    process.join()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--engines",
+        nargs="+",
+        default=["openpyxl"] + (["calamine"] if calamine_available() else []),
+    )
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        print(
+            f"{'workbook':<18}{'engine':<12}{'MB':>8}{'rows':>10}{'s':>10}{'RSS MB':>10}"
+        )
+        for name, (write, read_kwargs) in WORKBOOKS.items():
+            path = os.path.join(directory, f"{name}.xlsx")
+            write(path, args.rows)
+            size_mb = os.path.getsize(path) / (1024 * 1024)
+            for engine in args.engines:
+                runs = []
+                for _ in range(args.repeat):
+                    runs.append(measure(path, engine, read_kwargs))
+                    if runs[-1][3] is not None:
+                        break
+                if runs[-1][3] is not None:
+                    print(
+                        f"{name:<18}{engine:<12}{size_mb:>8.1f}  failed: {runs[-1][3]}"
+                    )
+                    continue
+                seconds = min(run[0] for run in runs)
+                peak_mb = max(run[1] for run in runs)
+                print(
+                    f"{name:<18}{engine:<12}{size_mb:>8.1f}{runs[0][2]:>10}"
+                    f"{seconds:>10.2f}{peak_mb:>10.1f}"
+                )
+
+
+if __name__ == "__main__":
+    main()
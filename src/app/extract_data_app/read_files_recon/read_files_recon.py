@@ -1,8 +1,12 @@
 import json
 import os
 
+from common.advisory_lock import advisory_lock
 from common.conexao_banco import get_session
+from common.output_store import flatten_records, write_records
 from common.s3 import get_file_body_by_key
+from common.stage_metrics import StageMetrics
+from repositories.ccs_repository import IngestionManifestRepository
 from services.ccs_file_readers_service import FileReadersService
 
 READER_FUNCTIONS = {
@@ -12,6 +16,7 @@ READER_FUNCTIONS = {
     "pricing_read_promeus_with_flight_classes": "pricing_read_promeus_with_flight_classes",
     "read_flight_class_mapping": "read_flight_class_mapping",
     "read_flight_number_mapping": "read_flight_number_mapping",
+    "read_flight_mappings": "read_flight_mappings",
 }
 
 PREFIX_TO_PROCESSOR = {
@@ -19,8 +24,23 @@ PREFIX_TO_PROCESSOR = {
     "public/airline_files/GCG Invoice History/": "billing_promeus_invoice_report",
     "public/airline_files/FlightClassMapping/": "read_flight_class_mapping",
     "public/airline_files/FlightNumberMapping/": "read_flight_number_mapping",
+    "public/airline_files/FlightMappings/": "read_flight_mappings",
 }
 
+# Readers that only build records (to_dict) when asked to
+RECORD_ON_REQUEST_READERS = {
+    "billing_inflair_recon_report",
+    "billing_promeus_invoice_report",
+}
+
+# When set ("s3://bucket/prefix" or a local directory), the records read are
+# written there and the response points to them; it never carries the data
+OUTPUT_LOCATION_ENV = "READ_FILES_OUTPUT_LOCATION"
+# "jsonl" (gzipped JSON Lines, the default) or "parquet"
+OUTPUT_FORMAT_ENV = "READ_FILES_OUTPUT_FORMAT"
+# "1" also stores the per-stage metrics of each file on its manifest entry
+PERSIST_METRICS_ENV = "READ_FILES_PERSIST_METRICS"
+
 
 def main(event, context):
     print("event object", event)
@@ -60,53 +80,189 @@ def main(event, context):
         f"Using processor: {processor_function_name}, " f"method: {reader_method_name}"
     )
 
-    file, size = get_file_body_by_key(key, bucket)
-    file_content = file.read()
-    print(f"File size: {size} bytes")
+    etag = event["detail"]["object"].get("etag")
+
+    # Duplicate deliveries of the same object are no-ops: a concurrent one
+    # finds the file lock taken, a later one finds the version in the manifest
+    with get_session() as lock_session:
+        with advisory_lock(
+            lock_session.get_bind(), f"read_files_recon:{bucket}/{key}", wait=False
+        ) as acquired:
+            if not acquired:
+                print(f"File {key} is already being processed, skipping")
+                return {
+                    "statusCode": 200,
+                    "body": json.dumps(
+                        {
+                            "message": "File is already being processed",
+                            "processor_used": processor_function_name,
+                            "skipped": True,
+                        }
+                    ),
+                }
+
+            manifest_repository = IngestionManifestRepository(lock_session)
+            processed = manifest_repository.get_completed(bucket, key, etag)
+            if processed is not None:
+                print(f"File {key} ({etag}) was already processed, skipping")
+                return {
+                    "statusCode": 200,
+                    "body": json.dumps(
+                        {
+                            "message": "File already processed",
+                            "processor_used": processed.Processor,
+                            "records_count": processed.RecordsCount,
+                            "skipped": True,
+                        }
+                    ),
+                }
+
+            manifest_entry = manifest_repository.start(
+                bucket, key, etag, processor_function_name
+            )
+            manifest_id = manifest_entry.Id
+            metrics = StageMetrics()
+            persist_metrics = os.getenv(PERSIST_METRICS_ENV) == "1"
+            try:
+                response, records_count, error = _process_file(
+                    key,
+                    bucket,
+                    processor_function_name,
+                    reader_method_name,
+                    manifest_id,
+                    metrics,
+                )
+            except Exception as e:
+                _log_metrics(key, bucket, processor_function_name, manifest_id, metrics)
+                manifest_repository.fail(
+                    manifest_entry,
+                    str(e),
+                    metrics.as_dict() if persist_metrics else None,
+                )
+                raise
+
+            _log_metrics(
+                key,
+                bucket,
+                processor_function_name,
+                manifest_id,
+                metrics,
+                records_count=records_count,
+                error=error,
+            )
+            stored_metrics = metrics.as_dict() if persist_metrics else None
+            if error is None:
+                manifest_repository.finish(
+                    manifest_entry, records_count, stored_metrics
+                )
+            else:
+                manifest_repository.fail(manifest_entry, error, stored_metrics)
+            return response
+
+
+def _log_metrics(
+    key, bucket, processor, manifest_id, metrics, records_count=None, error=None
+):
+    """One structured log line with the per-stage metrics of a file"""
+    print(
+        json.dumps(
+            {
+                "event": "read_files_recon.metrics",
+                "bucket": bucket,
+                "key": key,
+                "processor": processor,
+                "manifest_id": str(manifest_id),
+                "records_count": records_count,
+                "error": error,
+                "stages": metrics.as_dict(),
+            }
+        )
+    )
+
+
+def _process_file(
+    key, bucket, processor_function_name, reader_method_name, manifest_id, metrics
+):
+    """
+    Download and read one file; returns (response, records count, error).
+
+    The response only summarizes the read (counts, timings, rejected dates
+    and the manifest Id); with OUTPUT_LOCATION_ENV set the records are
+    written there and the response carries a pointer to them.
+    """
+    output_location = os.getenv(OUTPUT_LOCATION_ENV)
 
-    temp_dir = "/tmp"
-    temp_file_path = os.path.join(temp_dir, f"temp_{os.path.basename(key)}")
+    with metrics.stage("download"):
+        file, size = get_file_body_by_key(key, bucket)
+        file_content = file.read()
+        print(f"File size: {size} bytes")
 
-    with open(temp_file_path, "wb") as temp_file:
-        temp_file.write(file_content)
+        temp_dir = "/tmp"
+        temp_file_path = os.path.join(temp_dir, f"temp_{os.path.basename(key)}")
+
+        with open(temp_file_path, "wb") as temp_file:
+            temp_file.write(file_content)
+    metrics.count("download", bytes=size)
 
     try:
-        with get_session() as session:
-            file_reader_service = FileReadersService(session)
-            reader_method = getattr(file_reader_service, reader_method_name)
-            data = reader_method(temp_file_path)
+        # The whole reader call; the invoice readers also break it down
+        # into parse, normalize, write, dedup and commit
+        with metrics.stage("read"):
+            with get_session() as session:
+                file_reader_service = FileReadersService(session, metrics=metrics)
+                reader_method = getattr(file_reader_service, reader_method_name)
+                if reader_method_name in RECORD_ON_REQUEST_READERS:
+                    data = reader_method(
+                        temp_file_path, return_records=output_location is not None
+                    )
+                else:
+                    data = reader_method(temp_file_path)
 
         os.unlink(temp_file_path)
 
-        if isinstance(data, list):
-            serialized_data = data
-            records_count = len(data)
-        elif isinstance(data, dict):
-            serialized_data = {class_name: items for class_name, items in data.items()}
-            records_count = sum(len(items) for items in data.values())
+        records = None
+        if isinstance(data, (list, dict)):
+            records = flatten_records(data)
+            records_count = len(records)
+        elif isinstance(data, int):
+            # Streamed files only report how many records were loaded
+            records_count = data
         else:
-            serialized_data = str(data)
             records_count = 0
 
-        return {
+        output = None
+        if output_location and records is not None:
+            with metrics.stage("output", rows=len(records)):
+                output = write_records(
+                    records,
+                    output_location,
+                    str(manifest_id),
+                    os.getenv(OUTPUT_FORMAT_ENV, "jsonl"),
+                )
+
+        response = {
             "statusCode": 200,
             "body": json.dumps(
                 {
                     "message": "File read successfully",
                     "processor_used": processor_function_name,
-                    "data": serialized_data,
+                    "manifest_id": str(manifest_id),
                     "records_count": records_count,
-                },
-                default=str,
+                    "rejected_dates": file_reader_service.rejected_dates,
+                    "timings": metrics.timings(),
+                    "output": output,
+                }
             ),
         }
+        return response, records_count, None
     except Exception as e:
         if os.path.exists(temp_file_path):
             os.unlink(temp_file_path)
 
-        return {
+        response = {
             "statusCode": 500,
             "body": json.dumps(
                 {"error": str(e), "processor_attempted": processor_function_name}
             ),
         }
+        return response, None, str(e)
@@ -4,14 +4,15 @@ from flask_authorize import Authorize
 from flask_parameter_validation import Route, ValidateParameters
 
 from common.authorization import get_current_user
-from common.conexao_banco import get_session
 from common.custom_exception import CustomException
 from common.error_handling import flask_parameter_validation_handler
+from common.request_session import get_request_session, init_request_session
 
 # Application-Specific Services
 from services.recon_annotation_service import ReconAnnotationService
 
 app = Flask(__name__)
+init_request_session(app)
 authorize = Authorize(current_user=get_current_user, app=app)
 
 ROUTE_PREFIX = "/api/annotations"
@@ -21,89 +22,132 @@ ROUTE_PREFIX = "/api/annotations"
 @authorize.in_group("admin")
 @ValidateParameters(flask_parameter_validation_handler)
 def create_annotation():
-    with get_session() as session:
-        try:
-            data = request.get_json()
-
-            if not data:
-                return (
-                    jsonify(
-                        {
-                            "success": False,
-                            "error": "Request body is required",
-                            "data": None,
-                        }
-                    ),
-                    400,
-                )
-            reconciliation_id = data.get("reconciliation_id")
-            if not reconciliation_id:
-                return (
-                    jsonify(
-                        {
-                            "success": False,
-                            "error": "Field 'reconciliation_id' is required "
-                            "and cannot be empty",
-                            "data": None,
-                        }
-                    ),
-                    400,
-                )
-            if len(reconciliation_id) < 30 or len(reconciliation_id) > 60:
-                return (
-                    jsonify(
-                        {
-                            "success": False,
-                            "error": "Field 'reconciliation_id' must be "
-                            "between 30 and 60 characters",
-                            "data": None,
-                        }
-                    ),
-                    400,
-                )
-            annotation_text = data.get("annotation")
-            if not annotation_text:
-                return (
-                    jsonify(
-                        {
-                            "success": False,
-                            "error": "Field 'annotation' is required and "
-                            "cannot be empty",
-                            "data": None,
-                        }
-                    ),
-                    400,
-                )
-
-            status = data.get("status")
-
-            annotation_service = ReconAnnotationService(session)
-            result = annotation_service.create_annotation(
-                reconciliation_id=reconciliation_id,
-                annotation_text=annotation_text,
-                status=status,
+    session = get_request_session()
+    try:
+        data = request.get_json()
+
+        if not data:
+            return (
+                jsonify(
+                    {
+                        "success": False,
+                        "error": "Request body is required",
+                        "data": None,
+                    }
+                ),
+                400,
+            )
+        reconciliation_id = data.get("reconciliation_id")
+        if not reconciliation_id:
+            return (
+                jsonify(
+                    {
+                        "success": False,
+                        "error": "Field 'reconciliation_id' is required "
+                        "and cannot be empty",
+                        "data": None,
+                    }
+                ),
+                400,
+            )
+        if len(reconciliation_id) < 30 or len(reconciliation_id) > 60:
+            return (
+                jsonify(
+                    {
+                        "success": False,
+                        "error": "Field 'reconciliation_id' must be "
+                        "between 30 and 60 characters",
+                        "data": None,
+                    }
+                ),
+                400,
+            )
+        annotation_text = data.get("annotation")
+        if not annotation_text:
+            return (
+                jsonify(
+                    {
+                        "success": False,
+                        "error": "Field 'annotation' is required and "
+                        "cannot be empty",
+                        "data": None,
+                    }
+                ),
+                400,
             )
 
-            if result["success"]:
-                return jsonify(result), 201
-            else:
-                status_code = 404 if "not found" in result["error"].lower() else 400
-                return jsonify(result), status_code
+        status = data.get("status")
+
+        annotation_service = ReconAnnotationService(session)
+        result = annotation_service.create_annotation(
+            reconciliation_id=reconciliation_id,
+            annotation_text=annotation_text,
+            status=status,
+        )
+
+        if result["success"]:
+            return jsonify(result), 201
+        else:
+            status_code = 404 if "not found" in result["error"].lower() else 400
+            return jsonify(result), status_code
+
+    except CustomException as e:
+        return jsonify({"success": False, "error": str(e), "data": None}), 400
+    except Exception as e:
+        return (
+            jsonify(
+                {
+                    "success": False,
+                    "error": f"Internal server error: {str(e)}",
+                    "data": None,
+                }
+            ),
+            500,
+        )
+
+
+@app.route(ROUTE_PREFIX + "/bulk", methods=["POST"])
+@authorize.in_group("admin")
+@ValidateParameters(flask_parameter_validation_handler)
+def bulk_save_annotations():
+    session = get_request_session()
+    try:
+        data = request.get_json()
 
-        except CustomException as e:
-            return jsonify({"success": False, "error": str(e), "data": None}), 400
-        except Exception as e:
+        if not data:
             return (
                 jsonify(
                     {
                         "success": False,
-                        "error": f"Internal server error: {str(e)}",
+                        "error": "Request body is required",
                         "data": None,
                     }
                 ),
-                500,
+                400,
             )
 
+        annotation_service = ReconAnnotationService(session)
+        result = annotation_service.bulk_save_annotations(data.get("items"))
+
+        if result["success"]:
+            return jsonify(result), 200
+        else:
+            return jsonify(result), 400
+
+    except CustomException as e:
+        return jsonify({"success": False, "error": str(e), "data": None}), 400
+    except Exception as e:
+        return (
+            jsonify(
+                {
+                    "success": False,
+                    "error": f"Internal server error: {str(e)}",
+                    "data": None,
+                }
+            ),
+            500,
+        )
+
 
 @app.route(
     ROUTE_PREFIX + "/by-reconciliation/<string:reconciliation_id>", methods=["GET"]
@@ -113,33 +157,80 @@ def create_annotation():
 def get_annotations_by_reconciliation(
     reconciliation_id: str = Route(min_str_length=30, max_str_length=60)
 ):
-    with get_session() as session:
-        try:
-            annotation_service = ReconAnnotationService(session)
-            result = annotation_service.get_annotations_by_reconciliation_id(
-                reconciliation_id
-            )
-
-            if result["success"]:
-                return jsonify(result), 200
-            else:
-                status_code = 404 if "not found" in result["error"].lower() else 400
-                return jsonify(result), status_code
+    session = get_request_session()
+    try:
+        annotation_service = ReconAnnotationService(session)
+        result = annotation_service.get_annotations_by_reconciliation_id(
+            reconciliation_id
+        )
+
+        if result["success"]:
+            return jsonify(result), 200
+        else:
+            status_code = 404 if "not found" in result["error"].lower() else 400
+            return jsonify(result), status_code
+
+    except CustomException as e:
+        return jsonify({"success": False, "error": str(e), "data": None}), 400
+    except Exception as e:
+        return (
+            jsonify(
+                {
+                    "success": False,
+                    "error": f"Internal server error: {str(e)}",
+                    "data": None,
+                }
+            ),
+            500,
+        )
+
+
+@app.route(ROUTE_PREFIX + "/by-reconciliations", methods=["POST"])
+@authorize.in_group("admin")
+@ValidateParameters(flask_parameter_validation_handler)
+def get_annotations_by_reconciliations():
+    session = get_request_session()
+    try:
+        data = request.get_json()
 
-        except CustomException as e:
-            return jsonify({"success": False, "error": str(e), "data": None}), 400
-        except Exception as e:
+        if not data:
             return (
                 jsonify(
                     {
                         "success": False,
-                        "error": f"Internal server error: {str(e)}",
+                        "error": "Request body is required",
                         "data": None,
                     }
                 ),
-                500,
+                400,
             )
 
+        annotation_service = ReconAnnotationService(session)
+        result = annotation_service.get_annotations_by_reconciliation_ids(
+            data.get("reconciliation_ids"),
+            limit_per_id=data.get("limit_per_id"),
+            offset_per_id=data.get("offset_per_id", 0),
+        )
+
+        if result["success"]:
+            return jsonify(result), 200
+        else:
+            return jsonify(result), 400
+
+    except CustomException as e:
+        return jsonify({"success": False, "error": str(e), "data": None}), 400
+    except Exception as e:
+        return (
+            jsonify(
+                {
+                    "success": False,
+                    "error": f"Internal server error: {str(e)}",
+                    "data": None,
+                }
+            ),
+            500,
+        )
+
 
 @app.route(ROUTE_PREFIX + "/by-id/<string:annotation_id>", methods=["GET"])
 @authorize.in_group("admin")
@@ -147,153 +238,153 @@ def get_annotations_by_reconciliation(
 def get_annotation_by_id(
     annotation_id: str = Route(min_str_length=30, max_str_length=60)
 ):
-    with get_session() as session:
-        try:
-            annotation_service = ReconAnnotationService(session)
-            result = annotation_service.get_annotation_by_id(annotation_id)
-
-            if result["success"]:
-                return jsonify(result), 200
-            else:
-                status_code = 404 if "not found" in result["error"].lower() else 400
-                return jsonify(result), status_code
-
-        except CustomException as e:
-            return jsonify({"success": False, "error": str(e), "data": None}), 400
-        except Exception as e:
+    session = get_request_session()
+    try:
+        annotation_service = ReconAnnotationService(session)
+        result = annotation_service.get_annotation_by_id(annotation_id)
+
+        if result["success"]:
+            return jsonify(result), 200
+        else:
+            status_code = 404 if "not found" in result["error"].lower() else 400
+            return jsonify(result), status_code
+
+    except CustomException as e:
+        return jsonify({"success": False, "error": str(e), "data": None}), 400
+    except Exception as e:
+        return (
+            jsonify(
+                {
+                    "success": False,
+                    "error": f"Internal server error: {str(e)}",
+                    "data": None,
+                }
+            ),
+            500,
+        )
+
+
+@app.route(ROUTE_PREFIX, methods=["PUT"])
+@authorize.in_group("admin")
+@ValidateParameters(flask_parameter_validation_handler)
+def update_annotation():
+    session = get_request_session()
+    try:
+        data = request.get_json()
+
+        if not data:
             return (
                 jsonify(
                     {
                         "success": False,
-                        "error": f"Internal server error: {str(e)}",
+                        "error": "Request body is required",
                         "data": None,
                     }
                 ),
-                500,
+                400,
             )
-
-
-@app.route(ROUTE_PREFIX, methods=["PUT"])
-@authorize.in_group("admin")
-@ValidateParameters(flask_parameter_validation_handler)
-def update_annotation():
-    with get_session() as session:
-        try:
-            data = request.get_json()
-
-            if not data:
-                return (
-                    jsonify(
-                        {
-                            "success": False,
-                            "error": "Request body is required",
-                            "data": None,
-                        }
-                    ),
-                    400,
-                )
-            annotation_id = data.get("annotation_id")
-            if not annotation_id:
-                return (
-                    jsonify(
-                        {
-                            "success": False,
-                            "error": "Field 'annotation_id' is required and "
-                            "cannot be empty",
-                            "data": None,
-                        }
-                    ),
-                    400,
-                )
-
-            # Add validation for annotation_id length
-            if len(annotation_id) < 30 or len(annotation_id) > 60:
-                return (
-                    jsonify(
-                        {
-                            "success": False,
-                            "error": "Field 'annotation_id' must be "
-                            "between 30 and 60 characters",
-                            "data": None,
-                        }
-                    ),
-                    400,
-                )
-
-            annotation_text = data.get("annotation")
-            status = data.get("status")
-
-            if annotation_text is None and status is None:
-                return (
-                    jsonify(
-                        {
-                            "success": False,
-                            "error": "At least one field "
-                            "'annotation' or 'status' "
-                            "must be provided for update",
-                            "data": None,
-                        }
-                    ),
-                    400,
-                )
-
-            annotation_service = ReconAnnotationService(session)
-            result = annotation_service.update_annotation(
-                annotation_id=annotation_id,
-                annotation_text=annotation_text,
-                status=status,
+        annotation_id = data.get("annotation_id")
+        if not annotation_id:
+            return (
+                jsonify(
+                    {
+                        "success": False,
+                        "error": "Field 'annotation_id' is required and "
+                        "cannot be empty",
+                        "data": None,
+                    }
+                ),
+                400,
             )
 
-            if result["success"]:
-                return jsonify(result), 200
-            else:
-                status_code = 404 if "not found" in result["error"].lower() else 400
-                return jsonify(result), status_code
-
-        except CustomException as e:
-            return jsonify({"success": False, "error": str(e), "data": None}), 400
-        except Exception as e:
+        # Add validation for annotation_id length
+        if len(annotation_id) < 30 or len(annotation_id) > 60:
             return (
                 jsonify(
                     {
                         "success": False,
-                        "error": f"Internal server error: {str(e)}",
+                        "error": "Field 'annotation_id' must be "
+                        "between 30 and 60 characters",
                         "data": None,
                     }
                 ),
-                500,
+                400,
             )
 
+        annotation_text = data.get("annotation")
+        status = data.get("status")
 
-@app.route(ROUTE_PREFIX + "/<string:annotation_id>", methods=["DELETE"])
-@authorize.in_group("admin")
-@ValidateParameters(flask_parameter_validation_handler)
-def delete_annotation(annotation_id: str = Route(min_str_length=30, max_str_length=60)):
-    with get_session() as session:
-        try:
-            annotation_service = ReconAnnotationService(session)
-            result = annotation_service.delete_annotation(annotation_id)
-
-            if result["success"]:
-                return jsonify(result), 200
-            else:
-                status_code = 404 if "not found" in result["error"].lower() else 400
-                return jsonify(result), status_code
-
-        except CustomException as e:
-            return jsonify({"success": False, "error": str(e), "data": None}), 400
-        except Exception as e:
+        if annotation_text is None and status is None:
             return (
                 jsonify(
                     {
                         "success": False,
-                        "error": f"Internal server error: {str(e)}",
+                        "error": "At least one field "
+                        "'annotation' or 'status' "
+                        "must be provided for update",
                         "data": None,
                     }
                 ),
-                500,
+                400,
             )
 
+        annotation_service = ReconAnnotationService(session)
+        result = annotation_service.update_annotation(
+            annotation_id=annotation_id,
+            annotation_text=annotation_text,
+            status=status,
+        )
+
+        if result["success"]:
+            return jsonify(result), 200
+        else:
+            status_code = 404 if "not found" in result["error"].lower() else 400
+            return jsonify(result), status_code
+
+    except CustomException as e:
+        return jsonify({"success": False, "error": str(e), "data": None}), 400
+    except Exception as e:
+        return (
+            jsonify(
+                {
+                    "success": False,
+                    "error": f"Internal server error: {str(e)}",
+                    "data": None,
+                }
+            ),
+            500,
+        )
+
+
+@app.route(ROUTE_PREFIX + "/<string:annotation_id>", methods=["DELETE"])
+@authorize.in_group("admin")
+@ValidateParameters(flask_parameter_validation_handler)
+def delete_annotation(annotation_id: str = Route(min_str_length=30, max_str_length=60)):
+    session = get_request_session()
+    try:
+        annotation_service = ReconAnnotationService(session)
+        result = annotation_service.delete_annotation(annotation_id)
+
+        if result["success"]:
+            return jsonify(result), 200
+        else:
+            status_code = 404 if "not found" in result["error"].lower() else 400
+            return jsonify(result), status_code
+
+    except CustomException as e:
+        return jsonify({"success": False, "error": str(e), "data": None}), 400
+    except Exception as e:
+        return (
+            jsonify(
+                {
+                    "success": False,
+                    "error": f"Internal server error: {str(e)}",
+                    "data": None,
+                }
+            ),
+            500,
+        )
+
 
 def add_body(event):
     if "body" not in event:
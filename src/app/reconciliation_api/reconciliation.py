@@ -4,6 +4,7 @@ import sys
 from decimal import Decimal
 
 from common.conexao_banco import get_session
+from enums.status_enum import StatusEnum
 from services.reconciliation_service import ReconciliationService
 
 project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
@@ -11,6 +12,15 @@ if project_root not in sys.path:
     sys.path.insert(0, project_root)
 
 
+INVOICE_TOTAL_DIFFERENCES_ROUTE = "GET /api/reconciliation/invoice-total-differences"
+
+HEADERS = {
+    "Content-Type": "application/json",
+    "Access-Control-Allow-Origin": "*",
+    "Access-Control-Allow-Credentials": True,
+}
+
+
 class DecimalEncoder(json.JSONEncoder):
     def default(self, obj):
         if isinstance(obj, Decimal):
@@ -18,17 +28,48 @@ class DecimalEncoder(json.JSONEncoder):
         return super(DecimalEncoder, self).default(obj)
 
 
+def invoice_total_differences(limit, offset):
+    """Flight invoices with the largest absolute total differences first"""
+    with get_session() as session:
+        result = ReconciliationService(session).get_largest_invoice_total_differences(
+            limit=limit, offset=offset
+        )
+
+    if isinstance(result, tuple):
+        return {
+            "statusCode": result[1],
+            "body": json.dumps(result[0], cls=DecimalEncoder),
+            "headers": HEADERS,
+        }
+    return {
+        "statusCode": 200,
+        "body": json.dumps(result, cls=DecimalEncoder),
+        "headers": HEADERS,
+    }
+
+
 def main(event, context):
     """Lambda handler for retrieving reconciliation data with pagination"""
     try:
         query_params = event.get("queryStringParameters", {}) or {}
         limit = int(query_params.get("limit", 100))
         offset = int(query_params.get("offset", 0))
+        if event.get("routeKey") == INVOICE_TOTAL_DIFFERENCES_ROUTE:
+            return invoice_total_differences(limit, offset)
+
         filter_type = query_params.get("filter_type", "all")
         start_date = query_params.get("start_date")
         end_date = query_params.get("end_date")
         flight_number = query_params.get("flight_number")
         item_name = query_params.get("item_name")
+        review_status = query_params.get("review_status")
+        has_annotations = query_params.get("has_annotations")
+        sort_by = query_params.get("sort_by")
+        include_annotations = (
+            query_params.get("include_annotations", "true").lower() != "false"
+        )
+        if has_annotations is not None:
+            has_annotations = has_annotations.lower() == "true"
 
         valid_filter_types = [
             "all",
@@ -56,6 +97,38 @@ def main(event, context):
                 },
             }
 
+        valid_review_statuses = [status.value for status in StatusEnum]
+        if review_status is not None and review_status not in valid_review_statuses:
+            return {
+                "statusCode": 400,
+                "body": json.dumps(
+                    {
+                        "message": (
+                            f"Invalid review_status. Must be one of: "
+                            f"{', '.join(valid_review_statuses)}"
+                        )
+                    }
+                ),
+                "headers": {
+                    "Content-Type": "application/json",
+                    "Access-Control-Allow-Origin": "*",
+                    "Access-Control-Allow-Credentials": True,
+                },
+            }
+
+        if sort_by is not None and sort_by != "latest_annotation":
+            return {
+                "statusCode": 400,
+                "body": json.dumps(
+                    {"message": "Invalid sort_by. Must be: latest_annotation"}
+                ),
+                "headers": {
+                    "Content-Type": "application/json",
+                    "Access-Control-Allow-Origin": "*",
+                    "Access-Control-Allow-Credentials": True,
+                },
+            }
+
         with get_session() as session:
             result = ReconciliationService(session).get_paginated_reconciliation_data(
                 limit=limit,
@@ -65,6 +138,10 @@ def main(event, context):
                 end_date=end_date,
                 flight_number=flight_number,
                 item_name=item_name,
+                review_status=review_status,
+                has_annotations=has_annotations,
+                sort_by=sort_by,
+                include_annotations=include_annotations,
             )
 
         if (
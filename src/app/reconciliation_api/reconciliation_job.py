@@ -0,0 +1,91 @@
+import json
+import time
+
+from common.conexao_banco import get_session
+from services.reconciliation_job_service import (
+    ReconciliationJobService,
+    default_job_executor,
+)
+
+# Stop starting new shards this many seconds before the Lambda timeout and
+# re-invoke the job to continue from its checkpoint
+JOB_TIME_MARGIN_SECONDS = 60
+
+HEADERS = {
+    "Content-Type": "application/json",
+    "Access-Control-Allow-Origin": "*",
+    "Access-Control-Allow-Credentials": True,
+}
+
+
+def _response(status_code, body):
+    return {"statusCode": status_code, "body": json.dumps(body), "headers": HEADERS}
+
+
+def _service_response(result, success_status=200):
+    if result["success"]:
+        return _response(success_status, result["data"])
+    status_code = 404 if result["error"] == "Job not found" else 400
+    return _response(status_code, {"message": result["error"]})
+
+
+def run_worker(job_id, context):
+    """Async invocation: process the job until done or close to the timeout"""
+    deadline = None
+    if context is not None:
+        deadline = (
+            time.monotonic()
+            + context.get_remaining_time_in_millis() / 1000
+            - JOB_TIME_MARGIN_SECONDS
+        )
+
+    executor = default_job_executor(get_session)
+    with get_session() as session:
+        result = ReconciliationJobService(session, executor).run_job(
+            job_id, deadline=deadline
+        )
+
+    if result["success"] and not result["data"]["completed"]:
+        executor.submit(job_id)
+    return result
+
+
+def run_trigger():
+    """Scheduled invocation: start one job for the settled dirty flight dates"""
+    with get_session() as session:
+        return ReconciliationJobService(
+            session, default_job_executor(get_session)
+        ).trigger_dirty_dates()
+
+
+def main(event, context):
+    """Lambda handler for starting, resuming and polling reconciliation jobs"""
+    if "job_id" in event and "routeKey" not in event:
+        return run_worker(event["job_id"], context)
+    if event.get("action") == "trigger_dirty_dates":
+        return run_trigger()
+
+    try:
+        route_key = event.get("routeKey", "")
+        job_id = (event.get("pathParameters") or {}).get("job_id")
+
+        with get_session() as session:
+            service = ReconciliationJobService(
+                session, default_job_executor(get_session)
+            )
+
+            if route_key == "POST /api/reconciliation/jobs":
+                match_mode = (event.get("queryStringParameters") or {}).get(
+                    "match_mode"
+                )
+                return _service_response(
+                    service.start_job(match_mode=match_mode), success_status=202
+                )
+            if route_key == "POST /api/reconciliation/jobs/{job_id}/resume":
+                return _service_response(service.resume_job(job_id), success_status=202)
+            if route_key == "GET /api/reconciliation/jobs/{job_id}":
+                return _service_response(service.get_job_status(job_id))
+
+        return _response(404, {"message": "Route not found"})
+    except Exception as e:
+        return _response(500, {"message": "Internal server error", "error": str(e)})
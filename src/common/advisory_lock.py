@@ -0,0 +1,56 @@
+# Libs
+import hashlib
+import time
+from contextlib import contextmanager
+
+from sqlalchemy import func, select
+
+# Lock name shared by every writer of the Reconciliation table
+RECONCILIATION_RUN_LOCK = "reconciliation:run"
+
+
+def advisory_lock_key(name):
+    """Stable signed 64-bit PostgreSQL advisory lock key for a lock name"""
+    digest = hashlib.blake2b(name.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+
+@contextmanager
+def advisory_lock(bind, name, wait=True, timeout=None, poll_interval=1.0):
+    """
+    Hold a session-level PostgreSQL advisory lock for the duration of the
+    block and yield whether it was acquired.
+
+    The lock lives on its own connection taken from bind (an Engine, e.g.
+    session.get_bind()), so it survives the commits of the session doing the
+    work, and it is released when the block exits or the connection dies.
+
+    Args:
+        bind: Engine to take the lock connection from
+        name: Lock name, hashed to the advisory lock key
+        wait: Keep retrying until the lock is free (or timeout elapses);
+            with False a single attempt is made
+        timeout: Seconds to wait at most; None waits indefinitely
+        poll_interval: Seconds between attempts while waiting
+    """
+    key = advisory_lock_key(name)
+    deadline = time.monotonic() + timeout if timeout is not None else None
+    lock_connection = bind.connect()
+    # Autocommit so the lock connection does not sit idle in a transaction
+    connection = lock_connection.execution_options(isolation_level="AUTOCOMMIT")
+    try:
+        try_lock = select(func.pg_try_advisory_lock(key))
+        acquired = connection.execute(try_lock).scalar()
+        while not acquired and wait:
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+            time.sleep(poll_interval)
+            acquired = connection.execute(try_lock).scalar()
+
+        try:
+            yield bool(acquired)
+        finally:
+            if acquired:
+                connection.execute(select(func.pg_advisory_unlock(key)))
+    finally:
+        lock_connection.close()
@@ -6,13 +6,13 @@ from flask import g, request
 # Libs
 from sqlalchemy import and_
 
-from common.conexao_banco import session
 from common.custom_exception import CustomException
 from common.error_messages import (
     USER,
     USER_BELONGS_TO_DEACTIVATED_CUSTOMER,
     X_NOT_FOUND,
 )
+from common.request_session import get_request_session
 
 # Tables
 from models.schema_public import User
@@ -28,6 +28,7 @@ def get_current_user():
     elif "username" in jwt_decoded:
         username = jwt_decoded["username"]
 
+    session = get_request_session()
     user = (
         session.query(User)
         .filter(and_(User.Ativo, not User.Excluido, User.Username == username))
@@ -10,6 +10,13 @@ from sqlalchemy.orm import sessionmaker
 
 from .secrets_manager import get_secret
 
+# Pool sizing. Each Lambda container serves one request at a time, so a small
+# pool is enough; overflow covers the annotation API when run threaded locally.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "5"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+
 client = boto3.client("secretsmanager", region_name="us-east-1")
 
 
@@ -30,14 +37,18 @@ if SECRET_JSON is None:
 engine = db.create_engine(
     "postgresql://{}:{}@{}/postgres".format(
         SECRET_JSON["username"], SECRET_JSON["password"], SECRET_JSON["host"]
-    )
+    ),
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+    pool_recycle=DB_POOL_RECYCLE,
+    pool_pre_ping=True,
 )
-connection = engine.connect()
 
 # defining session
 Session = sessionmaker(bind=engine)
 # Do not use this object, you can have problems in postgresql.
-# Prefer to use the get_session function
+# Prefer to use the get_session function (or get_request_session in Flask apps)
 session = Session()
 
 
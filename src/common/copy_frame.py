@@ -0,0 +1,94 @@
+# Libs
+import io
+
+import pandas as pd
+from sqlalchemy import Integer
+from sqlalchemy.dialects import postgresql
+
+from common.rejects import report_rejected
+
+# Written for missing values in the COPY buffer, so empty strings stay ""
+COPY_NULL = r"\N"
+
+# Reason printed for Integer values that are not numbers
+INTEGER_REJECTED = "are not numbers and were stored as NULL"
+
+_preparer = postgresql.dialect().identifier_preparer
+
+
+def frame_to_table(df, table, column_mapping=None, rejects=None):
+    """
+    Table-shaped copy of df for copy_frame.
+
+    Columns are renamed with column_mapping and the ones the table does not
+    have are dropped. COPY bypasses the model, so Python-side column
+    defaults (Id, Ativo, Excluido) are filled in here, and Integer columns
+    are cast so that 15.0 is written as 15.
+
+    Args:
+        df: DataFrame with one row per record
+        table: SQLAlchemy Table, e.g. Model.__table__
+        column_mapping: Optional {DataFrame column: table column}
+        rejects: Optional dict that collects, per Integer column, the values
+            that are not numbers and are written as NULL, with their number
+            of occurrences; without it they are printed per column
+    """
+    df = df.rename(columns=column_mapping or {})
+    names = [column.name for column in table.columns if column.name in df.columns]
+    frame = df[names].copy()
+
+    collected = {} if rejects is None else rejects
+    for column in table.columns:
+        if column.name in frame.columns:
+            if isinstance(column.type, Integer):
+                original = frame[column.name]
+                values = pd.to_numeric(original, errors="coerce")
+                # Blank text is a missing value, not a malformed one
+                coerced = original[values.isna() & original.notna()]
+                coerced = coerced[coerced.astype(str).str.strip() != ""]
+                if len(coerced):
+                    counts = collected.setdefault(column.name, {})
+                    for value, count in coerced.value_counts().items():
+                        counts[value] = counts.get(value, 0) + int(count)
+                frame[column.name] = values.round().astype("Int64")
+        elif column.default is not None and column.default.is_scalar:
+            frame[column.name] = column.default.arg
+        elif column.default is not None and column.default.is_callable:
+            frame[column.name] = [column.default.arg(None) for _ in range(len(frame))]
+
+    if rejects is None:
+        report_rejected(_preparer.format_table(table), collected, INTEGER_REJECTED)
+    return frame
+
+
+def copy_frame(session, table, df, target=None):
+    """
+    Write the rows of df into table with PostgreSQL COPY on the session's
+    connection, inside its current transaction.
+
+    Args:
+        session: SQLAlchemy session on a psycopg2 engine
+        table: SQLAlchemy Table the columns of df belong to
+        df: Table-shaped DataFrame (see frame_to_table)
+        target: Quoted name to copy into instead of table, e.g. a temporary
+            staging table with the same columns
+
+    Returns:
+        Number of rows written
+    """
+    buffer = io.StringIO()
+    df.to_csv(buffer, index=False, header=False, na_rep=COPY_NULL)
+    buffer.seek(0)
+
+    columns = ", ".join(_preparer.quote(name) for name in df.columns)
+    target = target or _preparer.format_table(table)
+    cursor = session.connection().connection.cursor()
+    try:
+        cursor.copy_expert(
+            f"COPY {target} ({columns}) FROM STDIN "
+            f"WITH (FORMAT csv, NULL '{COPY_NULL}')",
+            buffer,
+        )
+    finally:
+        cursor.close()
+    return len(df)
@@ -0,0 +1,70 @@
+# Libs
+import gzip
+import json
+import os
+import tempfile
+
+import pandas as pd
+
+from common.s3 import upload_file
+
+OUTPUT_FORMATS = {"jsonl": ".jsonl.gz", "parquet": ".parquet"}
+
+
+def flatten_records(data):
+    """
+    Records of reader output: lists are returned as they are, and the lists
+    of a dict (e.g. price book classes) get their dict key as "group"
+    """
+    if isinstance(data, dict):
+        return [
+            {"group": name, **item} for name, items in data.items() for item in items
+        ]
+    return list(data)
+
+
+def _write(records, path, output_format):
+    if output_format == "parquet":
+        # Needs pyarrow (or fastparquet) in the deployment image
+        pd.DataFrame(records).to_parquet(path, index=False)
+        return
+    with gzip.open(path, "wt", encoding="utf-8") as output:
+        for record in records:
+            output.write(json.dumps(record, default=str))
+            output.write("\n")
+
+
+def write_records(records, location, name, output_format="jsonl"):
+    """
+    Write records as gzipped JSON Lines or Parquet and return a pointer to
+    them instead of the records themselves.
+
+    Args:
+        records: List of dicts
+        location: "s3://bucket/prefix" or a local directory (a stand-in for
+            S3 on local runs)
+        name: File name without extension, e.g. the manifest Id
+        output_format: "jsonl" or "parquet"
+
+    Returns:
+        Dictionary with "location", "format" and "records"
+    """
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Unsupported output format: {output_format}")
+    file_name = name + OUTPUT_FORMATS[output_format]
+
+    if location.startswith("s3://"):
+        bucket, _, prefix = location[len("s3://") :].partition("/")
+        key = "/".join(part for part in (prefix.strip("/"), file_name) if part)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, file_name)
+            _write(records, path, output_format)
+            with open(path, "rb") as body:
+                upload_file(key, bucket, body)
+        pointer = f"s3://{bucket}/{key}"
+    else:
+        os.makedirs(location, exist_ok=True)
+        pointer = os.path.join(location, file_name)
+        _write(records, pointer, output_format)
+
+    return {"location": pointer, "format": output_format, "records": len(records)}
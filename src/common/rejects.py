@@ -0,0 +1,25 @@
+# Libs
+
+
+def report_rejected(source, rejects_by_column, reason):
+    """
+    Print one summary line per column with rejected values and return the
+    number of rejected values of those columns.
+
+    Args:
+        source: Reader or table the values come from, printed first
+        rejects_by_column: {column: {rejected value: occurrences}}
+        reason: What happened to the values, e.g. "could not be parsed as
+            dates"
+    """
+    counts = {}
+    for column, rejects in rejects_by_column.items():
+        if not rejects:
+            continue
+        counts[column] = sum(rejects.values())
+        examples = ", ".join(repr(value) for value in list(rejects)[:5])
+        print(
+            f"{source}: {counts[column]} {column} values {reason} "
+            f"({len(rejects)} distinct, e.g. {examples})"
+        )
+    return counts
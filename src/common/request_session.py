@@ -0,0 +1,49 @@
+# Libs
+from flask import g
+
+from .conexao_banco import Session
+
+
+def get_request_session():
+    """
+    Return the session bound to the current Flask request, creating it on
+    first use. Every caller in the same request (authorization, routes,
+    services) shares this session and therefore a single transaction.
+    """
+    if "db_session" not in g:
+        g.db_session = Session()
+    return g.db_session
+
+
+def _commit_request_session(response):
+    db_session = g.get("db_session")
+    if db_session is None:
+        return response
+
+    if response.status_code < 400:
+        db_session.commit()
+    else:
+        db_session.rollback()
+    return response
+
+
+def _close_request_session(exception=None):
+    db_session = g.pop("db_session", None)
+    if db_session is None:
+        return
+
+    try:
+        if exception is not None:
+            db_session.rollback()
+    finally:
+        db_session.close()
+
+
+def init_request_session(app):
+    """
+    Register the request-scoped session lifecycle on a Flask app: one commit
+    for successful responses, rollback for error responses or unhandled
+    exceptions, and the connection always returned to the pool.
+    """
+    app.after_request(_commit_request_session)
+    app.teardown_request(_close_request_session)
@@ -0,0 +1,89 @@
+# Libs
+import os
+import resource
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+# "1" traces Python allocations per stage with tracemalloc; it slows reads
+# down noticeably, so it is meant for investigating a regression
+TRACEMALLOC_ENV = "CCS_TRACEMALLOC"
+
+_EXHAUSTED = object()
+
+
+def peak_rss_mb():
+    """High-water mark of the resident memory of this process, in MB"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+class StageMetrics:
+    """
+    Wall time, rows, bytes and memory per stage of reading one file.
+
+    A stage that runs more than once (e.g. once per streamed batch) adds up
+    its seconds, rows and bytes and keeps the highest memory figures.
+    """
+
+    def __init__(self, trace_memory=None):
+        if trace_memory is None:
+            trace_memory = os.getenv(TRACEMALLOC_ENV) == "1"
+        self.trace_memory = trace_memory
+        self.stages = {}
+
+    @contextmanager
+    def stage(self, name, rows=None, bytes=None):
+        """
+        Measure the block as stage name; rows and bytes can be given here
+        or added inside the block with count()
+        """
+        if self.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            elif hasattr(tracemalloc, "reset_peak"):
+                tracemalloc.reset_peak()
+        started = time.perf_counter()
+        try:
+            yield self
+        finally:
+            seconds = time.perf_counter() - started
+            self.count(name, rows=rows, bytes=bytes, seconds=seconds)
+            metrics = self.stages[name]
+            metrics["peak_rss_mb"] = round(
+                max(metrics.get("peak_rss_mb", 0), peak_rss_mb()), 1
+            )
+            if self.trace_memory:
+                traced_mb = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+                metrics["traced_peak_mb"] = round(
+                    max(metrics.get("traced_peak_mb", 0), traced_mb), 1
+                )
+
+    def count(self, name, rows=None, bytes=None, seconds=None):
+        """Add rows, bytes or seconds to stage name"""
+        metrics = self.stages.setdefault(name, {"seconds": 0.0})
+        if seconds is not None:
+            metrics["seconds"] = round(metrics["seconds"] + seconds, 3)
+        if rows is not None:
+            metrics["rows"] = metrics.get("rows", 0) + int(rows)
+        if bytes is not None:
+            metrics["bytes"] = metrics.get("bytes", 0) + int(bytes)
+
+    def iterate(self, name, items):
+        """Yield from items, timing each step as stage name"""
+        items = iter(items)
+        while True:
+            with self.stage(name):
+                item = next(items, _EXHAUSTED)
+            if item is _EXHAUSTED:
+                return
+            yield item
+
+    def timings(self):
+        """Seconds per stage"""
+        return {name: metrics["seconds"] for name, metrics in self.stages.items()}
+
+    def as_dict(self):
+        return {name: dict(metrics) for name, metrics in self.stages.items()}
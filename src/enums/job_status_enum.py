@@ -0,0 +1,9 @@
+# Services
+from enum import Enum
+
+
+class JobStatusEnum(Enum):
+    PENDING = "PENDING"
+    RUNNING = "RUNNING"
+    SUCCEEDED = "SUCCEEDED"
+    FAILED = "FAILED"
@@ -1,5 +1,6 @@
 from sqlalchemy import (
     DECIMAL,
+    JSON,
     TIMESTAMP,
     Boolean,
     Column,
@@ -7,6 +8,7 @@ from sqlalchemy import (
     DateTime,
     Enum,
     ForeignKey,
+    Index,
     Integer,
     String,
     func,
@@ -18,8 +20,10 @@ from sqlalchemy.orm import relationship
 from .base import Base
 
 try:
+    from src.enums.job_status_enum import JobStatusEnum
     from src.enums.status_enum import StatusEnum
 except ImportError:
+    from enums.job_status_enum import JobStatusEnum
     from enums.status_enum import StatusEnum
 
 import uuid
@@ -183,7 +187,16 @@ class AirCompanyInvoiceReport(Base):
 
 class Reconciliation(Base):
     __tablename__ = "Reconciliation"
-    __table_args__ = {"schema": "ccs", "extend_existing": True}
+    __table_args__ = (
+        Index(
+            "ix_Reconciliation_LatestStatus_LatestAnnotationAt",
+            "LatestStatus",
+            "LatestAnnotationAt",
+        ),
+        Index("ix_Reconciliation_AirFlightDate", "AirFlightDate"),
+        Index("ix_Reconciliation_CatFltDate", "CatFltDate"),
+        {"schema": "ccs", "extend_existing": True},
+    )
 
     Id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     DataCriacao = Column(DateTime, nullable=False, server_default=func.now())
@@ -241,6 +254,14 @@ class Reconciliation(Base):
     AmountDif = Column(String)
     QtyDif = Column(String)
 
+    # Hash of the Air*/Cat*/difference columns, used for diff-based writes
+    RowHash = Column(String(32))
+
+    # Annotation summary, maintained by ReconAnnotationRepository
+    AnnotationCount = Column(Integer, nullable=False, default=0, server_default="0")
+    LatestStatus = Column(Enum(StatusEnum), nullable=True)
+    LatestAnnotationAt = Column(TIMESTAMP, nullable=True)
+
     Annotations = relationship(
         "ReconAnnotation",
         back_populates="Reconciliation",
@@ -248,9 +269,13 @@ class Reconciliation(Base):
         order_by="ReconAnnotation.DataCriacao",
     )
 
-    def serialize(self):
-        """Return object data in easily serializable format"""
-        return {
+    def serialize(self, include_annotations=True):
+        """Return object data in easily serializable format
+
+        include_annotations=False skips loading the Annotations relationship;
+        AnnotationCount/LatestStatus already summarize it.
+        """
+        data = {
             "Id": str(self.Id),
             "DataCriacao": str(self.DataCriacao) if self.DataCriacao else None,
             "DataAtualizacao": (
@@ -302,10 +327,17 @@ class Reconciliation(Base):
             "DifPrice": self.DifPrice,
             "AmountDif": self.AmountDif,
             "QtyDif": self.QtyDif,
-            "Annotations": (
-                [a.serialize() for a in self.Annotations] if self.Annotations else []
+            "AnnotationCount": self.AnnotationCount,
+            "LatestStatus": self.LatestStatus.value if self.LatestStatus else None,
+            "LatestAnnotationAt": (
+                str(self.LatestAnnotationAt) if self.LatestAnnotationAt else None
             ),
         }
+        if include_annotations:
+            data["Annotations"] = (
+                [a.serialize() for a in self.Annotations] if self.Annotations else []
+            )
+        return data
 
 
 class FlightNumberMapping(Base):
@@ -379,7 +411,14 @@ class FlightClassMapping(Base):
 
 class ReconAnnotation(Base):
     __tablename__ = "ReconAnnotation"
-    __table_args__ = {"schema": "ccs"}
+    __table_args__ = (
+        Index(
+            "ix_ReconAnnotation_ReconciliationId_DataCriacao",
+            "ReconciliationId",
+            "DataCriacao",
+        ),
+        {"schema": "ccs"},
+    )
 
     Id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     DataCriacao = Column(
@@ -406,17 +445,140 @@ class ReconAnnotation(Base):
         return {c.name: str(getattr(self, c.name)) for c in self.__table__.columns}
 
 
+class ReconciliationJob(Base):
+    __tablename__ = "ReconciliationJob"
+    __table_args__ = {"schema": "ccs"}
+
+    Id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    DataCriacao = Column(
+        TIMESTAMP, nullable=False, server_default=text("CURRENT_TIMESTAMP")
+    )
+    DataAtualizacao = Column(TIMESTAMP)
+    Ativo = Column(Boolean, nullable=False, default=True)
+    Excluido = Column(Boolean, nullable=False, default=False)
+
+    Status = Column(Enum(JobStatusEnum), nullable=False, default=JobStatusEnum.PENDING)
+    # False for jobs limited to given flight dates, which skip the final sweep
+    FullRun = Column(Boolean, nullable=False, default=True, server_default="true")
+    # "line" or "flight", see ReconciliationService.populate_reconciliation_table
+    MatchMode = Column(String, nullable=False, default="line", server_default="line")
+    # Flight dates to process (ISO strings, null for undated rows), fixed when
+    # the job starts so a resumed run walks the same shards
+    Shards = Column(JSON)
+    ProcessedShards = Column(Integer, nullable=False, default=0)
+    PhaseTimings = Column(JSON)
+    Summary = Column(JSON)
+    Error = Column(String)
+    StartedAt = Column(TIMESTAMP)
+    FinishedAt = Column(TIMESTAMP)
+
+    def serialize(self):
+        total_shards = len(self.Shards) if self.Shards is not None else None
+        processed_shards = self.ProcessedShards or 0
+        return {
+            "Id": str(self.Id),
+            "Status": self.Status.value if self.Status else None,
+            "MatchMode": self.MatchMode,
+            "TotalShards": total_shards,
+            "ProcessedShards": processed_shards,
+            "Checkpoint": (
+                self.Shards[processed_shards - 1]
+                if total_shards and processed_shards
+                else None
+            ),
+            "PhaseTimings": self.PhaseTimings or {},
+            "Summary": self.Summary or {},
+            "Error": self.Error,
+            "DataCriacao": str(self.DataCriacao),
+            "StartedAt": str(self.StartedAt) if self.StartedAt else None,
+            "FinishedAt": str(self.FinishedAt) if self.FinishedAt else None,
+        }
+
+
+class ReconciliationDirtyDate(Base):
+    """Flight dates whose source rows changed since the last reconciliation"""
+
+    __tablename__ = "ReconciliationDirtyDate"
+    __table_args__ = {"schema": "ccs"}
+
+    FlightDate = Column(Date, primary_key=True)
+    # First time the date was marked since it was last reconciled
+    DataCriacao = Column(
+        TIMESTAMP, nullable=False, server_default=text("CURRENT_TIMESTAMP")
+    )
+    # Latest time the date was marked
+    DataAtualizacao = Column(
+        TIMESTAMP, nullable=False, server_default=text("CURRENT_TIMESTAMP")
+    )
+
+
+class IngestionManifest(Base):
+    """One row per ingested S3 object version (bucket, key, ETag)"""
+
+    __tablename__ = "IngestionManifest"
+    __table_args__ = (
+        Index(
+            "ix_IngestionManifest_Bucket_Key_ETag", "Bucket", "Key", "ETag", unique=True
+        ),
+        {"schema": "ccs"},
+    )
+
+    Id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    DataCriacao = Column(
+        TIMESTAMP, nullable=False, server_default=text("CURRENT_TIMESTAMP")
+    )
+    DataAtualizacao = Column(TIMESTAMP)
+    Ativo = Column(Boolean, nullable=False, default=True)
+    Excluido = Column(Boolean, nullable=False, default=False)
+
+    Bucket = Column(String, nullable=False)
+    Key = Column(String, nullable=False)
+    ETag = Column(String)
+    Processor = Column(String)
+    Status = Column(Enum(StatusEnum), nullable=False, default=StatusEnum.PROCESSING)
+    RecordsCount = Column(Integer)
+    Error = Column(String)
+    # Per-stage time, rows and memory of the read (see StageMetrics)
+    Metrics = Column(JSON)
+
+    def serialize(self):
+        return {c.name: str(getattr(self, c.name)) for c in self.__table__.columns}
+
+
 # Stub models for missing classes used in ccs_repository.py
 # These need to be properly implemented based on the actual database schema
 class BillingInvoiceTotalDifference(Base):
     __tablename__ = "BillingInvoiceTotalDifference"
-    __table_args__ = {"schema": "ccs"}
+    __table_args__ = (
+        Index(
+            "ix_BillingInvoiceTotalDifference_AbsAmountDifference",
+            "AbsAmountDifference",
+        ),
+        {"schema": "ccs"},
+    )
 
     Id = Column(Integer, primary_key=True, autoincrement=True)
     CreatedAt = Column(TIMESTAMP, server_default=func.now())
     UpdatedAt = Column(TIMESTAMP, server_default=func.now(), onupdate=func.now())
     Excluido = Column(Boolean, nullable=False, default=False)
 
+    # One row per flight: the Inflair flight invoice(s) against the Promeus
+    # lines of the same date and flight number (digits only, mapped through
+    # FlightNumberMapping)
+    FlightDate = Column(Date, nullable=True)
+    FlightNumber = Column(String, nullable=True)
+    FltInv = Column(String, nullable=True)
+    AirQty = Column(Integer, nullable=False, default=0)
+    CatQty = Column(Integer, nullable=False, default=0)
+    AirAmount = Column(DECIMAL(15, 2), nullable=False, default=0)
+    CatAmount = Column(DECIMAL(15, 2), nullable=False, default=0)
+    QtyDifference = Column(Integer, nullable=False, default=0)
+    AmountDifference = Column(DECIMAL(15, 2), nullable=False, default=0)
+    AbsAmountDifference = Column(DECIMAL(15, 2), nullable=False, default=0)
+
+    def serialize(self):
+        return {c.name: str(getattr(self, c.name)) for c in self.__table__.columns}
+
 
 class Configuration(Base):
     __tablename__ = "Configuration"
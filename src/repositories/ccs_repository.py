@@ -5,11 +5,14 @@ from datetime import date, datetime
 from decimal import Decimal
 from typing import Dict, List
 
-from sqlalchemy import func
+from sqlalchemy import func, text
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.orm import Session
 
 # Application-Specific Common Utilities
+from common.copy_frame import copy_frame, frame_to_table
 from common.custom_exception import CustomException
+from common.stage_metrics import StageMetrics
 
 # Tables
 from models.schema_ccs import (
@@ -20,15 +23,41 @@ from models.schema_ccs import (
     DataSource,
     Flight,
     FlightDate,
+    IngestionManifest,
     InvoiceHistory,
     PriceReport,
     Reconciliation,
+    ReconciliationDirtyDate,
+    StatusEnum,
 )
 from repositories.repository import Repository
 
 logging.basicConfig(level=os.environ.get("LOG_LEVEL", "INFO"))
 logger = logging.getLogger()
 
+# Inflair recon reader columns -> CateringInvoiceReport columns
+CATERING_INVOICE_COLUMNS = {
+    "facility": "Facility",
+    "flt_date": "FltDate",
+    "flt_no": "FltNo",
+    "flt_inv": "FltInv",
+    "class_": "Class",
+    "item_group": "ItemGroup",
+    "itemcode": "Itemcode",
+    "item_desc": "ItemDesc",
+    "al_bill_code": "AlBillCode",
+    "al_bill_desc": "AlBillDesc",
+    "bill_catg": "BillCatg",
+    "unit": "Unit",
+    "pax": "Pax",
+    "qty": "Qty",
+    "unit_price": "UnitPrice",
+    "total_amount": "TotalAmount",
+}
+
+# Rows of AirCompanyInvoiceReport with the same values here are duplicates
+AIR_COMPANY_INVOICE_KEY = ["FlightNo", "FlightDate", "ServiceCode"]
+
 
 class FlightRepository(Repository):
     def __init__(self, db_session):
@@ -536,6 +565,34 @@ class CateringInvoiceRepository(Repository):
             print(f"Error during bulk insert: {e}")
             raise e
 
+    def insert_frame(self, df, metrics=None, commit=True, rejects=None):
+        """
+        Insert the rows of an Inflair recon reader DataFrame with COPY,
+        without building CateringInvoiceReport instances; metrics
+        (StageMetrics) gets the "write" and "commit" stages. With
+        commit=False the caller commits, e.g. once for all batches of a file.
+        rejects collects the Integer values stored as NULL (see
+        frame_to_table).
+        """
+        metrics = metrics or StageMetrics()
+        frame = frame_to_table(
+            df, CateringInvoiceReport.__table__, CATERING_INVOICE_COLUMNS, rejects
+        )
+        try:
+            with metrics.stage("write", rows=len(frame)):
+                inserted = copy_frame(
+                    self.session, CateringInvoiceReport.__table__, frame
+                )
+            if commit:
+                with metrics.stage("commit"):
+                    self.session.commit()
+            print(f"Successfully copied {inserted} records")
+            return inserted
+        except Exception as e:
+            self.session.rollback()
+            print(f"Error during copy: {e}")
+            raise e
+
     def delete_billing_recon(self, id):
         billing_recon = (
             self.session.query(CateringInvoiceReport)
@@ -761,6 +818,74 @@ class AirCompanyInvoiceRepository(Repository):
         print(f"Inserted {inserted_count} new ERP invoice reports")
         return True
 
+    def insert_new_frame(self, df, metrics=None, commit=True, rejects=None):
+        """
+        Insert the rows of a Promeus invoice reader DataFrame that are not
+        in the table yet, with the semantics of insert_air_company_invoice:
+        a row is skipped when an active row (or an earlier row of df) has
+        the same AIR_COMPANY_INVOICE_KEY values.
+
+        The rows are copied into a temporary staging table and inserted
+        with one INSERT ... SELECT instead of one query per row. metrics
+        (StageMetrics) gets the "write", "dedup" and "commit" stages. With
+        commit=False the caller commits; rows inserted by earlier calls in
+        the same transaction count as existing. rejects collects the Integer
+        values stored as NULL (see frame_to_table).
+
+        Returns:
+            Number of rows inserted
+        """
+        metrics = metrics or StageMetrics()
+        table = AirCompanyInvoiceReport.__table__
+        df = df.assign(
+            **{key: None for key in AIR_COMPANY_INVOICE_KEY if key not in df.columns}
+        )
+        frame = frame_to_table(df, table, rejects=rejects)
+        frame["RowNumber"] = range(len(frame))
+
+        columns = ", ".join(f'"{name}"' for name in frame.columns[:-1])
+        key = ", ".join(f'"{name}"' for name in AIR_COMPANY_INVOICE_KEY)
+        same_key = " AND ".join(
+            f'target."{name}" IS NOT DISTINCT FROM stage."{name}"'
+            for name in AIR_COMPANY_INVOICE_KEY
+        )
+        try:
+            with metrics.stage("write", rows=len(frame)):
+                self.session.execute(
+                    text(
+                        'CREATE TEMPORARY TABLE "AirCompanyInvoiceStage" '
+                        f'AS SELECT {columns}, 0 AS "RowNumber" '
+                        'FROM ccs."AirCompanyInvoiceReport" WITH NO DATA'
+                    )
+                )
+                copy_frame(
+                    self.session, table, frame, target='"AirCompanyInvoiceStage"'
+                )
+            with metrics.stage("dedup"):
+                result = self.session.execute(
+                    text(
+                        f'INSERT INTO ccs."AirCompanyInvoiceReport" ({columns}) '
+                        f"SELECT {columns} FROM ("
+                        f"SELECT DISTINCT ON ({key}) * "
+                        f'FROM "AirCompanyInvoiceStage" ORDER BY {key}, "RowNumber"'
+                        ") AS stage WHERE NOT EXISTS ("
+                        'SELECT 1 FROM ccs."AirCompanyInvoiceReport" AS target '
+                        f'WHERE {same_key} AND target."Excluido" IS FALSE)'
+                    )
+                )
+                self.session.execute(text('DROP TABLE "AirCompanyInvoiceStage"'))
+            metrics.count("dedup", rows=result.rowcount)
+            if commit:
+                with metrics.stage("commit"):
+                    self.session.commit()
+        except Exception as e:
+            self.session.rollback()
+            print(f"Error during copy: {e}")
+            raise e
+
+        print(f"Inserted {result.rowcount} new ERP invoice reports")
+        return result.rowcount
+
     def delete_erp_invoice(self, id):
         erp_invoice = (
             self.session.query(AirCompanyInvoiceReport)
@@ -821,6 +946,22 @@ class ReconciliationRepository:
         """Get total count of reconciliation records"""
         return self.session.query(Reconciliation).count()
 
+    def get_existing_ids(self, ids):
+        """Return the subset of the given ids that are active reconciliation
+        records, resolved with a single IN query"""
+        if not ids:
+            return set()
+        rows = (
+            self.session.query(Reconciliation.Id)
+            .filter(
+                Reconciliation.Id.in_(ids),
+                Reconciliation.Ativo.is_(True),
+                Reconciliation.Excluido.is_(False),
+            )
+            .all()
+        )
+        return {row.Id for row in rows}
+
     def get_by_date_range(self, start_date, end_date, limit=None, offset=None):
         """Get reconciliation records filtered by FLIGHT DATE range"""
         air_query = self.session.query(Reconciliation).filter(
@@ -1517,6 +1658,23 @@ class FlightClassMappingRepository:
             print(f"Error processing flight class mapping data: {e}")
             raise
 
+    def replace_all(self, model_instances):
+        """
+        Replace every flight class mapping record with model_instances.
+        Does not commit, so the caller can replace both mapping tables
+        in one transaction.
+
+        Parameters
+        ----------
+        model_instances : List[FlightClassMapping]
+            List of FlightClassMapping model instances to keep
+        """
+        from models.schema_ccs import FlightClassMapping
+
+        self.session.query(FlightClassMapping).delete(synchronize_session=False)
+        self.session.add_all(model_instances)
+        self.session.flush()
+
     def clear_all(self):
         """Clear all flight class mapping records"""
         try:
@@ -1581,6 +1739,23 @@ class FlightNumberMappingRepository:
             print(f"Error processing flight number mapping data: {e}")
             raise
 
+    def replace_all(self, model_instances):
+        """
+        Replace every flight number mapping record with model_instances.
+        Does not commit, so the caller can replace both mapping tables
+        in one transaction.
+
+        Parameters
+        ----------
+        model_instances : List[FlightNumberMapping]
+            List of FlightNumberMapping model instances to keep
+        """
+        from models.schema_ccs import FlightNumberMapping
+
+        self.session.query(FlightNumberMapping).delete(synchronize_session=False)
+        self.session.add_all(model_instances)
+        self.session.flush()
+
     def clear_all(self):
         """Clear all flight number mapping records"""
         try:
@@ -1627,3 +1802,108 @@ class BillingInvoiceTotalDifferenceRepository:
             self.session.rollback()
             print(f"Error adding record: {e}")
             raise
+
+
+class ReconciliationDirtyDateRepository:
+    def __init__(self, session: Session):
+        self.session = session
+
+    def mark_dates(self, flight_dates):
+        """
+        Record flight dates whose source rows changed, for the debounced
+        reconciliation trigger. Re-marking a date only moves its
+        DataAtualizacao forward.
+        """
+        flight_dates = sorted({d for d in flight_dates if d is not None})
+        if not flight_dates:
+            return 0
+
+        try:
+            statement = insert(ReconciliationDirtyDate).values(
+                [{"FlightDate": flight_date} for flight_date in flight_dates]
+            )
+            self.session.execute(
+                statement.on_conflict_do_update(
+                    index_elements=[ReconciliationDirtyDate.FlightDate],
+                    set_={"DataAtualizacao": func.now()},
+                )
+            )
+            self.session.commit()
+            return len(flight_dates)
+        except Exception as e:
+            self.session.rollback()
+            print(f"Error marking reconciliation dirty dates: {e}")
+            raise
+
+
+class IngestionManifestRepository:
+    def __init__(self, session: Session):
+        self.session = session
+
+    def get_completed(self, bucket, key, etag):
+        """Manifest entry of an object version that was already ingested"""
+        if etag is None:
+            return None
+        return (
+            self.session.query(IngestionManifest)
+            .filter(
+                IngestionManifest.Bucket == bucket,
+                IngestionManifest.Key == key,
+                IngestionManifest.ETag == etag,
+                IngestionManifest.Status == StatusEnum.COMPLETED,
+                IngestionManifest.Excluido.is_(False),
+            )
+            .first()
+        )
+
+    def start(self, bucket, key, etag, processor):
+        """Record that an object version is being ingested"""
+        try:
+            entry = None
+            if etag is not None:
+                entry = (
+                    self.session.query(IngestionManifest)
+                    .filter(
+                        IngestionManifest.Bucket == bucket,
+                        IngestionManifest.Key == key,
+                        IngestionManifest.ETag == etag,
+                    )
+                    .first()
+                )
+            if entry is None:
+                entry = IngestionManifest(Bucket=bucket, Key=key, ETag=etag)
+                self.session.add(entry)
+            entry.Processor = processor
+            entry.Status = StatusEnum.PROCESSING
+            entry.Error = None
+            entry.DataAtualizacao = datetime.now()
+            self.session.commit()
+            return entry
+        except Exception as e:
+            self.session.rollback()
+            print(f"Error recording ingestion start: {e}")
+            raise
+
+    def finish(self, entry, records_count, metrics=None):
+        """Mark an ingestion as completed"""
+        self._set_status(
+            entry, StatusEnum.COMPLETED, records_count=records_count, metrics=metrics
+        )
+
+    def fail(self, entry, error, metrics=None):
+        """Mark an ingestion as failed so a redelivery processes it again"""
+        self._set_status(entry, StatusEnum.FAIL, error=error, metrics=metrics)
+
+    def _set_status(self, entry, status, records_count=None, error=None, metrics=None):
+        try:
+            entry.Status = status
+            entry.RecordsCount = records_count
+            entry.Error = error
+            if metrics is not None:
+                entry.Metrics = metrics
+            entry.DataAtualizacao = datetime.now()
+            self.session.commit()
+        except Exception as e:
+            self.session.rollback()
+            print(f"Error recording ingestion status: {e}")
+            raise
@@ -1,20 +1,88 @@
 import logging
 import uuid
 from datetime import datetime
-from typing import List, Optional
+from typing import Any, Dict, List, Optional, Set
 
-from sqlalchemy.orm import Session
+from sqlalchemy import String, bindparam, func, insert, select, update
+from sqlalchemy.orm import Session, aliased
 
 from enums.status_enum import StatusEnum
-from models.schema_ccs import ReconAnnotation
+from models.schema_ccs import ReconAnnotation, Reconciliation
 
 
 class ReconAnnotationRepository:
-    """Repository for ReconAnnotation model operations"""
+    """
+    Repository for ReconAnnotation model operations
+
+    Writes are only flushed; the caller owns the transaction (see
+    common.request_session) so a request costs a single commit.
+    """
 
     def __init__(self, db_session: Session):
         self.db_session = db_session
 
+    def refresh_reconciliation_summaries(
+        self, reconciliation_ids: List[uuid.UUID]
+    ) -> None:
+        """
+        Recompute AnnotationCount, LatestStatus and LatestAnnotationAt on the
+        given reconciliation rows from their active annotations.
+
+        Annotation writes run this after flushing their INSERT/UPDATE of
+        ReconAnnotation, whose foreign key already holds FOR KEY SHARE on
+        the reconciliation rows. The rows are therefore locked FOR NO KEY
+        UPDATE, which does not conflict with KEY SHARE (FOR UPDATE would, and
+        two writers on one reconciliation would deadlock), but does conflict
+        with itself: concurrent writers queue here, and since the recount is
+        a separate statement it runs on a fresh snapshot that includes the
+        annotation of the writer that went first.
+
+        Args:
+            reconciliation_ids: UUIDs of the reconciliation items to refresh
+        """
+        reconciliation_ids = sorted(set(reconciliation_ids))
+        if not reconciliation_ids:
+            return
+
+        try:
+            self.db_session.execute(
+                select(Reconciliation.Id)
+                .where(Reconciliation.Id.in_(reconciliation_ids))
+                .order_by(Reconciliation.Id)
+                .with_for_update(key_share=True)
+            )
+
+            reconciliation = Reconciliation.__table__
+            active = (
+                (ReconAnnotation.ReconciliationId == reconciliation.c.Id)
+                & ReconAnnotation.Ativo.is_(True)
+                & ReconAnnotation.Excluido.is_(False)
+            )
+            activity_at = func.coalesce(
+                ReconAnnotation.DataAtualizacao, ReconAnnotation.DataCriacao
+            )
+
+            self.db_session.execute(
+                update(reconciliation)
+                .where(reconciliation.c.Id.in_(reconciliation_ids))
+                .values(
+                    AnnotationCount=select(func.count(ReconAnnotation.Id))
+                    .where(active)
+                    .scalar_subquery(),
+                    LatestStatus=select(ReconAnnotation.Status)
+                    .where(active)
+                    .order_by(activity_at.desc())
+                    .limit(1)
+                    .scalar_subquery(),
+                    LatestAnnotationAt=select(func.max(activity_at))
+                    .where(active)
+                    .scalar_subquery(),
+                )
+            )
+        except Exception as e:
+            logging.error(f"Error refreshing reconciliation summaries: {str(e)}")
+            raise
+
     def create(
         self,
         reconciliation_id: uuid.UUID,
@@ -55,16 +123,140 @@ class ReconAnnotationRepository:
             new_annotation.DataAtualizacao = updated_at
 
             self.db_session.add(new_annotation)
-            self.db_session.commit()
-            self.db_session.refresh(new_annotation)
+            self.db_session.flush()
+            self.refresh_reconciliation_summaries([reconciliation_id])
 
             logging.info(f"Created annotation {new_annotation.Id} at {created_at}")
             return new_annotation
         except Exception as e:
-            self.db_session.rollback()
             logging.error(f"Error creating annotation: {str(e)}")
             raise
 
+    def bulk_create(self, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Create many annotations with a single multi-row INSERT
+
+        Args:
+            rows: Dictionaries with reconciliation_id, annotation and status
+
+        Returns:
+            The inserted column values, in the same order as rows
+        """
+        if not rows:
+            return []
+
+        try:
+            current_time = datetime.utcnow()
+            values = [
+                {
+                    "Id": uuid.uuid4(),
+                    "DataCriacao": current_time,
+                    "DataAtualizacao": current_time,
+                    "Ativo": True,
+                    "Excluido": False,
+                    "ReconciliationId": row["reconciliation_id"],
+                    "Annotation": row["annotation"],
+                    "Status": row.get("status"),
+                }
+                for row in rows
+            ]
+
+            self.db_session.execute(insert(ReconAnnotation.__table__).values(values))
+            self.refresh_reconciliation_summaries(
+                [value["ReconciliationId"] for value in values]
+            )
+
+            logging.info(f"Bulk created {len(values)} annotations at {current_time}")
+            return values
+        except Exception as e:
+            logging.error(f"Error bulk creating annotations: {str(e)}")
+            raise
+
+    def bulk_update(self, rows: List[Dict[str, Any]]) -> datetime:
+        """
+        Update many annotations with one executemany UPDATE. Fields left as
+        None keep their current value.
+
+        Args:
+            rows: Dictionaries with annotation_id, annotation and status
+
+        Returns:
+            The DataAtualizacao applied to the updated rows
+        """
+        updated_at = datetime.utcnow()
+        if not rows:
+            return updated_at
+
+        try:
+            table = ReconAnnotation.__table__
+            statement = (
+                update(table)
+                .where(table.c.Id == bindparam("b_id"))
+                .values(
+                    Annotation=func.coalesce(
+                        bindparam("b_annotation", type_=String), table.c.Annotation
+                    ),
+                    Status=func.coalesce(
+                        bindparam("b_status", type_=table.c.Status.type),
+                        table.c.Status,
+                    ),
+                    DataAtualizacao=updated_at,
+                )
+            )
+            self.db_session.execute(
+                statement,
+                [
+                    {
+                        "b_id": row["annotation_id"],
+                        "b_annotation": row.get("annotation"),
+                        "b_status": row.get("status"),
+                    }
+                    for row in rows
+                ],
+            )
+
+            reconciliation_ids = [
+                row.ReconciliationId
+                for row in self.db_session.query(ReconAnnotation.ReconciliationId)
+                .filter(ReconAnnotation.Id.in_([row["annotation_id"] for row in rows]))
+                .distinct()
+            ]
+            self.refresh_reconciliation_summaries(reconciliation_ids)
+
+            logging.info(f"Bulk updated {len(rows)} annotations at {updated_at}")
+            return updated_at
+        except Exception as e:
+            logging.error(f"Error bulk updating annotations: {str(e)}")
+            raise
+
+    def get_existing_ids(self, annotation_ids: List[uuid.UUID]) -> Set[uuid.UUID]:
+        """
+        Get which of the given annotation IDs exist and are active
+
+        Args:
+            annotation_ids: UUIDs of the annotations
+
+        Returns:
+            Set of the UUIDs found
+        """
+        if not annotation_ids:
+            return set()
+
+        try:
+            rows = (
+                self.db_session.query(ReconAnnotation.Id)
+                .filter(
+                    ReconAnnotation.Id.in_(annotation_ids),
+                    ReconAnnotation.Ativo.is_(True),
+                    ReconAnnotation.Excluido.is_(False),
+                )
+                .all()
+            )
+            return {row.Id for row in rows}
+        except Exception as e:
+            logging.error(f"Error getting existing annotation IDs: {str(e)}")
+            raise
+
     def get_by_id(self, annotation_id: uuid.UUID) -> Optional[ReconAnnotation]:
         """
         Get an annotation by its ID
@@ -118,6 +310,76 @@ class ReconAnnotationRepository:
             logging.error(f"Error getting annotations by reconciliation ID: {str(e)}")
             raise
 
+    def get_by_reconciliation_ids(
+        self,
+        reconciliation_ids: List[uuid.UUID],
+        limit_per_id: Optional[int] = None,
+        offset_per_id: int = 0,
+    ) -> Dict[uuid.UUID, Dict[str, Any]]:
+        """
+        Get the annotations of many reconciliation items with a single query
+        on the (ReconciliationId, DataCriacao) index. Per-ID pagination and
+        totals are computed with window functions in the same query.
+
+        Args:
+            reconciliation_ids: UUIDs of the reconciliation items
+            limit_per_id: Optional maximum annotations returned per item
+            offset_per_id: Annotations to skip per item (newest first)
+
+        Returns:
+            Dictionary keyed by every requested UUID with the page of
+            ReconAnnotation objects and the item's total_count (reported as
+            0 when the requested page is past the item's last annotation)
+        """
+        grouped = {
+            reconciliation_id: {"annotations": [], "total_count": 0}
+            for reconciliation_id in reconciliation_ids
+        }
+        if not reconciliation_ids:
+            return grouped
+
+        try:
+            ranked = (
+                self.db_session.query(
+                    ReconAnnotation,
+                    func.row_number()
+                    .over(
+                        partition_by=ReconAnnotation.ReconciliationId,
+                        order_by=ReconAnnotation.DataCriacao.desc(),
+                    )
+                    .label("row_number"),
+                    func.count()
+                    .over(partition_by=ReconAnnotation.ReconciliationId)
+                    .label("total_count"),
+                )
+                .filter(
+                    ReconAnnotation.ReconciliationId.in_(reconciliation_ids),
+                    ReconAnnotation.Ativo.is_(True),
+                    ReconAnnotation.Excluido.is_(False),
+                )
+                .subquery()
+            )
+            annotation = aliased(ReconAnnotation, ranked)
+
+            query = self.db_session.query(annotation, ranked.c.total_count)
+            if offset_per_id:
+                query = query.filter(ranked.c.row_number > offset_per_id)
+            if limit_per_id is not None:
+                query = query.filter(
+                    ranked.c.row_number <= offset_per_id + limit_per_id
+                )
+            query = query.order_by(ranked.c.ReconciliationId, ranked.c.row_number)
+
+            for annotation_obj, total_count in query.all():
+                group = grouped[annotation_obj.ReconciliationId]
+                group["annotations"].append(annotation_obj)
+                group["total_count"] = total_count
+
+            return grouped
+        except Exception as e:
+            logging.error(f"Error getting annotations by reconciliation IDs: {str(e)}")
+            raise
+
     def update(
         self,
         annotation_id: uuid.UUID,
@@ -156,13 +418,12 @@ class ReconAnnotationRepository:
             # Always update the DataAtualizacao timestamp (only update, don't touch DataCriacao)
             annotation_obj.DataAtualizacao = updated_at
 
-            self.db_session.commit()
-            self.db_session.refresh(annotation_obj)
+            self.db_session.flush()
+            self.refresh_reconciliation_summaries([annotation_obj.ReconciliationId])
 
             logging.info(f"Updated annotation {annotation_id} at {updated_at}")
             return annotation_obj
         except Exception as e:
-            self.db_session.rollback()
             logging.error(f"Error updating annotation: {str(e)}")
             raise
 
@@ -186,13 +447,13 @@ class ReconAnnotationRepository:
             annotation_obj.Excluido = True
             annotation_obj.DataAtualizacao = datetime.utcnow()
 
-            self.db_session.commit()
+            self.db_session.flush()
+            self.refresh_reconciliation_summaries([annotation_obj.ReconciliationId])
             logging.info(
                 f"Soft deleted annotation {annotation_id} at {datetime.utcnow()}"
             )
             return True
         except Exception as e:
-            self.db_session.rollback()
             logging.error(f"Error deleting annotation: {str(e)}")
             raise
 
@@ -212,10 +473,10 @@ class ReconAnnotationRepository:
                 return False
 
             self.db_session.delete(annotation_obj)
-            self.db_session.commit()
+            self.db_session.flush()
+            self.refresh_reconciliation_summaries([annotation_obj.ReconciliationId])
             logging.info(f"Hard deleted annotation {annotation_id}")
             return True
         except Exception as e:
-            self.db_session.rollback()
             logging.error(f"Error hard deleting annotation: {str(e)}")
             raise
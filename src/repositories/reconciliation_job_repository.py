@@ -0,0 +1,108 @@
+from datetime import timedelta
+
+from sqlalchemy import delete, func, update
+
+from src.enums.job_status_enum import JobStatusEnum
+from src.models.schema_ccs import ReconciliationDirtyDate, ReconciliationJob
+
+
+class ReconciliationJobRepository:
+    """Repository for ReconciliationJob rows; the caller owns the transaction"""
+
+    def __init__(self, db_session):
+        self.session = db_session
+
+    def create(self, shards=None, match_mode="line"):
+        """
+        Add a new pending job and flush it to get its Id. With shards (ISO
+        flight dates) the job only reconciles those dates.
+        """
+        job = ReconciliationJob(
+            Shards=shards,
+            FullRun=shards is None,
+            MatchMode=match_mode,
+            ProcessedShards=0,
+            PhaseTimings={},
+            Summary={},
+            Ativo=True,
+            Excluido=False,
+        )
+        self.session.add(job)
+        self.session.flush()
+        return job
+
+    def get_by_id(self, job_id, for_update=False):
+        """Get a job by Id, optionally locking its row"""
+        query = self.session.query(ReconciliationJob).filter(
+            ReconciliationJob.Id == job_id,
+            ReconciliationJob.Excluido.is_(False),
+        )
+        if for_update:
+            query = query.with_for_update()
+        return query.first()
+
+    def expire_stale_jobs(self, stale_seconds):
+        """
+        Mark pending or running jobs without progress for stale_seconds as
+        FAILED and return their Ids. Workers update DataAtualizacao when they
+        start and after every shard, so such a job has no worker left; it
+        can still be resumed from its checkpoint.
+        """
+        table = ReconciliationJob.__table__
+        last_progress = func.coalesce(table.c.DataAtualizacao, table.c.DataCriacao)
+        rows = self.session.execute(
+            update(table)
+            .where(
+                table.c.Status.in_([JobStatusEnum.PENDING, JobStatusEnum.RUNNING]),
+                table.c.Excluido.is_(False),
+                last_progress
+                < func.localtimestamp() - timedelta(seconds=stale_seconds),
+            )
+            .values(
+                Status=JobStatusEnum.FAILED,
+                Error=f"No progress for {stale_seconds} seconds; the worker is gone",
+                DataAtualizacao=func.localtimestamp(),
+            )
+            .returning(table.c.Id)
+        )
+        return [row.Id for row in rows]
+
+    def get_active_job(self):
+        """Oldest pending or running job, if any"""
+        return (
+            self.session.query(ReconciliationJob)
+            .filter(
+                ReconciliationJob.Status.in_(
+                    [JobStatusEnum.PENDING, JobStatusEnum.RUNNING]
+                ),
+                ReconciliationJob.Excluido.is_(False),
+            )
+            .order_by(ReconciliationJob.DataCriacao)
+            .first()
+        )
+
+    def get_dirty_date_window(self):
+        """
+        (first mark, latest mark, database time) over the pending dirty dates;
+        the marks are None when there are none. The database clock is used so
+        marks and "now" come from the same source.
+        """
+        first_marked, last_marked, now = self.session.query(
+            func.min(ReconciliationDirtyDate.DataCriacao),
+            func.max(ReconciliationDirtyDate.DataAtualizacao),
+            func.localtimestamp(),
+        ).one()
+        return first_marked, last_marked, now
+
+    def claim_dirty_dates(self, marked_until):
+        """
+        Remove and return the dirty dates last marked at or before
+        marked_until; dates re-marked later stay for the next trigger.
+        """
+        table = ReconciliationDirtyDate.__table__
+        rows = self.session.execute(
+            delete(table)
+            .where(table.c.DataAtualizacao <= marked_until)
+            .returning(table.c.FlightDate)
+        )
+        return sorted(row.FlightDate for row in rows)
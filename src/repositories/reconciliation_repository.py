@@ -1,12 +1,134 @@
 # Simplified repository for testing
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from sqlalchemy import (
+    Integer,
+    MetaData,
+    Numeric,
+    case,
+    cast,
+    delete,
+    exists,
+    func,
+    insert,
+    select,
+    text,
+    update,
+)
 from sqlalchemy.orm import Session
 
 from src.models.schema_ccs import (
     AirCompanyInvoiceReport,
+    BillingInvoiceTotalDifference,
     CateringInvoiceReport,
+    FlightClassMapping,
+    FlightNumberMapping,
+    ReconAnnotation,
     Reconciliation,
 )
 
+WRITE_BATCH_SIZE = 1000
+# Rows fetched per round trip when streaming source rows from a server-side cursor
+READ_BATCH_SIZE = 1000
+
+# Swap publishing builds the next version of Reconciliation in a staging table
+# and keeps the version it replaces under the previous suffix for rollback.
+STAGING_SUFFIX = "_staging"
+PREVIOUS_SUFFIX = "_previous"
+RETIRED_SUFFIX = "_retired"
+SWAP_LOCK_TIMEOUT = "5s"
+
+
+# The matcher gets source rows as compact tuple-backed records holding only the
+# columns it reads, instead of ORM instances with identity-map bookkeeping.
+AIR_MATCH_COLUMNS = (
+    "Id",
+    "Supplier",
+    "FlightDate",
+    "FlightNo",
+    "Dep",
+    "Arr",
+    "Class",
+    "InvoicedPax",
+    "ServiceCode",
+    "SupplierCode",
+    "ServiceDescription",
+    "Aircraft",
+    "Qty",
+    "UnitPrice",
+    "SubTotal",
+    "Tax",
+    "TotalIncTax",
+    "Currency",
+    "ItemStatus",
+    "InvoiceStatus",
+    "InvoiceDate",
+    "PaidDate",
+    "FlightNoRed",
+)
+CATERING_MATCH_COLUMNS = (
+    "Id",
+    "Facility",
+    "FltDate",
+    "FltNo",
+    "FltInv",
+    "Class",
+    "ItemGroup",
+    "Itemcode",
+    "ItemDesc",
+    "AlBillCode",
+    "AlBillDesc",
+    "BillCatg",
+    "Unit",
+    "Pax",
+    "Qty",
+    "UnitPrice",
+    "TotalAmount",
+)
+AirMatchRecord = namedtuple("AirMatchRecord", AIR_MATCH_COLUMNS)
+CateringMatchRecord = namedtuple("CateringMatchRecord", CATERING_MATCH_COLUMNS)
+
+
+def _reconciliation_table(suffix=""):
+    """Core table for Reconciliation or one of its suffixed copies"""
+    if not suffix:
+        return Reconciliation.__table__
+    return Reconciliation.__table__.to_metadata(
+        MetaData(), name=f"{Reconciliation.__tablename__}{suffix}"
+    )
+
+
+def _flight_date_column():
+    """Flight date a reconciliation row belongs to, whichever side it has"""
+    return func.coalesce(Reconciliation.AirFlightDate, Reconciliation.CatFltDate)
+
+
+def _flight_digits(column):
+    """
+    reconciliation_service._flight_number_key in SQL: the digits of the
+    flight number without leading zeros, "0" for all zeros and the trimmed
+    upper-cased code when it has no digits
+    """
+    text_code = func.regexp_replace(func.upper(func.trim(column)), r"\.0$", "")
+    code = case((text_code.in_(["", "NONE", "NAN"]), None), else_=text_code)
+    digits = func.regexp_replace(code, r"\D", "", "g")
+    return func.coalesce(
+        func.nullif(func.ltrim(digits, "0"), ""), func.nullif(digits, ""), code
+    )
+
+
+def _text_to_numeric(column):
+    """Numeric value of a text column (comma or dot decimals), 0 when not numeric"""
+    value = func.replace(func.trim(column), ",", ".")
+    return case(
+        (value.op("~")(r"^-?[0-9]+(\.[0-9]+)?$"), cast(value, Numeric)), else_=0
+    )
+
+
+def _qualified_name(name):
+    return f'"{Reconciliation.__table__.schema}"."{name}"'
+
 
 class ReconciliationRepository:
     """Simplified repository for testing ReconciliationService"""
@@ -14,22 +136,628 @@ class ReconciliationRepository:
     def __init__(self, db_session):
         self.session = db_session
 
+    def _active_query(self):
+        """Reconciliation query without soft-deleted rows"""
+        return self.session.query(Reconciliation).filter(
+            Reconciliation.Excluido.is_(False)
+        )
+
+    def insert_rows(self, rows):
+        """Insert reconciliation rows given as column dictionaries"""
+        for start in range(0, len(rows), WRITE_BATCH_SIZE):
+            self.session.bulk_insert_mappings(
+                Reconciliation, rows[start : start + WRITE_BATCH_SIZE]
+            )
+
+    def update_rows(self, rows):
+        """Update reconciliation rows by Id; only the given columns change"""
+        for start in range(0, len(rows), WRITE_BATCH_SIZE):
+            self.session.bulk_update_mappings(
+                Reconciliation, rows[start : start + WRITE_BATCH_SIZE]
+            )
+
+    def soft_delete_by_ids(self, ids, deleted_at):
+        """Soft delete reconciliation rows, keeping their annotations"""
+        for start in range(0, len(ids), WRITE_BATCH_SIZE):
+            self.session.execute(
+                update(Reconciliation.__table__)
+                .where(
+                    Reconciliation.__table__.c.Id.in_(
+                        ids[start : start + WRITE_BATCH_SIZE]
+                    )
+                )
+                .values(Ativo=False, Excluido=True, DataAtualizacao=deleted_at)
+            )
+
+    def get_source_flight_dates(self):
+        """Sorted distinct flight dates of the active source rows, None last"""
+        air_dates = select(
+            AirCompanyInvoiceReport.FlightDate.label("flight_date")
+        ).where(
+            AirCompanyInvoiceReport.Ativo.is_(True),
+            AirCompanyInvoiceReport.Excluido.is_(False),
+        )
+        catering_dates = select(
+            CateringInvoiceReport.FltDate.label("flight_date")
+        ).where(
+            CateringInvoiceReport.Ativo.is_(True),
+            CateringInvoiceReport.Excluido.is_(False),
+        )
+        dates = air_dates.union(catering_dates).subquery()
+        rows = self.session.execute(
+            select(dates.c.flight_date).order_by(dates.c.flight_date.asc().nullslast())
+        )
+        return [row.flight_date for row in rows]
+
+    def _air_match_query(self):
+        """Active air company rows as AirMatchRecord column tuples"""
+        return self.session.query(
+            *(getattr(AirCompanyInvoiceReport, name) for name in AIR_MATCH_COLUMNS)
+        ).filter(
+            AirCompanyInvoiceReport.Ativo.is_(True),
+            AirCompanyInvoiceReport.Excluido.is_(False),
+        )
+
+    def _catering_match_query(self):
+        """Active catering rows as CateringMatchRecord column tuples"""
+        return self.session.query(
+            *(getattr(CateringInvoiceReport, name) for name in CATERING_MATCH_COLUMNS)
+        ).filter(
+            CateringInvoiceReport.Ativo.is_(True),
+            CateringInvoiceReport.Excluido.is_(False),
+        )
+
+    def stream_air_records(self):
+        """
+        Active air company rows as AirMatchRecords in flight date order
+        (undated rows last), fetched from a server-side cursor
+        READ_BATCH_SIZE rows at a time
+        """
+        rows = (
+            self._air_match_query()
+            .order_by(
+                AirCompanyInvoiceReport.FlightDate.asc().nullslast(),
+                AirCompanyInvoiceReport.Id,
+            )
+            .yield_per(READ_BATCH_SIZE)
+        )
+        return map(AirMatchRecord._make, rows)
+
+    def stream_catering_records(self):
+        """
+        Active catering rows as CateringMatchRecords in flight date order
+        (undated rows last), fetched from a server-side cursor
+        READ_BATCH_SIZE rows at a time
+        """
+        rows = (
+            self._catering_match_query()
+            .order_by(
+                CateringInvoiceReport.FltDate.asc().nullslast(),
+                CateringInvoiceReport.Id,
+            )
+            .yield_per(READ_BATCH_SIZE)
+        )
+        return map(CateringMatchRecord._make, rows)
+
+    def get_air_records_by_flight_date(self, flight_date):
+        """Active air company AirMatchRecords of one flight date (None: undated)"""
+        rows = (
+            self._air_match_query()
+            .filter(
+                AirCompanyInvoiceReport.FlightDate.is_(None)
+                if flight_date is None
+                else AirCompanyInvoiceReport.FlightDate == flight_date,
+            )
+            .order_by(AirCompanyInvoiceReport.Id)
+        )
+        return [AirMatchRecord._make(row) for row in rows]
+
+    def get_catering_records_by_flight_date(self, flight_date):
+        """Active CateringMatchRecords of one flight date (None for undated rows)"""
+        rows = (
+            self._catering_match_query()
+            .filter(
+                CateringInvoiceReport.FltDate.is_(None)
+                if flight_date is None
+                else CateringInvoiceReport.FltDate == flight_date,
+            )
+            .order_by(CateringInvoiceReport.Id)
+        )
+        return [CateringMatchRecord._make(row) for row in rows]
+
+    def get_flight_number_mappings(self):
+        """Active (Promeus flight number, Inflair flight number) pairs"""
+        return (
+            self.session.query(
+                FlightNumberMapping.AirCompanyFlightNumber,
+                FlightNumberMapping.CateringFlightNumber,
+            )
+            .filter(
+                FlightNumberMapping.Ativo.is_(True),
+                FlightNumberMapping.Excluido.is_(False),
+            )
+            .distinct()
+            .all()
+        )
+
+    def get_flight_class_mappings(self):
+        """Active (Promeus class, Inflair class) pairs"""
+        return (
+            self.session.query(
+                FlightClassMapping.PromeusClass, FlightClassMapping.InflairClass
+            )
+            .filter(
+                FlightClassMapping.Ativo.is_(True),
+                FlightClassMapping.Excluido.is_(False),
+            )
+            .distinct()
+            .all()
+        )
+
+    def get_item_code_mappings(self):
+        """Active (airline bill code, Inflair item code) pairs"""
+        return (
+            self.session.query(
+                FlightClassMapping.ALBillCode, FlightClassMapping.ItemCode
+            )
+            .filter(
+                FlightClassMapping.Ativo.is_(True),
+                FlightClassMapping.Excluido.is_(False),
+            )
+            .distinct()
+            .all()
+        )
+
+    def get_row_states_by_flight_date(self, flight_date):
+        """
+        Get {Id: (RowHash, Excluido, AnnotationCount)} for the rows of one
+        flight date
+        """
+        query = self.session.query(
+            Reconciliation.Id,
+            Reconciliation.RowHash,
+            Reconciliation.Excluido,
+            Reconciliation.AnnotationCount,
+        )
+        if flight_date is None:
+            query = query.filter(
+                Reconciliation.AirFlightDate.is_(None),
+                Reconciliation.CatFltDate.is_(None),
+            )
+        else:
+            day_start = datetime.combine(flight_date, datetime.min.time())
+            day_end = day_start + timedelta(days=1)
+            query = query.filter(
+                (
+                    (Reconciliation.AirFlightDate >= day_start)
+                    & (Reconciliation.AirFlightDate < day_end)
+                )
+                | (
+                    Reconciliation.AirFlightDate.is_(None)
+                    & (Reconciliation.CatFltDate >= day_start)
+                    & (Reconciliation.CatFltDate < day_end)
+                )
+            )
+        return {
+            row.Id: (row.RowHash, row.Excluido, row.AnnotationCount) for row in query
+        }
+
+    def soft_delete_outside_flight_dates(self, flight_dates, deleted_at):
+        """
+        Soft delete active rows whose flight date is not in flight_dates;
+        rows with annotations are left active
+        """
+        shard_date = _flight_date_column()
+        dated = [flight_date for flight_date in flight_dates if flight_date is not None]
+        outside = shard_date.isnot(None) & ~func.date(shard_date).in_(dated)
+        if None not in flight_dates:
+            outside = outside | shard_date.is_(None)
+
+        return self.session.execute(
+            update(Reconciliation.__table__)
+            .where(
+                Reconciliation.__table__.c.Excluido.is_(False),
+                Reconciliation.__table__.c.AnnotationCount == 0,
+                outside,
+            )
+            .values(Ativo=False, Excluido=True, DataAtualizacao=deleted_at)
+        ).rowcount
+
+    def compute_invoice_total_differences(self):
+        """
+        Compare Inflair flight invoice totals with the Promeus totals of the
+        same flight in one aggregate query.
+
+        Both sources are summed per (flight date, flight number digits); air
+        flight numbers are translated through FlightNumberMapping first. The
+        two sides are full outer joined, so flights invoiced on one side only
+        show up with zero totals on the other.
+
+        Returns:
+            List of BillingInvoiceTotalDifference column dictionaries
+        """
+        mapping = (
+            select(
+                func.upper(func.trim(FlightNumberMapping.AirCompanyFlightNumber)).label(
+                    "promeus"
+                ),
+                FlightNumberMapping.CateringFlightNumber.label("inflair"),
+            )
+            .where(
+                FlightNumberMapping.Ativo.is_(True),
+                FlightNumberMapping.Excluido.is_(False),
+            )
+            .subquery()
+        )
+        mapped_flights = (
+            select(mapping.c.promeus, func.min(mapping.c.inflair).label("inflair"))
+            .group_by(mapping.c.promeus)
+            .subquery()
+        )
+
+        air_lines = (
+            select(
+                AirCompanyInvoiceReport.FlightDate.label("flight_date"),
+                _flight_digits(
+                    func.coalesce(
+                        mapped_flights.c.inflair, AirCompanyInvoiceReport.FlightNo
+                    )
+                ).label("flight_number"),
+                func.coalesce(AirCompanyInvoiceReport.Qty, 0).label("qty"),
+                func.coalesce(AirCompanyInvoiceReport.SubTotal, 0).label("amount"),
+            )
+            .outerjoin(
+                mapped_flights,
+                mapped_flights.c.promeus
+                == func.upper(func.trim(AirCompanyInvoiceReport.FlightNo)),
+            )
+            .where(
+                AirCompanyInvoiceReport.Ativo.is_(True),
+                AirCompanyInvoiceReport.Excluido.is_(False),
+                AirCompanyInvoiceReport.FlightDate.isnot(None),
+            )
+            .subquery()
+        )
+        air = (
+            select(
+                air_lines.c.flight_date,
+                air_lines.c.flight_number,
+                func.sum(air_lines.c.qty).label("qty"),
+                func.sum(air_lines.c.amount).label("amount"),
+            )
+            .group_by(air_lines.c.flight_date, air_lines.c.flight_number)
+            .subquery()
+        )
+
+        catering_lines = (
+            select(
+                CateringInvoiceReport.FltDate.label("flight_date"),
+                _flight_digits(CateringInvoiceReport.FltNo).label("flight_number"),
+                CateringInvoiceReport.FltInv.label("flt_inv"),
+                _text_to_numeric(CateringInvoiceReport.Qty).label("qty"),
+                _text_to_numeric(CateringInvoiceReport.TotalAmount).label("amount"),
+            )
+            .where(
+                CateringInvoiceReport.Ativo.is_(True),
+                CateringInvoiceReport.Excluido.is_(False),
+                CateringInvoiceReport.FltDate.isnot(None),
+            )
+            .subquery()
+        )
+        catering = (
+            select(
+                catering_lines.c.flight_date,
+                catering_lines.c.flight_number,
+                func.string_agg(catering_lines.c.flt_inv.distinct(), ", ").label(
+                    "flt_inv"
+                ),
+                func.sum(catering_lines.c.qty).label("qty"),
+                func.sum(catering_lines.c.amount).label("amount"),
+            )
+            .group_by(catering_lines.c.flight_date, catering_lines.c.flight_number)
+            .subquery()
+        )
+
+        air_qty = func.coalesce(air.c.qty, 0)
+        cat_qty = func.coalesce(catering.c.qty, 0)
+        air_amount = func.round(func.coalesce(air.c.amount, 0), 2)
+        cat_amount = func.round(func.coalesce(catering.c.amount, 0), 2)
+        amount_difference = cat_amount - air_amount
+        query = select(
+            func.coalesce(air.c.flight_date, catering.c.flight_date).label(
+                "FlightDate"
+            ),
+            func.coalesce(air.c.flight_number, catering.c.flight_number).label(
+                "FlightNumber"
+            ),
+            catering.c.flt_inv.label("FltInv"),
+            cast(air_qty, Integer).label("AirQty"),
+            cast(cat_qty, Integer).label("CatQty"),
+            air_amount.label("AirAmount"),
+            cat_amount.label("CatAmount"),
+            cast(cat_qty - air_qty, Integer).label("QtyDifference"),
+            amount_difference.label("AmountDifference"),
+            func.abs(amount_difference).label("AbsAmountDifference"),
+        ).select_from(
+            air.join(
+                catering,
+                (air.c.flight_date == catering.c.flight_date)
+                & (air.c.flight_number == catering.c.flight_number),
+                full=True,
+            )
+        )
+        return [dict(row._mapping) for row in self.session.execute(query)]
+
+    def rebuild_invoice_total_differences(self):
+        """
+        Replace the BillingInvoiceTotalDifference rows with freshly computed
+        ones in a single bulk insert, without committing
+
+        Returns:
+            Number of rows written
+        """
+        rows = self.compute_invoice_total_differences()
+        table = BillingInvoiceTotalDifference.__table__
+        self.session.execute(delete(table))
+        if rows:
+            self.session.execute(
+                insert(table), [{**row, "Excluido": False} for row in rows]
+            )
+        return len(rows)
+
+    def get_largest_invoice_total_differences(self, limit, offset):
+        """BillingInvoiceTotalDifference rows by absolute amount difference"""
+        return (
+            self.session.query(BillingInvoiceTotalDifference)
+            .filter(BillingInvoiceTotalDifference.Excluido.is_(False))
+            .order_by(
+                BillingInvoiceTotalDifference.AbsAmountDifference.desc(),
+                BillingInvoiceTotalDifference.Id,
+            )
+            .offset(offset)
+            .limit(limit)
+            .all()
+        )
+
+    def get_invoice_total_differences_count(self):
+        """Number of BillingInvoiceTotalDifference rows"""
+        return (
+            self.session.query(BillingInvoiceTotalDifference)
+            .filter(BillingInvoiceTotalDifference.Excluido.is_(False))
+            .count()
+        )
+
+    def create_staging_table(self):
+        """Create an empty unlogged copy of Reconciliation without indexes"""
+        staging_name = _qualified_name(Reconciliation.__tablename__ + STAGING_SUFFIX)
+        self.session.execute(text(f"DROP TABLE IF EXISTS {staging_name}"))
+        self.session.execute(
+            text(
+                f"CREATE UNLOGGED TABLE {staging_name} "
+                f"(LIKE {_qualified_name(Reconciliation.__tablename__)} "
+                "INCLUDING DEFAULTS)"
+            )
+        )
+
+    def insert_staging_rows(self, rows, created_at):
+        """Bulk insert reconciliation rows into the staging table"""
+        staging = _reconciliation_table(STAGING_SUFFIX)
+        defaults = dict.fromkeys(staging.columns.keys())
+        defaults.update(AnnotationCount=0, DataCriacao=created_at)
+
+        for start in range(0, len(rows), WRITE_BATCH_SIZE):
+            self.session.execute(
+                insert(staging),
+                [{**defaults, **row} for row in rows[start : start + WRITE_BATCH_SIZE]],
+            )
+
+    def finalize_staging_table(self):
+        """
+        Carry creation dates over from the live table, make the staging table
+        durable and build its primary key and indexes after the load.
+        """
+        base = Reconciliation.__tablename__
+        staging = _reconciliation_table(STAGING_SUFFIX)
+        live = _reconciliation_table()
+
+        unchanged = (live.c.RowHash == staging.c.RowHash) & live.c.Excluido.is_(False)
+        self.session.execute(
+            update(staging)
+            .where(staging.c.Id == live.c.Id)
+            .values(
+                DataCriacao=live.c.DataCriacao,
+                DataAtualizacao=case(
+                    (unchanged, live.c.DataAtualizacao), else_=staging.c.DataCriacao
+                ),
+            )
+        )
+
+        staging_name = _qualified_name(base + STAGING_SUFFIX)
+        self.session.execute(text(f"ALTER TABLE {staging_name} SET LOGGED"))
+        self.session.execute(
+            text(
+                f"ALTER TABLE {staging_name} ADD CONSTRAINT "
+                f'"{base}{STAGING_SUFFIX}_pkey" PRIMARY KEY ("Id")'
+            )
+        )
+        for index in Reconciliation.__table__.indexes:
+            columns = ", ".join(f'"{column.name}"' for column in index.columns)
+            self.session.execute(
+                text(
+                    f'CREATE INDEX "{index.name}{STAGING_SUFFIX}" '
+                    f"ON {staging_name} ({columns})"
+                )
+            )
+        self.session.execute(text(f"ANALYZE {staging_name}"))
+
+    def publish_staging_table(self):
+        """
+        Swap the staging table in as Reconciliation; the replaced version is
+        kept as the previous table. Returns the number of carried-over rows.
+        """
+        return self._swap_in(STAGING_SUFFIX)
+
+    def restore_previous_table(self):
+        """
+        Swap the previous version back in as Reconciliation; the replaced
+        version becomes the previous table. Returns the carried-over rows.
+        """
+        return self._swap_in(PREVIOUS_SUFFIX)
+
+    def validate_annotation_foreign_keys(self):
+        """Validate the foreign keys re-created NOT VALID by a swap"""
+        for referencing_table, constraint_name, _ in self._referencing_foreign_keys(
+            Reconciliation.__tablename__
+        ):
+            self.session.execute(
+                text(
+                    f"ALTER TABLE {referencing_table} "
+                    f'VALIDATE CONSTRAINT "{constraint_name}"'
+                )
+            )
+
+    def _swap_in(self, candidate_suffix):
+        """
+        Make the candidate table the live Reconciliation table in the current
+        transaction.
+
+        The live table is locked only for the swap itself. Under the lock the
+        candidate takes over rows that annotations still point at, unchanged,
+        and the annotation summaries, so no annotation is orphaned and no
+        annotated row is soft deleted by a rebuild. Foreign keys are re-pointed NOT VALID to keep the lock short;
+        call validate_annotation_foreign_keys afterwards.
+        """
+        base = Reconciliation.__tablename__
+        live = _reconciliation_table()
+        candidate = _reconciliation_table(candidate_suffix)
+
+        self.session.execute(text(f"SET LOCAL lock_timeout = '{SWAP_LOCK_TIMEOUT}'"))
+        self.session.execute(
+            text(f"LOCK TABLE {_qualified_name(base)} IN ACCESS EXCLUSIVE MODE")
+        )
+
+        annotated_ids = select(ReconAnnotation.ReconciliationId)
+        carried = self.session.execute(
+            insert(candidate).from_select(
+                live.columns.keys(),
+                select(*live.columns).where(
+                    live.c.Id.in_(annotated_ids),
+                    ~exists().where(candidate.c.Id == live.c.Id),
+                ),
+            )
+        ).rowcount
+
+        active = (
+            (ReconAnnotation.ReconciliationId == candidate.c.Id)
+            & ReconAnnotation.Ativo.is_(True)
+            & ReconAnnotation.Excluido.is_(False)
+        )
+        activity_at = func.coalesce(
+            ReconAnnotation.DataAtualizacao, ReconAnnotation.DataCriacao
+        )
+        self.session.execute(
+            update(candidate)
+            .where(
+                candidate.c.Id.in_(annotated_ids) | (candidate.c.AnnotationCount > 0)
+            )
+            .values(
+                AnnotationCount=select(func.count(ReconAnnotation.Id))
+                .where(active)
+                .scalar_subquery(),
+                LatestStatus=select(ReconAnnotation.Status)
+                .where(active)
+                .order_by(activity_at.desc())
+                .limit(1)
+                .scalar_subquery(),
+                LatestAnnotationAt=select(func.max(activity_at))
+                .where(active)
+                .scalar_subquery(),
+            )
+        )
+
+        self._rename_table("", RETIRED_SUFFIX)
+        self._rename_table(candidate_suffix, "")
+        self.session.execute(
+            text(f"DROP TABLE IF EXISTS {_qualified_name(base + PREVIOUS_SUFFIX)}")
+        )
+        self._rename_table(RETIRED_SUFFIX, PREVIOUS_SUFFIX)
+
+        for (
+            referencing_table,
+            constraint_name,
+            columns,
+        ) in self._referencing_foreign_keys(base + PREVIOUS_SUFFIX):
+            column_list = ", ".join(f'"{column}"' for column in columns)
+            self.session.execute(
+                text(
+                    f"ALTER TABLE {referencing_table} "
+                    f'DROP CONSTRAINT "{constraint_name}", '
+                    f'ADD CONSTRAINT "{constraint_name}" FOREIGN KEY ({column_list}) '
+                    f'REFERENCES {_qualified_name(base)} ("Id") NOT VALID'
+                )
+            )
+
+        return carried
+
+    def _rename_table(self, from_suffix, to_suffix):
+        """Rename a Reconciliation table together with its key and indexes"""
+        base = Reconciliation.__tablename__
+        schema = Reconciliation.__table__.schema
+        self.session.execute(
+            text(
+                f"ALTER TABLE {_qualified_name(base + from_suffix)} "
+                f'RENAME TO "{base}{to_suffix}"'
+            )
+        )
+        self.session.execute(
+            text(
+                f"ALTER TABLE {_qualified_name(base + to_suffix)} "
+                f'RENAME CONSTRAINT "{base}{from_suffix}_pkey" TO "{base}{to_suffix}_pkey"'
+            )
+        )
+        for index in Reconciliation.__table__.indexes:
+            self.session.execute(
+                text(
+                    f'ALTER INDEX IF EXISTS "{schema}"."{index.name}{from_suffix}" '
+                    f'RENAME TO "{index.name}{to_suffix}"'
+                )
+            )
+
+    def _referencing_foreign_keys(self, table_name):
+        """(referencing table, constraint name, columns) of foreign keys to a table"""
+        rows = self.session.execute(
+            text(
+                "SELECT c.conrelid::regclass::text AS referencing_table, "
+                "c.conname AS constraint_name, "
+                "ARRAY(SELECT a.attname FROM unnest(c.conkey) AS k(attnum) "
+                "JOIN pg_attribute a ON a.attrelid = c.conrelid "
+                "AND a.attnum = k.attnum) AS columns "
+                "FROM pg_constraint c "
+                "WHERE c.contype = 'f' AND c.confrelid = CAST(:table AS regclass)"
+            ),
+            {"table": _qualified_name(table_name)},
+        )
+        return [
+            (row.referencing_table, row.constraint_name, list(row.columns))
+            for row in rows
+        ]
+
     def get_all(self):
         """Get all reconciliation records"""
-        return self.session.query(Reconciliation).all()
+        return self._active_query().all()
 
     def get_paginated(self, limit, offset):
         """Get paginated reconciliation records"""
-        return self.session.query(Reconciliation).offset(offset).limit(limit).all()
+        return self._active_query().offset(offset).limit(limit).all()
 
     def get_count(self):
         """Get total count of reconciliation records"""
-        return self.session.query(Reconciliation).count()
+        return self._active_query().count()
 
     def get_by_item_name(self, item_name, limit, offset):
         """Get records by item name"""
         return (
-            self.session.query(Reconciliation)
+            self._active_query()
             .filter(Reconciliation.CatItemDesc.contains(item_name))
             .offset(offset)
             .limit(limit)
@@ -39,7 +767,7 @@ class ReconciliationRepository:
     def get_count_by_item_name(self, item_name):
         """Get count by item name"""
         return (
-            self.session.query(Reconciliation)
+            self._active_query()
             .filter(Reconciliation.CatItemDesc.contains(item_name))
             .count()
         )
@@ -47,7 +775,7 @@ class ReconciliationRepository:
     def get_by_date_range(self, start_date, end_date, limit, offset):
         """Get records by date range"""
         return (
-            self.session.query(Reconciliation)
+            self._active_query()
             .filter(Reconciliation.AirFlightDate.between(start_date, end_date))
             .offset(offset)
             .limit(limit)
@@ -57,7 +785,7 @@ class ReconciliationRepository:
     def get_count_by_date_range(self, start_date, end_date):
         """Get count by date range"""
         return (
-            self.session.query(Reconciliation)
+            self._active_query()
             .filter(Reconciliation.AirFlightDate.between(start_date, end_date))
             .count()
         )
@@ -66,7 +794,7 @@ class ReconciliationRepository:
         self, filter_type, start_date, end_date, limit, offset
     ):
         """Get filtered records by date range"""
-        query = self.session.query(Reconciliation).filter(
+        query = self._active_query().filter(
             Reconciliation.AirFlightDate.between(start_date, end_date)
         )
 
@@ -87,7 +815,7 @@ class ReconciliationRepository:
 
     def get_filtered_count_by_date_range(self, filter_type, start_date, end_date):
         """Get filtered count by date range"""
-        query = self.session.query(Reconciliation).filter(
+        query = self._active_query().filter(
             Reconciliation.AirFlightDate.between(start_date, end_date)
         )
 
@@ -111,7 +839,7 @@ class ReconciliationRepository:
     ):
         """Get records by item name and date range"""
         return (
-            self.session.query(Reconciliation)
+            self._active_query()
             .filter(
                 Reconciliation.CatItemDesc.contains(item_name),
                 Reconciliation.AirFlightDate.between(start_date, end_date),
@@ -124,7 +852,7 @@ class ReconciliationRepository:
     def get_count_by_item_name_and_date_range(self, item_name, start_date, end_date):
         """Get count by item name and date range"""
         return (
-            self.session.query(Reconciliation)
+            self._active_query()
             .filter(
                 Reconciliation.CatItemDesc.contains(item_name),
                 Reconciliation.AirFlightDate.between(start_date, end_date),
@@ -135,7 +863,7 @@ class ReconciliationRepository:
     def get_by_flight_number(self, flight_number, limit, offset):
         """Get records by flight number"""
         return (
-            self.session.query(Reconciliation)
+            self._active_query()
             .filter(Reconciliation.AirFlightNo == flight_number)
             .offset(offset)
             .limit(limit)
@@ -145,16 +873,14 @@ class ReconciliationRepository:
     def get_count_by_flight_number(self, flight_number):
         """Get count by flight number"""
         return (
-            self.session.query(Reconciliation)
+            self._active_query()
             .filter(Reconciliation.AirFlightNo == flight_number)
             .count()
         )
 
     def get_filtered_by_flight_number(self, filter_type, flight_number, limit, offset):
         """Get filtered records by flight number"""
-        query = self.session.query(Reconciliation).filter(
-            Reconciliation.AirFlightNo == flight_number
-        )
+        query = self._active_query().filter(Reconciliation.AirFlightNo == flight_number)
 
         if filter_type == "matched":
             query = query.filter(
@@ -173,9 +899,7 @@ class ReconciliationRepository:
 
     def get_filtered_count_by_flight_number(self, filter_type, flight_number):
         """Get filtered count by flight number"""
-        query = self.session.query(Reconciliation).filter(
-            Reconciliation.AirFlightNo == flight_number
-        )
+        query = self._active_query().filter(Reconciliation.AirFlightNo == flight_number)
 
         if filter_type == "matched":
             query = query.filter(
@@ -197,7 +921,7 @@ class ReconciliationRepository:
     ):
         """Get records by item name and flight number"""
         return (
-            self.session.query(Reconciliation)
+            self._active_query()
             .filter(
                 Reconciliation.CatItemDesc.contains(item_name),
                 Reconciliation.AirFlightNo == flight_number,
@@ -210,7 +934,7 @@ class ReconciliationRepository:
     def get_count_by_item_name_and_flight_number(self, item_name, flight_number):
         """Get count by item name and flight number"""
         return (
-            self.session.query(Reconciliation)
+            self._active_query()
             .filter(
                 Reconciliation.CatItemDesc.contains(item_name),
                 Reconciliation.AirFlightNo == flight_number,
@@ -220,7 +944,7 @@ class ReconciliationRepository:
 
     def get_filtered_paginated(self, filter_type, limit, offset):
         """Get filtered paginated records"""
-        query = self.session.query(Reconciliation)
+        query = self._active_query()
 
         if filter_type == "matched":
             query = query.filter(
@@ -239,7 +963,7 @@ class ReconciliationRepository:
 
     def get_filtered_count(self, filter_type):
         """Get filtered count"""
-        query = self.session.query(Reconciliation)
+        query = self._active_query()
 
         if filter_type == "matched":
             query = query.filter(
@@ -341,9 +1065,109 @@ class ReconciliationRepository:
         """Get all catering reports"""
         return self.session.query(CateringInvoiceReport).all()
 
+    def _review_query(
+        self,
+        filter_type,
+        review_status,
+        has_annotations,
+        start_date=None,
+        end_date=None,
+        flight_number=None,
+        item_name=None,
+    ):
+        """
+        Build a query filtered on the denormalized annotation summary, combined
+        with the date range, flight number and item name filters when given
+        """
+        query = self._active_query()
+
+        if start_date and end_date:
+            query = query.filter(
+                Reconciliation.AirFlightDate.between(start_date, end_date)
+            )
+        if flight_number:
+            query = query.filter(Reconciliation.AirFlightNo == flight_number)
+        if item_name:
+            query = query.filter(Reconciliation.CatItemDesc.contains(item_name))
+
+        if filter_type == "matched":
+            query = query.filter(
+                Reconciliation.Air == "Yes", Reconciliation.Cat == "Yes"
+            )
+        elif filter_type == "air_only":
+            query = query.filter(
+                Reconciliation.Air == "Yes", Reconciliation.Cat == "No"
+            )
+        elif filter_type == "cat_only":
+            query = query.filter(
+                Reconciliation.Air == "No", Reconciliation.Cat == "Yes"
+            )
+
+        if review_status is not None:
+            query = query.filter(Reconciliation.LatestStatus == review_status)
+        if has_annotations is True:
+            query = query.filter(Reconciliation.AnnotationCount > 0)
+        elif has_annotations is False:
+            query = query.filter(Reconciliation.AnnotationCount == 0)
+
+        return query
+
+    def get_by_review(
+        self,
+        filter_type,
+        review_status,
+        has_annotations,
+        sort_by_latest_annotation,
+        limit,
+        offset,
+        start_date=None,
+        end_date=None,
+        flight_number=None,
+        item_name=None,
+    ):
+        """Get records by review status, optionally newest annotation first"""
+        query = self._review_query(
+            filter_type,
+            review_status,
+            has_annotations,
+            start_date,
+            end_date,
+            flight_number,
+            item_name,
+        )
+
+        if sort_by_latest_annotation:
+            query = query.order_by(
+                Reconciliation.LatestAnnotationAt.desc().nullslast(),
+                Reconciliation.Id,
+            )
+
+        return query.offset(offset).limit(limit).all()
+
+    def get_count_by_review(
+        self,
+        filter_type,
+        review_status,
+        has_annotations,
+        start_date=None,
+        end_date=None,
+        flight_number=None,
+        item_name=None,
+    ):
+        """Get count by review status"""
+        return self._review_query(
+            filter_type,
+            review_status,
+            has_annotations,
+            start_date,
+            end_date,
+            flight_number,
+            item_name,
+        ).count()
+
     def get_filtered_by_item_name(self, filter_type, item_name, limit, offset):
         """Get filtered records by item name"""
-        query = self.session.query(Reconciliation).filter(
+        query = self._active_query().filter(
             Reconciliation.CatItemDesc.contains(item_name)
         )
 
@@ -364,7 +1188,7 @@ class ReconciliationRepository:
 
     def get_filtered_count_by_item_name(self, filter_type, item_name):
         """Get filtered count by item name"""
-        query = self.session.query(Reconciliation).filter(
+        query = self._active_query().filter(
             Reconciliation.CatItemDesc.contains(item_name)
         )
 
@@ -1,41 +1,72 @@
 import json
 import os
-from collections import defaultdict
+from collections import defaultdict, deque
 from datetime import date, datetime
-from typing import Any, Dict, List
+from functools import lru_cache
+from importlib.util import find_spec
+from itertools import chain, islice
+from typing import Any, Dict, Iterable, Iterator, List, Union
 
 import numpy as np
 import pandas as pd
+from openpyxl import load_workbook
 
-from models.schema_ccs import (
-    CateringInvoiceReport,
-    FlightClassMapping,
-    FlightNumberMapping,
-)
+from common.copy_frame import INTEGER_REJECTED
+from common.rejects import report_rejected
+from common.stage_metrics import StageMetrics
+from models.schema_ccs import FlightClassMapping, FlightNumberMapping
 from repositories.ccs_repository import (
     AirCompanyInvoiceRepository,
     CateringInvoiceRepository,
     FlightClassMappingRepository,
     FlightNumberMappingRepository,
+    ReconciliationDirtyDateRepository,
 )
 
 
 class FileReadersService:
-    def __init__(self, db_session):
+    def __init__(self, db_session, metrics: StageMetrics = None):
         self.catering_invoice_repository = CateringInvoiceRepository(db_session)
         self.air_company_invoice_repository = AirCompanyInvoiceRepository(db_session)
         self.flight_class_mapping_repository = FlightClassMappingRepository(db_session)
         self.flight_number_mapping_repository = FlightNumberMappingRepository(
             db_session
         )
+        self.dirty_date_repository = ReconciliationDirtyDateRepository(db_session)
         self.session = db_session
+        # Number of unparseable dates per column of the files read so far
+        self.rejected_dates = {}
+        # Per-stage time, rows and memory of the invoice readers
+        self.metrics = metrics or StageMetrics()
+
+    def mark_dirty_flight_dates(self, flight_dates) -> int:
+        """
+        Record the flight dates touched by an ingested file so the debounced
+        reconciliation trigger picks them up. Failures are only logged; the
+        file itself has already been stored.
+        """
+        parsed_dates = set()
+        for value in flight_dates:
+            if isinstance(value, str):
+                try:
+                    parsed_dates.add(date.fromisoformat(value.strip()[:10]))
+                    continue
+                except ValueError:
+                    pass
+            parsed_dates.add(format_date(value))
+
+        try:
+            return self.dirty_date_repository.mark_dates(parsed_dates)
+        except Exception as e:
+            print(f"Error marking dirty flight dates: {e}")
+            return 0
 
     def billing_inflair_invoice_report(self, file_path: str) -> List[Dict[str, Any]]:
         """
         This method reads the billing inflair file and returns an array
         of objects and a json file (will be commented in the code)
         """
-        df = pd.read_excel(file_path, skiprows=12, header=None)
+        df = read_spreadsheet(file_path, skiprows=12, header=None)
 
         df.columns = [
             "Number",
@@ -79,8 +110,7 @@ class FileReadersService:
 
         df = df.replace({np.nan: None, pd.NaT: None})
 
-        for col in df.select_dtypes(include=["object"]).columns:
-            df[col] = df[col].apply(lambda x: x.strip() if isinstance(x, str) else x)
+        df = normalize_text_columns(df)
 
         data = df.to_dict(orient="records")
 
@@ -88,23 +118,94 @@ class FileReadersService:
 
         return data
 
-    def billing_promeus_invoice_report(self, file_path: str) -> List[Dict[str, Any]]:
+    def billing_promeus_invoice_report(
+        self, file_path: str, stream: bool = None, return_records: bool = False
+    ) -> Union[int, List[Dict[str, Any]]]:
         """
-        This method reads the billing promeus file and returns an
-        array of objects and a json file (will be commented in the code)
+        This method reads the billing promeus file and loads the rows that
+        are not in the database yet, straight from the DataFrame.
+
+        Returns the number of rows read, or the records themselves with
+        return_records. Large .xlsx files (see should_stream) are read and
+        inserted in batches of STREAM_BATCH_SIZE rows instead of as one
+        DataFrame, and always return the number of rows.
         """
-        df = pd.read_excel(file_path, header=0)
-
-        expected_columns = {
-            "SUPPLIER",
-            "FLIGHT DATE",
-            "FLIGHT NO.",
-            "DEP",
-            "ARR",
-        }
-        if not expected_columns.issubset(df.columns):
-            raise ValueError("Please share the correct file.")
+        if should_stream(file_path, stream):
+            return self._stream_promeus_invoice_report(file_path)
+
+        with self.metrics.stage("parse", bytes=file_size(file_path)):
+            df = read_spreadsheet(file_path, header=0)
+        check_promeus_invoice_columns(df.columns)
+        self.metrics.count("parse", rows=len(df))
+        with self.metrics.stage("normalize"):
+            df = self._promeus_invoice_frame(df)
+        self.metrics.count("normalize", rows=len(df))
+
+        try:
+            inserted = self.air_company_invoice_repository.insert_new_frame(
+                df, metrics=self.metrics
+            )
+            print(
+                f"Successfully inserted {inserted} air "
+                "company invoice records into the database"
+            )
+        except Exception as e:
+            # Raised so the ingestion is recorded as failed and retried
+            print(f"Error inserting ERP invoice data: {e}")
+            raise
+        self.mark_dirty_flight_dates(df["FlightDate"].unique())
+
+        if return_records:
+            return df.to_dict(orient="records")
+        return len(df)
+
+    def _stream_promeus_invoice_report(self, file_path: str) -> int:
+        """
+        Read and insert the Promeus invoice report batch by batch, in one
+        transaction so that a failed batch leaves nothing of the file behind
+        """
+        rows = iter_sheet_rows(file_path)
+        columns = header_names(next(rows, ()))
+        check_promeus_invoice_columns(columns)
+
+        read_count = 0
+        inserted = 0
+        flight_dates = set()
+        integer_rejects = {}
+        self.metrics.count("parse", bytes=file_size(file_path))
+        try:
+            for df in self.metrics.iterate("parse", iter_frames(rows, columns)):
+                self.metrics.count("parse", rows=len(df))
+                with self.metrics.stage("normalize"):
+                    df = self._promeus_invoice_frame(df)
+                self.metrics.count("normalize", rows=len(df))
+                if df.empty:
+                    continue
+                # Rows already stored, or repeated in the file, are skipped
+                inserted += self.air_company_invoice_repository.insert_new_frame(
+                    df, metrics=self.metrics, commit=False, rejects=integer_rejects
+                )
+                read_count += len(df)
+                flight_dates.update(df["FlightDate"].unique())
+            with self.metrics.stage("commit"):
+                self.session.commit()
+        except Exception as e:
+            self.session.rollback()
+            print(f"Error inserting ERP invoice data, no rows were stored: {e}")
+            raise
 
+        report_rejected(
+            "billing_promeus_invoice_report", integer_rejects, INTEGER_REJECTED
+        )
+        print(
+            f"Successfully inserted {inserted} of {read_count} "
+            "air company invoice records"
+        )
+        self.mark_dirty_flight_dates(flight_dates)
+        return read_count
+
+    def _promeus_invoice_frame(self, df: pd.DataFrame) -> pd.DataFrame:
+        """(A batch of) the Promeus invoice report with table column names"""
         df.dropna(how="all", inplace=True)
         df.dropna(axis=1, how="all", inplace=True)
         df.reset_index(drop=True, inplace=True)
@@ -136,11 +237,7 @@ class FileReadersService:
         df = df.rename(columns=column_mapping)
 
         if "FlightNo" in df.columns:
-            df["FlightNoRed"] = df["FlightNo"].apply(
-                lambda x: (
-                    "".join(char for char in str(x) if char.isdigit()) if x else None
-                )
-            )
+            df["FlightNoRed"] = extract_digits(df["FlightNo"])
 
         if "FlightDate" in df.columns:
             try:
@@ -153,32 +250,20 @@ class FileReadersService:
                 print(f"Original FlightDate values: {df['FlightDate'].head()}")
 
         for col in df.select_dtypes(include=["datetime64"]).columns:
-            df[col] = df[col].apply(format_date)
+            df[col] = parse_dates(df[col])
 
-        for col in df.select_dtypes(include=["object"]).columns:
-            df[col] = df[col].apply(lambda x: x.strip() if isinstance(x, str) else x)
+        df = normalize_text_columns(df)
 
         if "InvoicedPax" in df.columns:
-            df["InvoicedPax"] = df["InvoicedPax"].astype(str)
+            df["InvoicedPax"] = to_text(df["InvoicedPax"])
 
         df = df.replace({np.nan: None})
 
-        data = df.to_dict(orient="records")
+        return df
 
-        try:
-            self.air_company_invoice_repository.insert_air_company_invoice(data)
-            print(
-                f"Successfully inserted {len(data)} air "
-                "company invoice records into the database"
-            )
-        except Exception as e:
-            print(f"Error inserting ERP invoice data: {e}")
-
-        # save_json(data, "billing_promeus.json")
-
-        # return data
-
-    def billing_inflair_recon_report(self, file_path: str) -> List[Dict[str, Any]]:
+    def billing_inflair_recon_report(
+        self, file_path: str, stream: bool = None, return_records: bool = True
+    ) -> Union[int, List[Dict[str, Any]]]:
         """
         Reads the Inflair Airline Billing Recon Report (CSV or Excel)
         and returns a list of records.
@@ -191,18 +276,62 @@ class FileReadersService:
         Returns
         -------
         List[Dict[str, Any]]
-            List of records from the file
+            List of records from the file, or only the number of records
+            when return_records is False; large .xlsx files (see
+            should_stream) are read and inserted in batches of
+            STREAM_BATCH_SIZE rows and only the number of records is returned
         """
+        if should_stream(file_path, stream):
+            return self._stream_inflair_recon_report(file_path)
+
+        with self.metrics.stage("parse", bytes=file_size(file_path)):
+            df = self._read_inflair_recon_report(file_path)
+        self.metrics.count("parse", rows=len(df))
+
+        rejects = {}
+        with self.metrics.stage("normalize"):
+            df = self._inflair_recon_frame(df, rejects)
+        self.metrics.count("normalize", rows=len(df))
+        self.rejected_dates.update(
+            report_rejected(
+                "billing_inflair_recon_report", {"flt_date": rejects}, DATE_REJECTED
+            )
+        )
+
+        if not df.empty:
+            print(f"Total records found: {len(df)}")
+        else:
+            print("No data records found")
+
+        try:
+            if not df.empty:
+                self.catering_invoice_repository.insert_frame(df, metrics=self.metrics)
+                print(
+                    f"Successfully inserted {len(df)} "
+                    "billing reconciliation records into the database"
+                )
+                self.mark_dirty_flight_dates(df["flt_date"].unique())
+            else:
+                print("No data to insert")
+        except Exception as e:
+            # Raised so the ingestion is recorded as failed and retried
+            print(f"Error inserting billing reconciliation data: {e}")
+            raise
+
+        if return_records:
+            return df.to_dict(orient="records")
+        return len(df)
+
+    def _read_inflair_recon_report(self, file_path: str) -> pd.DataFrame:
+        """The Inflair recon report below its header, without the footer"""
         extension = os.path.splitext(file_path)[1].lower()
-        MAX_HEADER_SEARCH_LINES = 15
-        DEFAULT_HEADER_FALLBACK = 8
         skip_rows = 0
         df = None
 
         if extension == ".csv":
             with open(file_path, "r", encoding="utf-8") as f:
                 lines = []
-                for i in range(MAX_HEADER_SEARCH_LINES):
+                for i in range(RECON_HEADER_SEARCH_LINES):
                     try:
                         line = f.readline()
                         if not line:
@@ -216,28 +345,16 @@ class FileReadersService:
                         skip_rows = i
                         break
                 else:
-                    skip_rows = DEFAULT_HEADER_FALLBACK
+                    skip_rows = RECON_HEADER_FALLBACK_ROW
 
             df = pd.read_csv(file_path, skiprows=skip_rows)
 
         elif extension in [".xls", ".xlsx"]:
-            engine = "openpyxl" if extension == ".xlsx" else "xlrd"
-
-            try:
-                df_temp = pd.read_excel(file_path, nrows=15, engine=engine, header=None)
 
-                for idx, row in df_temp.iterrows():
-                    if str(row[0]).strip() == "Facility":
-                        skip_rows = idx
-                        break
-                else:
-                    skip_rows = DEFAULT_HEADER_FALLBACK
-
-            except Exception as e:
-                print(f"Error reading header: {e}")
-                skip_rows = DEFAULT_HEADER_FALLBACK
-
-            df = pd.read_excel(file_path, skiprows=skip_rows, engine=engine)
+            # Parse the sheet once and find the header row in the parsed rows
+            sheet = read_spreadsheet(file_path, header=None)
+            skip_rows = recon_header_row(sheet.iloc[:RECON_HEADER_SEARCH_LINES, 0])
+            df = frame_below_header(sheet, skip_rows)
 
         else:
             raise ValueError(
@@ -250,6 +367,70 @@ class FileReadersService:
             if len(df) > 2:
                 df = df.iloc[:-2]
 
+        return df
+
+    def _stream_inflair_recon_report(self, file_path: str) -> int:
+        """
+        Read and insert the Inflair recon report batch by batch, in one
+        transaction so that a failed batch leaves nothing of the file behind
+        """
+        rows = iter_sheet_rows(file_path)
+        leading = list(islice(rows, RECON_HEADER_SEARCH_LINES))
+        skip_rows = recon_header_row(
+            pd.Series([row[0] if row else None for row in leading])
+        )
+        header = leading[skip_rows] if skip_rows < len(leading) else next(rows, ())
+        rows = chain(leading[skip_rows + 1 :], rows)
+        # Blank rows and the 2 footer rows of the report are left out
+        rows = drop_last(
+            (row for row in rows if any(value is not None for value in row)), 2
+        )
+
+        inserted = 0
+        flight_dates = set()
+        rejects = {}
+        integer_rejects = {}
+        self.metrics.count("parse", bytes=file_size(file_path))
+        try:
+            for df in self.metrics.iterate(
+                "parse", iter_frames(rows, header_names(header))
+            ):
+                self.metrics.count("parse", rows=len(df))
+                with self.metrics.stage("normalize"):
+                    df = self._inflair_recon_frame(df, rejects)
+                self.metrics.count("normalize", rows=len(df))
+                if df.empty:
+                    continue
+                self.catering_invoice_repository.insert_frame(
+                    df, metrics=self.metrics, commit=False, rejects=integer_rejects
+                )
+                inserted += len(df)
+                flight_dates.update(df["flt_date"].unique())
+            with self.metrics.stage("commit"):
+                self.session.commit()
+        except Exception as e:
+            self.session.rollback()
+            print(
+                f"Error inserting billing reconciliation data, no rows were stored: {e}"
+            )
+            raise
+
+        self.rejected_dates.update(
+            report_rejected(
+                "billing_inflair_recon_report", {"flt_date": rejects}, DATE_REJECTED
+            )
+        )
+        report_rejected(
+            "billing_inflair_recon_report", integer_rejects, INTEGER_REJECTED
+        )
+        print(f"Successfully inserted {inserted} billing reconciliation records")
+        self.mark_dirty_flight_dates(flight_dates)
+        return inserted
+
+    def _inflair_recon_frame(
+        self, df: pd.DataFrame, rejects: Dict[Any, int]
+    ) -> pd.DataFrame:
+        """(A batch of) the Inflair recon report below its header, renamed"""
         df.columns = [
             col.strip() if isinstance(col, str) else col for col in df.columns
         ]
@@ -290,51 +471,24 @@ class FileReadersService:
         df = df.rename(columns=column_mapping)
 
         if "flt_no" in df.columns:
-            df["flt_no"] = df["flt_no"].apply(
-                lambda x: (
-                    f"0{x}" if isinstance(x, (int, float)) and x < 100 else str(x)
-                )
-            )
+            df["flt_no"] = zero_pad(df["flt_no"], FLIGHT_NUMBER_WIDTH)
 
         if "flt_date" in df.columns:
-            df["flt_date"] = df["flt_date"].apply(format_date)
+            df["flt_date"] = parse_dates(df["flt_date"], rejects)
 
+        df = normalize_text_columns(df)
         for col in ["pax", "qty", "unit_price", "total_amount"]:
             if col in df.columns:
-                df[col] = df[col].astype(str)
+                df[col] = to_text(df[col])
 
         df = df.replace({np.nan: None})
 
         df = df[df["facility"].notna()]
 
-        data = df.to_dict(orient="records")
-
-        if data:
-            print("First record:", data[0])
-            print(f"Total records found: {len(data)}")
-        else:
-            print("No data records found")
-
-        try:
-            if data:
-                model_instances = [CateringInvoiceReport(**item) for item in data]
-                self.catering_invoice_repository.bulk_insert(model_instances)
-                print(
-                    f"Successfully inserted {len(data)} "
-                    "billing reconciliation records into the database"
-                )
-            else:
-                print("No data to insert")
-        except Exception as e:
-            print(f"Error inserting billing reconciliation data: {e}")
-            import traceback
-
-            print(traceback.format_exc())
-
-        return data
+        return df
 
     def pricing_read_inflair(self, file_path: str) -> List[Dict[str, Any]]:
-        df = pd.read_excel(file_path, skiprows=8)
+        df = read_spreadsheet(file_path, skiprows=8)
 
         df.columns = [
             "id",
@@ -357,10 +511,15 @@ class FileReadersService:
         df = df[~df["id"].astype(str).str.match(r"^-+$", na=False)]
 
         df["price"] = pd.to_numeric(df["price"], errors="coerce").round(3)
-        df["start_date"] = df["start_date"].apply(format_date)
-        df["end_date"] = df["end_date"].apply(format_date)
-        df["created_date"] = df["created_date"].apply(format_date)
+        rejects_by_column = {}
+        for col in ["start_date", "end_date", "created_date"]:
+            rejects_by_column[col] = {}
+            df[col] = parse_dates(df[col], rejects_by_column[col])
+        self.rejected_dates.update(
+            report_rejected("pricing_read_inflair", rejects_by_column, DATE_REJECTED)
+        )
 
+        df = normalize_text_columns(df)
         df = df.replace({np.nan: None})
 
         result = df.to_dict(orient="records")
@@ -368,58 +527,104 @@ class FileReadersService:
         return result
 
     def pricing_read_promeus_with_flight_classes(
-        self, file_path: str
+        self, file_path: str, stream: bool = None
     ) -> List[Dict[str, Any]]:
-        df = pd.read_excel(
-            file_path, sheet_name="Price History Report", engine="openpyxl", header=None
-        )
+        if should_stream(file_path, stream):
+            return [
+                record
+                for batch in self.stream_pricing_promeus_with_flight_classes(file_path)
+                for record in batch
+            ]
 
-        records = []
-        current_class = None
-        header_processed = False
-
-        for index, row in df.iterrows():
-            first_col = row[0]
-            service_code = row[2]
-            description = row[3]
-            currency = row[4]
-            price = row[5]
-
-            if (
-                pd.isna(service_code)
-                and pd.isna(description)
-                and pd.isna(currency)
-                and pd.isna(price)
-                and isinstance(first_col, str)
-            ):
-                current_class = first_col.strip()
-                continue
-            if (
-                not header_processed
-                and isinstance(service_code, str)
-                and service_code == "Service Code"
-            ):
-                header_processed = True
-                continue
-            if (
-                not pd.isna(service_code)
-                and not pd.isna(description)
-                and not pd.isna(price)
-            ):
-                records.append(
-                    {
-                        "class": current_class,
-                        "facility": first_col,
-                        "service_code": service_code,
-                        "description": description,
-                        "currency": currency,
-                        "price": price,
-                    }
-                )
+        df = read_spreadsheet(file_path, sheet_name="Price History Report", header=None)
+        records, _, _ = self._promeus_price_records(df)
 
         # save_json(records, "pricing_promeus.json")
         return records
 
+    def stream_pricing_promeus_with_flight_classes(
+        self, file_path: str, batch_size: int = None
+    ) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Records of the Promeus price book in batches, reading the sheet row by
+        row in openpyxl read-only mode; the class of the last section carries
+        over from one batch to the next
+        """
+        rows = iter_sheet_rows(file_path, "Price History Report")
+        first_row = next(rows, None)
+        if first_row is None:
+            return
+        columns = list(range(max(len(first_row), 6)))
+
+        current_class = None
+        header_seen = False
+        for df in iter_frames(chain([first_row], rows), columns, batch_size):
+            records, current_class, header_seen = self._promeus_price_records(
+                df, current_class, header_seen
+            )
+            if records:
+                yield records
+
+    def _promeus_price_records(
+        self, df: pd.DataFrame, current_class: str = None, header_seen: bool = False
+    ):
+        """
+        Records of (a batch of) the Promeus price book read with header=None
+
+        Returns
+        -------
+        (records, class of the last section, whether the header row was seen)
+
+        Only the class labels are stripped; the other values are kept as read.
+        """
+        first_col = df[0]
+        service_code = df[2]
+        description = df[3]
+        currency = df[4]
+        price = df[5]
+
+        # Class section headers: a label in the first column and nothing else
+        is_class_row = (
+            service_code.isna()
+            & description.isna()
+            & currency.isna()
+            & price.isna()
+            & is_text(first_col)
+        )
+        classes = normalize_text(first_col.where(is_class_row)).ffill()
+        if current_class is not None:
+            classes = classes.fillna(current_class)
+
+        # Only the first "Service Code" row is the column header
+        is_header_row = pd.Series(False, index=df.index)
+        header_rows = df.index[service_code.eq("Service Code")]
+        if not header_seen and len(header_rows):
+            is_header_row[header_rows[0]] = True
+            header_seen = True
+
+        is_data_row = (
+            ~is_class_row
+            & ~is_header_row
+            & service_code.notna()
+            & description.notna()
+            & price.notna()
+        )
+
+        records = pd.DataFrame(
+            {
+                "class": classes.astype(object).where(classes.notna(), None),
+                "facility": first_col,
+                "service_code": service_code,
+                "description": description,
+                "currency": currency,
+                "price": price,
+            }
+        )[is_data_row].to_dict(orient="records")
+
+        if len(classes) and pd.notna(classes.iloc[-1]):
+            current_class = classes.iloc[-1]
+        return records, current_class, header_seen
+
     def read_flight_class_mapping(self, file_path: str) -> List[Dict[str, Any]]:
         """
         Reads the flight class mapping file from the first sheet (Class Map)
@@ -437,37 +642,8 @@ class FileReadersService:
             List of flight class mapping records
         """
         try:
-            df = pd.read_excel(file_path, sheet_name=0, engine="openpyxl")
-
-            df.dropna(how="all", inplace=True)
-            df.dropna(axis=1, how="all", inplace=True)
-            df.reset_index(drop=True, inplace=True)
-
-            column_mapping = {
-                "Class": "promeus_class",
-                "Inflair Class": "inflair_class",
-                "Item Group": "item_group",
-                "Item code": "item_code",
-                "Item Desc": "item_desc",
-                "A/L Bill Code": "al_bill_code",
-                "A/L Bill Desc": "al_bill_desc",
-                "Bill Catg": "bill_catg",
-            }
-
-            missing_columns = set(column_mapping.keys()) - set(df.columns)
-            if missing_columns:
-                print(f"Warning: Missing columns: {missing_columns}")
-
-            df = df.rename(columns=column_mapping)
-
-            for col in df.select_dtypes(include=["object"]).columns:
-                df[col] = df[col].apply(
-                    lambda x: x.strip() if isinstance(x, str) else x
-                )
-
-            df = df.replace({np.nan: None})
-
-            data = df.to_dict(orient="records")
+            df = read_spreadsheet(file_path, sheet_name=0)
+            data = self._flight_class_mapping_records(df)
 
             print(f"Successfully read {len(data)} flight class mapping records")
 
@@ -520,65 +696,8 @@ class FileReadersService:
             List of flight number mapping records
         """
         try:
-            df = pd.read_excel(file_path, sheet_name=1, engine="openpyxl")
-
-            df.dropna(how="all", inplace=True)
-            df.dropna(axis=1, how="all", inplace=True)
-            df.reset_index(drop=True, inplace=True)
-
-            print("Detected columns:", df.columns.tolist())
-
-            column_mapping = {
-                "Promeus Code": "air_company_flight_number",
-                "Inflair Code": "catering_flight_number",
-            }
-
-            df = df.rename(columns=column_mapping)
-
-            expected_model_columns = [
-                "air_company_flight_number",
-                "catering_flight_number",
-            ]
-
-            available_model_columns = [
-                col for col in expected_model_columns if col in df.columns
-            ]
-
-            if not available_model_columns:
-                raise ValueError(
-                    "No expected columns found after mapping. "
-                    f"Available columns: {df.columns.tolist()}"
-                )
-
-            df = df[available_model_columns]
-
-            for col in df.select_dtypes(include=["object"]).columns:
-                df[col] = df[col].apply(
-                    lambda x: x.strip() if isinstance(x, str) else x
-                )
-
-            if "air_company_flight_number" in df.columns:
-                df["air_company_flight_number"] = df[
-                    "air_company_flight_number"
-                ].astype(str)
-            if "catering_flight_number" in df.columns:
-                df["catering_flight_number"] = df["catering_flight_number"].astype(str)
-
-            df = df.replace({np.nan: None})
-            df = df.replace({"nan": None})
-
-            valid_rows = df[
-                (
-                    df["air_company_flight_number"].notna()
-                    & (df["air_company_flight_number"] != "None")
-                )
-                | (
-                    df["catering_flight_number"].notna()
-                    & (df["catering_flight_number"] != "None")
-                )
-            ]
-
-            data = valid_rows.to_dict(orient="records")
+            df = read_spreadsheet(file_path, sheet_name=1)
+            data = self._flight_number_mapping_records(df)
 
             try:
                 if data:
@@ -607,6 +726,415 @@ class FileReadersService:
             print(traceback.format_exc())
             return []
 
+    def _flight_class_mapping_records(self, df: pd.DataFrame) -> List[Dict[str, Any]]:
+        """Records of the Class Map sheet, keyed by FlightClassMapping fields"""
+        df.dropna(how="all", inplace=True)
+        df.dropna(axis=1, how="all", inplace=True)
+        df.reset_index(drop=True, inplace=True)
+
+        column_mapping = {
+            "Class": "promeus_class",
+            "Inflair Class": "inflair_class",
+            "Item Group": "item_group",
+            "Item code": "item_code",
+            "Item Desc": "item_desc",
+            "A/L Bill Code": "al_bill_code",
+            "A/L Bill Desc": "al_bill_desc",
+            "Bill Catg": "bill_catg",
+        }
+
+        missing_columns = set(column_mapping.keys()) - set(df.columns)
+        if missing_columns:
+            print(f"Warning: Missing columns: {missing_columns}")
+
+        df = df.rename(columns=column_mapping)
+
+        df = normalize_text_columns(df)
+
+        df = df.replace({np.nan: None})
+
+        return df.to_dict(orient="records")
+
+    def _flight_number_mapping_records(self, df: pd.DataFrame) -> List[Dict[str, Any]]:
+        """Records of the Flight No. Map sheet, keyed by FlightNumberMapping fields"""
+        df.dropna(how="all", inplace=True)
+        df.dropna(axis=1, how="all", inplace=True)
+        df.reset_index(drop=True, inplace=True)
+
+        print("Detected columns:", df.columns.tolist())
+
+        column_mapping = {
+            "Promeus Code": "air_company_flight_number",
+            "Inflair Code": "catering_flight_number",
+        }
+
+        df = df.rename(columns=column_mapping)
+
+        expected_model_columns = [
+            "air_company_flight_number",
+            "catering_flight_number",
+        ]
+
+        available_model_columns = [
+            col for col in expected_model_columns if col in df.columns
+        ]
+
+        if not available_model_columns:
+            raise ValueError(
+                "No expected columns found after mapping. "
+                f"Available columns: {df.columns.tolist()}"
+            )
+
+        df = df[available_model_columns]
+
+        df = normalize_text_columns(df)
+
+        for col in available_model_columns:
+            df[col] = to_text(df[col])
+
+        df = df.replace({np.nan: None})
+
+        valid_rows = df[
+            (
+                df["air_company_flight_number"].notna()
+                & (df["air_company_flight_number"] != "None")
+            )
+            | (
+                df["catering_flight_number"].notna()
+                & (df["catering_flight_number"] != "None")
+            )
+        ]
+
+        return valid_rows.to_dict(orient="records")
+
+    def read_flight_mappings(self, file_path: str) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Reads both sheets of the flight mapping workbook, opening and parsing
+        it once, and replaces the contents of the FlightClassMapping and
+        FlightNumberMapping tables in one transaction.
+
+        Parameters
+        ----------
+        file_path : str
+            Path to the Excel file
+
+        Returns
+        -------
+        Dict[str, List[Dict[str, Any]]]
+            Flight class and flight number mapping records by table
+        """
+        with pd.ExcelFile(file_path, engine=excel_engine(file_path)) as workbook:
+            class_df = pd.read_excel(workbook, sheet_name=0)
+            number_df = pd.read_excel(workbook, sheet_name=1)
+
+        class_data = self._flight_class_mapping_records(class_df)
+        number_data = self._flight_number_mapping_records(number_df)
+        # An empty sheet would wipe a mapping table; keep the current mappings
+        if not class_data or not number_data:
+            raise ValueError("Please share the correct file.")
+
+        try:
+            self.flight_class_mapping_repository.replace_all(
+                [FlightClassMapping(**item) for item in class_data]
+            )
+            self.flight_number_mapping_repository.replace_all(
+                [FlightNumberMapping(**item) for item in number_data]
+            )
+            self.session.commit()
+        except Exception as e:
+            self.session.rollback()
+            print(f"Error replacing flight mapping data: {e}")
+            raise
+
+        print(
+            f"Successfully replaced {len(class_data)} flight class and "
+            f"{len(number_data)} flight number mapping records"
+        )
+        return {
+            "flight_class_mapping": class_data,
+            "flight_number_mapping": number_data,
+        }
+
+
+# The Inflair recon report header ("Facility" row) is searched in these first
+# rows; without it the header is taken to be on the fallback row
+RECON_HEADER_SEARCH_LINES = 15
+RECON_HEADER_FALLBACK_ROW = 8
+
+
+def recon_header_row(first_col: pd.Series) -> int:
+    """Position of the "Facility" header among the first cells of the rows"""
+    header_rows = np.flatnonzero(
+        first_col.astype(str).str.strip().eq("Facility").to_numpy()
+    )
+    if len(header_rows):
+        return int(header_rows[0])
+    return RECON_HEADER_FALLBACK_ROW
+
+
+PROMEUS_INVOICE_COLUMNS = {"SUPPLIER", "FLIGHT DATE", "FLIGHT NO.", "DEP", "ARR"}
+
+
+def check_promeus_invoice_columns(columns):
+    """Reject files that are not a Promeus invoice report"""
+    if not PROMEUS_INVOICE_COLUMNS.issubset(columns):
+        raise ValueError("Please share the correct file.")
+
+
+# .xlsx files of at least this many bytes are read row by row in openpyxl
+# read-only mode and loaded in batches, instead of as one DataFrame
+STREAM_MIN_BYTES_ENV = "CCS_STREAM_MIN_BYTES"
+STREAM_MIN_BYTES = 20 * 1024 * 1024
+STREAM_BATCH_SIZE = 5000
+
+
+def file_size(file_path: str) -> int:
+    """Size of the file in bytes, or None when there is no such file"""
+    return os.path.getsize(file_path) if os.path.isfile(file_path) else None
+
+
+def should_stream(file_path: str, stream: bool = None) -> bool:
+    """
+    Whether to stream a workbook: as requested, else when it is an .xlsx file
+    of at least CCS_STREAM_MIN_BYTES (default STREAM_MIN_BYTES) bytes
+    """
+    if stream is not None:
+        return stream
+    if os.path.splitext(file_path)[1].lower() != ".xlsx":
+        return False
+    if not os.path.isfile(file_path):
+        return False
+    min_bytes = int(os.getenv(STREAM_MIN_BYTES_ENV, STREAM_MIN_BYTES))
+    return os.path.getsize(file_path) >= min_bytes
+
+
+def iter_sheet_rows(file_path: str, sheet_name=0) -> Iterator[tuple]:
+    """
+    Cell values of the rows of a sheet (by name or position), read with
+    openpyxl in read-only mode so only the current row is held in memory
+    """
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        if isinstance(sheet_name, int):
+            sheet = workbook.worksheets[sheet_name]
+        else:
+            sheet = workbook[sheet_name]
+        yield from sheet.iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+
+def header_names(values) -> List[Any]:
+    """Column names from a header row, "Unnamed: n" for empty cells"""
+    return [
+        f"Unnamed: {position}" if pd.isna(name) else name
+        for position, name in enumerate(values)
+    ]
+
+
+def iter_frames(
+    rows: Iterable[tuple], columns: List[Any], batch_size: int = None
+) -> Iterator[pd.DataFrame]:
+    """
+    DataFrames of up to batch_size (default STREAM_BATCH_SIZE) rows, named
+    after columns and typed as pd.read_excel would have typed them
+    """
+    batch_size = batch_size or STREAM_BATCH_SIZE
+    width = len(columns)
+    rows = iter(rows)
+    while True:
+        batch = [
+            tuple(row[:width]) + (None,) * (width - len(row))
+            for row in islice(rows, batch_size)
+        ]
+        if not batch:
+            return
+        yield pd.DataFrame(batch, columns=columns).infer_objects()
+
+
+def drop_last(items: Iterable, count: int) -> Iterator:
+    """
+    The items except the last count ones, as df.iloc[:-count] does when
+    there are more than count items (otherwise all of them)
+    """
+    held = deque()
+    emitted = False
+    for item in items:
+        held.append(item)
+        if len(held) > count:
+            emitted = True
+            yield held.popleft()
+    if not emitted:
+        yield from held
+
+
+# Spreadsheet engine to read workbooks with (e.g. "openpyxl"), overriding the
+# default of the fastest engine installed
+EXCEL_ENGINE_ENV = "CCS_EXCEL_ENGINE"
+
+
+@lru_cache(maxsize=None)
+def calamine_available() -> bool:
+    """Whether pandas can read workbooks with the native python-calamine engine"""
+    version = tuple(int(part) for part in pd.__version__.split(".")[:2])
+    return version >= (2, 2) and find_spec("python_calamine") is not None
+
+
+def excel_engine(file_path: str) -> str:
+    """
+    Engine to read a workbook with: CCS_EXCEL_ENGINE when set, else calamine
+    when installed (pandas >= 2.2), else openpyxl (xlrd for .xls files)
+    """
+    engine = os.getenv(EXCEL_ENGINE_ENV)
+    if engine:
+        return engine
+    if calamine_available():
+        return "calamine"
+    if os.path.splitext(file_path)[1].lower() == ".xls":
+        return "xlrd"
+    return "openpyxl"
+
+
+def read_spreadsheet(file_path: str, **kwargs) -> pd.DataFrame:
+    """pd.read_excel with the engine chosen by excel_engine"""
+    return pd.read_excel(file_path, engine=excel_engine(file_path), **kwargs)
+
+
+# Catering flight numbers are stored zero-padded to this many digits ("45" -> "045")
+FLIGHT_NUMBER_WIDTH = 3
+
+# Text date formats accepted by the readers, tried in order
+DATE_FORMATS = ("%d/%m/%Y", "%d/%m/%y")
+
+# Reason printed for date values that match none of DATE_FORMATS
+DATE_REJECTED = "could not be parsed as dates"
+
+
+def parse_dates(values: pd.Series, rejects: Dict[Any, int] = None) -> pd.Series:
+    """
+    Vectorized format_date for a whole column.
+
+    Each distinct value is parsed once. Timestamps and dates are converted
+    directly; strings go through one explicit-format pd.to_datetime pass per
+    DATE_FORMATS entry, each pass only over the strings still unparsed.
+
+    Parameters
+    ----------
+    values : pd.Series
+        Column to parse
+    rejects : Dict[Any, int], optional
+        Collects the non-empty strings that matched no format, with their
+        number of occurrences, instead of printing each failure
+
+    Returns
+    -------
+    pd.Series
+        datetime.date values (None where missing or unparseable)
+    """
+    codes, uniques = pd.factorize(values)
+    uniques = pd.Series(np.asarray(uniques, dtype=object), dtype=object)
+    parsed = np.full(len(uniques), None, dtype=object)
+
+    for position, value in uniques.items():
+        if isinstance(value, datetime):
+            parsed[position] = value.date()
+        elif isinstance(value, date):
+            parsed[position] = value
+
+    is_text = uniques.map(lambda value: isinstance(value, str)).astype(bool)
+    pending = uniques[is_text].str.strip()
+    pending = pending[pending != ""]
+    for fmt in DATE_FORMATS:
+        if pending.empty:
+            break
+        converted = pd.to_datetime(pending, format=fmt, errors="coerce")
+        matched = converted.notna()
+        parsed[pending.index[matched]] = [
+            timestamp.date() for timestamp in converted[matched]
+        ]
+        pending = pending[~matched]
+
+    if rejects is not None and not pending.empty:
+        counts = np.bincount(codes[codes >= 0], minlength=len(uniques))
+        for position in pending.index:
+            value = uniques[position]
+            rejects[value] = rejects.get(value, 0) + int(counts[position])
+
+    result = np.full(len(codes), None, dtype=object)
+    present = codes >= 0
+    result[present] = parsed[codes[present]]
+    return pd.Series(result, index=values.index, dtype=object)
+
+
+# Text that stands for a missing value once a code has gone through astype(str)
+NULL_TOKENS = ("", "nan", "NaN", "None", "NaT")
+
+# Inferred dtypes of columns that contain strings (see pandas' .str accessor)
+_TEXT_INFERRED_DTYPES = ("string", "mixed", "mixed-integer")
+
+
+def normalize_text(values: pd.Series) -> pd.Series:
+    """Strip the strings of a column, leaving other values untouched"""
+    if pd.api.types.infer_dtype(values, skipna=True) not in _TEXT_INFERRED_DTYPES:
+        return values
+    stripped = values.str.strip()
+    return stripped.where(stripped.notna(), values)
+
+
+def frame_below_header(sheet: pd.DataFrame, header_row: int) -> pd.DataFrame:
+    """
+    The rows of a sheet read with header=None that follow header_row, named
+    after it, as pd.read_excel(skiprows=header_row) would have returned them
+    """
+    df = sheet.iloc[header_row + 1 :].reset_index(drop=True)
+    if header_row < len(sheet):
+        df.columns = header_names(sheet.iloc[header_row])
+    return df.infer_objects()
+
+
+def is_text(values: pd.Series) -> pd.Series:
+    """Boolean mask of the values that are strings"""
+    if pd.api.types.infer_dtype(values, skipna=True) not in _TEXT_INFERRED_DTYPES:
+        return pd.Series(False, index=values.index)
+    return values.str.len().notna()
+
+
+def normalize_text_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """normalize_text over every text column of df, one pass per column"""
+    for col in df.select_dtypes(include=["object", "string"]).columns:
+        df[col] = normalize_text(df[col])
+    return df
+
+
+def to_text(values: pd.Series) -> pd.Series:
+    """
+    astype(str) that keeps missing values as None rather than the text "nan",
+    and writes whole numbers without ".0" whether the column was read as
+    integers or, because of a missing value, as floats
+    """
+    text = values.astype(str).str.replace(r"^(-?\d+)\.0$", r"\1", regex=True)
+    return text.astype(object).where(values.notna(), None)
+
+
+def _code_text(values: pd.Series) -> pd.Series:
+    """Codes as stripped text, with numbers read as floats back in integer form"""
+    return (
+        values.astype(str).str.strip().str.replace(r"^(-?\d+)\.0$", r"\1", regex=True)
+    )
+
+
+def extract_digits(values: pd.Series) -> pd.Series:
+    """Digits of each code ("ZZ0123" -> "0123"); None when there are none"""
+    digits = _code_text(values).str.replace(r"\D", "", regex=True)
+    return digits.astype(object).where(values.notna() & (digits != ""), None)
+
+
+def zero_pad(values: pd.Series, width: int) -> pd.Series:
+    """All-digit codes left-padded with zeros to width; missing values as None"""
+    text = _code_text(values)
+    padded = text.where(~text.str.fullmatch(r"\d+"), text.str.zfill(width))
+    return padded.astype(object).where(values.notna() & ~text.isin(NULL_TOKENS), None)
+
 
 def format_date(date_value) -> date:
     """
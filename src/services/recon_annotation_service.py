@@ -1,7 +1,7 @@
 import logging
 import uuid
 from datetime import datetime
-from typing import Any, Dict, Optional, Tuple
+from typing import Any, Dict, List, Optional, Tuple
 
 from sqlalchemy.orm import Session
 
@@ -12,6 +12,9 @@ from repositories.recon_annotation_repository import ReconAnnotationRepository
 
 logger = logging.getLogger(__name__)
 
+MAX_BULK_ANNOTATIONS = 1000
+MAX_BATCH_RECONCILIATION_IDS = 500
+
 
 class ReconAnnotationService:
     """Service layer for reconciliation annotations"""
@@ -149,6 +152,195 @@ class ReconAnnotationService:
                 "data": None,
             }
 
+    def _validate_bulk_item(
+        self, item: Any
+    ) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        """
+        Validate one item of a bulk request
+
+        Args:
+            item: Raw item from the request body
+
+        Returns:
+            Tuple of (row, error). Rows with an annotation_id are updates,
+            rows with a reconciliation_id are creates.
+        """
+        if not isinstance(item, dict):
+            return None, "Item must be an object"
+
+        annotation_text = item.get("annotation")
+        status = item.get("status")
+
+        status_enum = None
+        if status is not None:
+            status_validation = self._validate_status(status)
+            if not status_validation["valid"]:
+                return None, status_validation["error"]
+            status_enum = status_validation["enum_value"]
+
+        if item.get("annotation_id"):
+            annotation_uuid, error_response = self._parse_uuid(
+                str(item["annotation_id"]), "annotation_id"
+            )
+            if error_response:
+                return None, error_response["error"]
+            if annotation_text is None and status is None:
+                return (
+                    None,
+                    "At least one field 'annotation' or 'status' "
+                    "must be provided for update",
+                )
+            return {
+                "annotation_id": annotation_uuid,
+                "annotation": annotation_text,
+                "status": status_enum,
+            }, None
+
+        if not item.get("reconciliation_id"):
+            return None, "Field 'reconciliation_id' is required and cannot be empty"
+        reconciliation_uuid, error_response = self._parse_uuid(
+            str(item["reconciliation_id"]), "reconciliation_id"
+        )
+        if error_response:
+            return None, error_response["error"]
+        if not annotation_text:
+            return None, "Field 'annotation' is required and cannot be empty"
+
+        return {
+            "reconciliation_id": reconciliation_uuid,
+            "annotation": annotation_text,
+            "status": status_enum,
+        }, None
+
+    def bulk_save_annotations(self, items: List[Any]) -> Dict[str, Any]:
+        """
+        Create or update many annotations in one transaction
+
+        Items carrying an annotation_id update that annotation, the others
+        create a new annotation for their reconciliation_id. Referenced IDs
+        are validated with one IN query per kind and the writes go out as one
+        multi-row INSERT and one executemany UPDATE.
+
+        Args:
+            items: List of {reconciliation_id | annotation_id, annotation, status}
+
+        Returns:
+            Dictionary with operation result and one result per item
+        """
+        try:
+            if not isinstance(items, list) or not items:
+                return {
+                    "success": False,
+                    "error": "Field 'items' must be a non-empty list",
+                    "data": None,
+                }
+            if len(items) > MAX_BULK_ANNOTATIONS:
+                return {
+                    "success": False,
+                    "error": f"At most {MAX_BULK_ANNOTATIONS} items "
+                    "are allowed per request",
+                    "data": None,
+                }
+
+            results: List[Optional[Dict[str, Any]]] = [None] * len(items)
+            creates = []
+            updates = []
+
+            for index, item in enumerate(items):
+                row, error = self._validate_bulk_item(item)
+                if error:
+                    results[index] = {
+                        "index": index,
+                        "success": False,
+                        "error": error,
+                        "data": None,
+                    }
+                elif "annotation_id" in row:
+                    updates.append((index, row))
+                else:
+                    creates.append((index, row))
+
+            existing_reconciliations = self.reconciliation_repository.get_existing_ids(
+                list({row["reconciliation_id"] for _, row in creates})
+            )
+            existing_annotations = self.annotation_repository.get_existing_ids(
+                list({row["annotation_id"] for _, row in updates})
+            )
+
+            valid_creates = []
+            for index, row in creates:
+                if row["reconciliation_id"] in existing_reconciliations:
+                    valid_creates.append((index, row))
+                else:
+                    results[index] = {
+                        "index": index,
+                        "success": False,
+                        "error": "Reconciliation item not found",
+                        "data": None,
+                    }
+
+            valid_updates = []
+            for index, row in updates:
+                if row["annotation_id"] in existing_annotations:
+                    valid_updates.append((index, row))
+                else:
+                    results[index] = {
+                        "index": index,
+                        "success": False,
+                        "error": "Annotation not found",
+                        "data": None,
+                    }
+
+            created = self.annotation_repository.bulk_create(
+                [row for _, row in valid_creates]
+            )
+            for (index, _), values in zip(valid_creates, created):
+                results[index] = {
+                    "index": index,
+                    "success": True,
+                    "error": None,
+                    "data": {key: str(value) for key, value in values.items()},
+                }
+
+            updated_at = self.annotation_repository.bulk_update(
+                [row for _, row in valid_updates]
+            )
+            for index, row in valid_updates:
+                results[index] = {
+                    "index": index,
+                    "success": True,
+                    "error": None,
+                    "data": {
+                        "Id": str(row["annotation_id"]),
+                        "DataAtualizacao": str(updated_at),
+                    },
+                }
+
+            succeeded = sum(1 for result in results if result["success"])
+            logger.info(
+                f"Bulk annotations saved: {len(valid_creates)} created, "
+                f"{len(valid_updates)} updated, {len(items) - succeeded} failed"
+            )
+
+            return {
+                "success": True,
+                "error": None,
+                "data": {
+                    "results": results,
+                    "total": len(items),
+                    "succeeded": succeeded,
+                    "failed": len(items) - succeeded,
+                },
+            }
+
+        except Exception as e:
+            logger.error(f"Error saving bulk annotations: {str(e)}", exc_info=True)
+            return {
+                "success": False,
+                "error": "Failed to save annotations",
+                "data": None,
+            }
+
     def get_annotation_by_id(self, annotation_id: str) -> Dict[str, Any]:
         """
         Get an annotation by its ID
@@ -238,6 +430,98 @@ class ReconAnnotationService:
                 "data": None,
             }
 
+    def get_annotations_by_reconciliation_ids(
+        self,
+        reconciliation_ids: List[Any],
+        limit_per_id: Optional[int] = None,
+        offset_per_id: int = 0,
+    ) -> Dict[str, Any]:
+        """
+        Get the annotations of many reconciliation items in one query
+
+        Unlike get_annotations_by_reconciliation_id the reconciliation rows
+        are not loaded; IDs without annotations return an empty list.
+
+        Args:
+            reconciliation_ids: UUIDs of the reconciliation items
+            limit_per_id: Optional maximum annotations returned per item
+            offset_per_id: Annotations to skip per item (newest first)
+
+        Returns:
+            Dictionary with operation result, annotations grouped by ID
+        """
+        try:
+            if not isinstance(reconciliation_ids, list) or not reconciliation_ids:
+                return {
+                    "success": False,
+                    "error": "Field 'reconciliation_ids' must be a non-empty list",
+                    "data": None,
+                }
+            if len(reconciliation_ids) > MAX_BATCH_RECONCILIATION_IDS:
+                return {
+                    "success": False,
+                    "error": f"At most {MAX_BATCH_RECONCILIATION_IDS} "
+                    "reconciliation_ids are allowed per request",
+                    "data": None,
+                }
+            if limit_per_id is not None and (
+                not isinstance(limit_per_id, int) or limit_per_id < 1
+            ):
+                return {
+                    "success": False,
+                    "error": "Field 'limit_per_id' must be a positive integer",
+                    "data": None,
+                }
+            if not isinstance(offset_per_id, int) or offset_per_id < 0:
+                return {
+                    "success": False,
+                    "error": "Field 'offset_per_id' must be a non-negative integer",
+                    "data": None,
+                }
+
+            reconciliation_uuids = []
+            for reconciliation_id in reconciliation_ids:
+                reconciliation_uuid, error_response = self._parse_uuid(
+                    str(reconciliation_id), "reconciliation_id"
+                )
+                if error_response:
+                    return error_response
+                if reconciliation_uuid not in reconciliation_uuids:
+                    reconciliation_uuids.append(reconciliation_uuid)
+
+            grouped = self.annotation_repository.get_by_reconciliation_ids(
+                reconciliation_uuids,
+                limit_per_id=limit_per_id,
+                offset_per_id=offset_per_id,
+            )
+
+            return {
+                "success": True,
+                "error": None,
+                "data": {
+                    "items": {
+                        str(reconciliation_uuid): {
+                            "annotations": [
+                                annotation.serialize()
+                                for annotation in group["annotations"]
+                            ],
+                            "total_count": group["total_count"],
+                        }
+                        for reconciliation_uuid, group in grouped.items()
+                    },
+                    "limit_per_id": limit_per_id,
+                    "offset_per_id": offset_per_id,
+                },
+            }
+
+        except Exception as e:
+            logger.error(f"Error getting batch annotations: {str(e)}", exc_info=True)
+            return {
+                "success": False,
+                "error": "Failed to get annotations",
+                "data": None,
+            }
+
     def update_annotation(
         self,
         annotation_id: str,
@@ -0,0 +1,418 @@
+import logging
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+
+from src.common.advisory_lock import RECONCILIATION_RUN_LOCK, advisory_lock
+from src.common.lambda_boto import invoke_lambda_async
+from src.enums.job_status_enum import JobStatusEnum
+from src.repositories.reconciliation_job_repository import ReconciliationJobRepository
+from src.repositories.reconciliation_repository import ReconciliationRepository
+from src.services.reconciliation_service import (
+    MATCH_MODES,
+    RECONCILIATION_MATCH_MODE,
+    ReconciliationService,
+)
+
+logger = logging.getLogger(__name__)
+
+# Name of the Lambda that runs jobs; when unset jobs run in-process (local runs)
+RECONCILIATION_JOB_FUNCTION_ENV = "RECONCILIATION_JOB_FUNCTION"
+
+# Dirty flight dates are reconciled once ingestion has been quiet for the
+# debounce period, or at the latest max delay after the first of them.
+RECONCILIATION_DEBOUNCE_SECONDS = int(
+    os.getenv("RECONCILIATION_DEBOUNCE_SECONDS", "300")
+)
+RECONCILIATION_MAX_DELAY_SECONDS = int(
+    os.getenv("RECONCILIATION_MAX_DELAY_SECONDS", "1800")
+)
+
+# A pending or running job without progress for this long has lost its
+# worker (workers record progress at least once per Lambda invocation) and
+# is marked failed instead of blocking new jobs.
+RECONCILIATION_JOB_STALE_SECONDS = int(
+    os.getenv("RECONCILIATION_JOB_STALE_SECONDS", "1800")
+)
+
+
+class LambdaJobExecutor:
+    """Runs jobs by invoking the reconciliation job Lambda asynchronously"""
+
+    def __init__(self, function_name):
+        self.function_name = function_name
+
+    def submit(self, job_id):
+        invoke_lambda_async(self.function_name, {"job_id": str(job_id)})
+
+
+class InProcessJobExecutor:
+    """
+    Runs jobs on a background thread of the current process, as a stand-in
+    for the job Lambda on local runs.
+
+    Args:
+        session_factory: context manager yielding a database session,
+            e.g. common.conexao_banco.get_session
+    """
+
+    def __init__(self, session_factory):
+        self.session_factory = session_factory
+        self._pool = ThreadPoolExecutor(max_workers=1)
+
+    def submit(self, job_id):
+        return self._pool.submit(self._run, job_id)
+
+    def _run(self, job_id):
+        with self.session_factory() as session:
+            return ReconciliationJobService(session, executor=self).run_job(job_id)
+
+
+def default_job_executor(session_factory):
+    """Lambda executor when RECONCILIATION_JOB_FUNCTION is set, else in-process"""
+    function_name = os.getenv(RECONCILIATION_JOB_FUNCTION_ENV)
+    if function_name:
+        return LambdaJobExecutor(function_name)
+    return InProcessJobExecutor(session_factory)
+
+
+class ReconciliationJobService:
+    """
+    Runs populate-style reconciliation as a resumable background job.
+
+    A job fixes its list of flight-date shards when it starts and commits
+    every shard together with its progress, so a crashed or timed-out run
+    continues from the last processed shard instead of starting over.
+    """
+
+    def __init__(self, db_session, executor=None):
+        self.session = db_session
+        self.executor = executor
+        self.job_repository = ReconciliationJobRepository(db_session)
+        self.reconciliation_repository = ReconciliationRepository(db_session)
+        self.reconciliation_service = ReconciliationService(db_session)
+
+    def _parse_job_id(self, job_id):
+        if isinstance(job_id, uuid.UUID):
+            return job_id
+        try:
+            return uuid.UUID(str(job_id))
+        except ValueError:
+            return None
+
+    def start_job(self, flight_dates=None, match_mode=None):
+        """
+        Create a pending job and hand it to the executor
+
+        Args:
+            flight_dates: Optional flight dates to limit the job to; by
+                default every source flight date is reconciled
+            match_mode: "line" or "flight", stored on the job so every shard
+                uses it; defaults to RECONCILIATION_MATCH_MODE
+
+        Returns:
+            Dictionary with the serialized job; a full run requested while
+            another full run of the same match mode is pending or running
+            joins that job instead,
+            unless that job has made no progress for
+            RECONCILIATION_JOB_STALE_SECONDS and is marked failed first
+        """
+        if match_mode is None:
+            match_mode = RECONCILIATION_MATCH_MODE
+        if match_mode not in MATCH_MODES:
+            return {
+                "success": False,
+                "error": f"Invalid match_mode: {match_mode}. "
+                f"Valid values are: {', '.join(MATCH_MODES)}",
+                "data": None,
+            }
+
+        shards = None
+        if flight_dates is not None:
+            shards = [flight_date.isoformat() for flight_date in flight_dates]
+
+        try:
+            self._expire_stale_jobs()
+            active_job = self.job_repository.get_active_job()
+            if (
+                shards is None
+                and active_job is not None
+                and active_job.FullRun
+                and active_job.MatchMode == match_mode
+            ):
+                self.session.commit()
+                return {
+                    "success": True,
+                    "error": None,
+                    "data": {**active_job.serialize(), "joined": True},
+                }
+
+            job = self.job_repository.create(shards=shards, match_mode=match_mode)
+            self.session.commit()
+        except Exception as e:
+            self.session.rollback()
+            logger.error(f"Error creating reconciliation job: {str(e)}")
+            return {"success": False, "error": str(e), "data": None}
+
+        return self._submit(job)
+
+    def trigger_dirty_dates(self):
+        """
+        Start one job for all flight dates marked dirty by ingestion, once
+        ingestion has been quiet for RECONCILIATION_DEBOUNCE_SECONDS (or the
+        oldest mark is RECONCILIATION_MAX_DELAY_SECONDS old). Meant to be
+        called on a schedule; a burst of files yields a single job.
+
+        Returns:
+            Dictionary with "triggered" and, when triggered, the job
+        """
+        first_marked, last_marked, now = self.job_repository.get_dirty_date_window()
+        if last_marked is None:
+            return self._not_triggered("No dirty flight dates")
+
+        quiet = now - last_marked >= timedelta(seconds=RECONCILIATION_DEBOUNCE_SECONDS)
+        overdue = now - first_marked >= timedelta(
+            seconds=RECONCILIATION_MAX_DELAY_SECONDS
+        )
+        if not (quiet or overdue):
+            return self._not_triggered("Waiting for ingestion to settle")
+
+        try:
+            self._expire_stale_jobs()
+            if self.job_repository.get_active_job() is not None:
+                self.session.commit()
+                return self._not_triggered("A reconciliation job is in progress")
+
+            flight_dates = self.job_repository.claim_dirty_dates(last_marked)
+            if not flight_dates:
+                self.session.commit()
+                return self._not_triggered("No dirty flight dates")
+            job = self.job_repository.create(
+                shards=[flight_date.isoformat() for flight_date in flight_dates],
+                match_mode=RECONCILIATION_MATCH_MODE,
+            )
+            self.session.commit()
+        except Exception as e:
+            self.session.rollback()
+            logger.error(f"Error triggering reconciliation for dirty dates: {e}")
+            return {"success": False, "error": str(e), "data": None}
+
+        result = self._submit(job)
+        if result["success"]:
+            result["data"] = {**result["data"], "triggered": True}
+        return result
+
+    def resume_job(self, job_id):
+        """
+        Hand a failed or interrupted job back to the executor; it continues
+        after its last processed shard
+
+        Args:
+            job_id: Id of the job
+
+        Returns:
+            Dictionary with the serialized job
+        """
+        parsed_id = self._parse_job_id(job_id)
+        job = self.job_repository.get_by_id(parsed_id) if parsed_id else None
+        if job is None:
+            return {"success": False, "error": "Job not found", "data": None}
+        if job.Status == JobStatusEnum.SUCCEEDED:
+            return {"success": False, "error": "Job already succeeded", "data": None}
+
+        return self._submit(job)
+
+    def get_job_status(self, job_id):
+        """
+        Get the status, progress and per-phase timings of a job
+
+        Args:
+            job_id: Id of the job
+
+        Returns:
+            Dictionary with the serialized job
+        """
+        parsed_id = self._parse_job_id(job_id)
+        job = self.job_repository.get_by_id(parsed_id) if parsed_id else None
+        if job is None:
+            return {"success": False, "error": "Job not found", "data": None}
+        return {"success": True, "error": None, "data": job.serialize()}
+
+    def run_job(self, job_id, deadline=None):
+        """
+        Process the remaining shards of a job.
+
+        Args:
+            job_id: Id of the job
+            deadline: time.monotonic() value after which no new shard is
+                started; the job then stays RUNNING and can be resubmitted
+
+        Returns:
+            Dictionary with the serialized job and "completed"
+        """
+        parsed_id = self._parse_job_id(job_id)
+        if parsed_id is None:
+            return {"success": False, "error": "Job not found", "data": None}
+
+        # Serializes jobs with each other and with populate runs; a duplicate
+        # delivery of the same job waits here and then finds it finished
+        timeout = None
+        if deadline is not None:
+            timeout = max(deadline - time.monotonic(), 0)
+        with advisory_lock(
+            self.session.get_bind(), RECONCILIATION_RUN_LOCK, timeout=timeout
+        ) as acquired:
+            if acquired:
+                return self._run_job(parsed_id, deadline)
+
+        job = self.job_repository.get_by_id(parsed_id)
+        if job is None:
+            return {"success": False, "error": "Job not found", "data": None}
+        return {"success": True, "error": None, "data": self._job_data(job)}
+
+    def _run_job(self, job_id, deadline):
+        job = self.job_repository.get_by_id(job_id, for_update=True)
+        if job is None:
+            return {"success": False, "error": "Job not found", "data": None}
+        if job.Status == JobStatusEnum.SUCCEEDED:
+            self.session.commit()
+            return {"success": True, "error": None, "data": self._job_data(job)}
+
+        try:
+            job.Status = JobStatusEnum.RUNNING
+            job.Error = None
+            job.StartedAt = job.StartedAt or datetime.now()
+            job.DataAtualizacao = datetime.now()
+            if job.Shards is None:
+                started = time.perf_counter()
+                flight_dates = self.reconciliation_repository.get_source_flight_dates()
+                job.Shards = [
+                    flight_date.isoformat() if flight_date is not None else None
+                    for flight_date in flight_dates
+                ]
+                self._add_timings(job, {"plan": time.perf_counter() - started})
+            self.session.commit()
+
+            while job.ProcessedShards < len(job.Shards):
+                if deadline is not None and time.monotonic() >= deadline:
+                    return {"success": True, "error": None, "data": self._job_data(job)}
+                self._process_next_shard(job)
+
+            self._finish(job)
+            return {"success": True, "error": None, "data": self._job_data(job)}
+
+        except Exception as e:
+            self.session.rollback()
+            logger.error(f"Reconciliation job {job_id} failed: {str(e)}")
+            self._mark_failed(job_id, str(e))
+            return {"success": False, "error": str(e), "data": None}
+
+    def _submit(self, job):
+        try:
+            self.executor.submit(job.Id)
+        except Exception as e:
+            logger.error(f"Error submitting reconciliation job {job.Id}: {str(e)}")
+            self._mark_failed(job.Id, str(e))
+            return {"success": False, "error": str(e), "data": None}
+        return {"success": True, "error": None, "data": job.serialize()}
+
+    def _process_next_shard(self, job):
+        """Reconcile one flight date and commit it together with the checkpoint"""
+        shard = job.Shards[job.ProcessedShards]
+        flight_date = date.fromisoformat(shard) if shard is not None else None
+
+        summary, timings = self.reconciliation_service.reconcile_flight_date(
+            flight_date, match_mode=job.MatchMode or "line"
+        )
+
+        self._add_timings(job, timings)
+        totals = dict(job.Summary or {})
+        for key, value in summary.items():
+            totals[key] = totals.get(key, 0) + value
+        job.Summary = totals
+        job.ProcessedShards += 1
+        job.DataAtualizacao = datetime.now()
+        self.session.commit()
+
+    def _finish(self, job):
+        """
+        Mark the job succeeded; a full run first soft deletes rows of flight
+        dates that are no longer in the sources, and a flight mode job
+        rebuilds BillingInvoiceTotalDifference
+        """
+        if job.FullRun is not False:
+            started = time.perf_counter()
+            flight_dates = [
+                date.fromisoformat(shard) if shard is not None else None
+                for shard in job.Shards
+            ]
+            swept = self.reconciliation_repository.soft_delete_outside_flight_dates(
+                flight_dates, datetime.now()
+            )
+            self._add_timings(job, {"sweep": time.perf_counter() - started})
+
+            totals = dict(job.Summary or {})
+            totals["soft_deleted_records"] = (
+                totals.get("soft_deleted_records", 0) + swept
+            )
+            job.Summary = totals
+
+        if job.MatchMode == "flight":
+            started = time.perf_counter()
+            totals = dict(job.Summary or {})
+            totals[
+                "invoice_total_differences"
+            ] = self.reconciliation_repository.rebuild_invoice_total_differences()
+            job.Summary = totals
+            self._add_timings(job, {"totals": time.perf_counter() - started})
+
+        job.Status = JobStatusEnum.SUCCEEDED
+        job.FinishedAt = datetime.now()
+        job.DataAtualizacao = job.FinishedAt
+        self.session.commit()
+
+    def _mark_failed(self, job_id, error):
+        try:
+            job = self.job_repository.get_by_id(job_id)
+            if job is not None:
+                job.Status = JobStatusEnum.FAILED
+                job.Error = error
+                job.DataAtualizacao = datetime.now()
+                self.session.commit()
+        except Exception as e:
+            self.session.rollback()
+            logger.error(f"Error marking reconciliation job {job_id} failed: {e}")
+
+    def _expire_stale_jobs(self):
+        """Fail jobs whose worker is gone so they no longer count as active"""
+        job_ids = self.job_repository.expire_stale_jobs(
+            RECONCILIATION_JOB_STALE_SECONDS
+        )
+        for job_id in job_ids:
+            logger.warning(
+                f"Reconciliation job {job_id} made no progress for "
+                f"{RECONCILIATION_JOB_STALE_SECONDS} seconds; marked failed"
+            )
+        return job_ids
+
+    def _add_timings(self, job, timings):
+        """Accumulate seconds per phase on the job"""
+        totals = dict(job.PhaseTimings or {})
+        for phase, seconds in timings.items():
+            totals[phase] = round(totals.get(phase, 0) + seconds, 3)
+        job.PhaseTimings = totals
+
+    def _not_triggered(self, reason):
+        return {
+            "success": True,
+            "error": None,
+            "data": {"triggered": False, "reason": reason},
+        }
+
+    def _job_data(self, job):
+        return {
+            **job.serialize(),
+            "completed": job.Status == JobStatusEnum.SUCCEEDED,
+        }
@@ -1,13 +1,99 @@
+import hashlib
+import os
+import time
 import uuid
+from collections import deque, namedtuple
 from datetime import datetime
+from itertools import groupby
+from operator import attrgetter
 
-from src.models.schema_ccs import (
-    AirCompanyInvoiceReport,
-    CateringInvoiceReport,
-    Reconciliation,
-)
+from src.common.advisory_lock import RECONCILIATION_RUN_LOCK, advisory_lock
+from src.enums.status_enum import StatusEnum
+from src.models.schema_ccs import Reconciliation
 from src.repositories.reconciliation_repository import ReconciliationRepository
 
+# Reconciliation Ids are uuid5(namespace, "<air Id>|<catering Id>") so the same
+# source pair always maps to the same row and its annotations survive re-runs.
+RECONCILIATION_ID_NAMESPACE = uuid.UUID("5b0f7c52-3f0c-4c43-9d8e-6f1f2a7e4b10")
+
+# Columns whose values make up Reconciliation.RowHash; a row is only rewritten
+# when one of them changes.
+RECONCILIATION_CONTENT_COLUMNS = [
+    column.name
+    for column in Reconciliation.__table__.columns
+    if column.name.startswith(("Air", "Cat"))
+    or column.name in ("DifQty", "DifPrice", "AmountDif", "QtyDif")
+]
+
+# "diff" writes changed rows in place; "swap" rebuilds into a staging table
+# and publishes it with a table swap.
+PUBLISH_MODES = ("diff", "swap")
+
+# What a run does when another run holds the reconciliation lock
+ON_CONFLICT_MODES = ("wait", "join", "skip")
+
+# "line" matches every line; "flight" compares flight totals first and only
+# matches the lines of flights whose totals disagree.
+MATCH_MODES = ("line", "flight")
+
+# Match mode of populate runs and reconciliation jobs that do not ask for one,
+# so every writer of the table uses the same mode
+RECONCILIATION_MATCH_MODE = os.getenv("RECONCILIATION_MATCH_MODE", "line")
+
+
+# Normalized Promeus code -> set of normalized Inflair codes
+MatchMappings = namedtuple("MatchMappings", ["flight_numbers", "classes", "item_codes"])
+
+
+def _normalize_code(value):
+    """Upper-cased, trimmed code for matching; None for blanks"""
+    if value is None:
+        return None
+    code = str(value).strip().upper()
+    if code.endswith(".0"):
+        code = code[:-2]
+    if code in ("", "NONE", "NAN"):
+        return None
+    return code
+
+
+def _code_lookup(pairs):
+    """{normalized source code: set of normalized target codes}"""
+    lookup = {}
+    for source, target in pairs:
+        source, target = _normalize_code(source), _normalize_code(target)
+        if source and target:
+            lookup.setdefault(source, set()).add(target)
+    return lookup
+
+
+def _flight_number_key(value):
+    """
+    Flight number reduced to its digits without leading zeros ("TP085" ->
+    "85"), the one flight key of line matching and flight totals; the SQL of
+    ReconciliationRepository.compute_invoice_total_differences applies the same
+    rule with _flight_digits
+    """
+    code = _normalize_code(value)
+    if code is None:
+        return None
+    digits = "".join(char for char in code if char.isdigit())
+    return digits.lstrip("0") or digits or code
+
+
+def _take_unmatched(candidates, processed_ids):
+    """Pop catering rows off the front of candidates until an unmatched one"""
+    while candidates:
+        cat = candidates.popleft()
+        if cat.Id not in processed_ids:
+            return cat
+    return None
+
+
+def _flight_date_order(flight_date):
+    """Sort key matching the source streams: by flight date, undated last"""
+    return (flight_date is None, flight_date)
+
 
 class ReconciliationService:
     def __init__(self, db_session):
@@ -50,15 +136,51 @@ class ReconciliationService:
         end_date=None,
         flight_number=None,
         item_name=None,
+        review_status=None,
+        has_annotations=None,
+        sort_by=None,
+        include_annotations=True,
     ):
         """Retrieve paginated data from the
         ccs.Reconciliation table using SQLAlchemy
+
+        review_status, has_annotations and sort_by="latest_annotation" use the
+        denormalized annotation summary columns, so ReconAnnotation is neither
+        joined nor loaded, and combine with the date range, flight number and
+        item name filters; include_annotations=False also skips it when
+        serializing.
         """
         try:
             parsed_start_date = self._parse_date(start_date) if start_date else None
             parsed_end_date = self._parse_date(end_date) if end_date else None
 
-            if parsed_start_date and parsed_end_date and flight_number and item_name:
+            if (
+                review_status is not None
+                or has_annotations is not None
+                or sort_by == "latest_annotation"
+            ):
+                review_status_enum = (
+                    StatusEnum(review_status) if review_status is not None else None
+                )
+                other_filters = {
+                    "start_date": parsed_start_date,
+                    "end_date": parsed_end_date,
+                    "flight_number": flight_number,
+                    "item_name": item_name,
+                }
+                records = self.reconciliation_repository.get_by_review(
+                    filter_type,
+                    review_status_enum,
+                    has_annotations,
+                    sort_by == "latest_annotation",
+                    limit,
+                    offset,
+                    **other_filters,
+                )
+                total_count = self.reconciliation_repository.get_count_by_review(
+                    filter_type, review_status_enum, has_annotations, **other_filters
+                )
+            elif parsed_start_date and parsed_end_date and flight_number and item_name:
                 if filter_type == "all":
                     records = self.reconciliation_repository.get_by_date_range(
                         parsed_start_date, parsed_end_date, limit, offset
@@ -182,7 +304,10 @@ class ReconciliationService:
                         filter_type
                     )
 
-            result_list = [record.serialize() for record in records]
+            result_list = [
+                record.serialize(include_annotations=include_annotations)
+                for record in records
+            ]
 
             return {
                 "data": result_list,
@@ -200,6 +325,9 @@ class ReconciliationService:
                     "end_date": end_date,
                     "flight_number": flight_number,
                     "item_name": item_name,
+                    "review_status": review_status,
+                    "has_annotations": has_annotations,
+                    "sort_by": sort_by,
                 },
             }
         except Exception as e:
@@ -440,118 +568,164 @@ class ReconciliationService:
                 "error": str(e),
             }, 501
 
-    def populate_reconciliation_table(self):
+    def refresh_invoice_total_differences(self):
         """
-        Populate the Reconciliation table with data from AirCompanyInvoiceReport
-        and CateringInvoiceReport tables using SQLAlchemy ORM.
+        Recompute BillingInvoiceTotalDifference: Inflair flight invoice totals
+        against Promeus totals of the same flight
         """
         try:
+            count = self.reconciliation_repository.rebuild_invoice_total_differences()
+            self.session.commit()
+            return {
+                "success": True,
+                "message": "Invoice total differences refreshed successfully",
+                "summary": {"invoice_total_differences": count},
+            }
+        except Exception as e:
+            self.session.rollback()
+            return {
+                "success": False,
+                "message": f"Error refreshing invoice total differences: {str(e)}",
+            }
 
-            deleted = self.session.query(Reconciliation).delete()
-            self.session.flush()
-
-            air_records = (
-                self.session.query(AirCompanyInvoiceReport)
-                .filter(
-                    AirCompanyInvoiceReport.Ativo.is_(True),
-                    AirCompanyInvoiceReport.Excluido.is_(False),
+    def get_largest_invoice_total_differences(self, limit=100, offset=0):
+        """Flight invoices ordered by absolute amount difference, largest first"""
+        try:
+            records = (
+                self.reconciliation_repository.get_largest_invoice_total_differences(
+                    limit=limit, offset=offset
                 )
-                .all()
             )
+            total_count = (
+                self.reconciliation_repository.get_invoice_total_differences_count()
+            )
+            return {
+                "data": [record.serialize() for record in records],
+                "pagination": {
+                    "limit": limit,
+                    "offset": offset,
+                    "total": total_count,
+                    "has_more": offset + limit < total_count,
+                },
+            }
+        except Exception as e:
+            return {
+                "message": "Failed to retrieve invoice total differences",
+                "error": str(e),
+            }, 501
 
-            catering_records = (
-                self.session.query(CateringInvoiceReport)
-                .filter(
-                    CateringInvoiceReport.Ativo.is_(True),
-                    CateringInvoiceReport.Excluido.is_(False),
-                )
-                .all()
+    def populate_reconciliation_table(
+        self,
+        publish_mode="diff",
+        on_conflict="wait",
+        lock_timeout=None,
+        match_mode=None,
+    ):
+        """
+        Populate the Reconciliation table with data from AirCompanyInvoiceReport
+        and CateringInvoiceReport tables using SQLAlchemy ORM.
+
+        Active source rows are streamed in flight date order and matched and
+        written one flight date at a time, so memory is bounded by the largest
+        day rather than the whole history.
+
+        Rows get deterministic Ids derived from the paired source rows. With
+        publish_mode "diff" they are written as a diff against the current
+        table: new pairs are inserted, pairs whose content hash changed are
+        updated, vanished pairs are soft deleted and unchanged rows are not
+        written at all. With publish_mode "swap" the full result is built in a
+        staging table and swapped in atomically, keeping the replaced version
+        for rollback_reconciliation_publish.
+
+        Runs are serialized with a PostgreSQL advisory lock. When another run
+        holds it, on_conflict "wait" runs after it, "join" waits for it and
+        returns without recomputing, and "skip" returns immediately.
+        lock_timeout bounds the wait in seconds.
+
+        With match_mode "flight" both sources are first compared on flight
+        totals; only the lines of flights whose totals disagree are matched
+        and kept in Reconciliation, and BillingInvoiceTotalDifference is
+        rebuilt. Lines with annotations are never soft deleted. match_mode
+        defaults to RECONCILIATION_MATCH_MODE.
+        """
+        if match_mode is None:
+            match_mode = RECONCILIATION_MATCH_MODE
+        if publish_mode not in PUBLISH_MODES:
+            return {
+                "success": False,
+                "message": f"Invalid publish_mode: {publish_mode}. "
+                f"Valid values are: {', '.join(PUBLISH_MODES)}",
+            }
+        if on_conflict not in ON_CONFLICT_MODES:
+            return {
+                "success": False,
+                "message": f"Invalid on_conflict: {on_conflict}. "
+                f"Valid values are: {', '.join(ON_CONFLICT_MODES)}",
+            }
+        if match_mode not in MATCH_MODES:
+            return {
+                "success": False,
+                "message": f"Invalid match_mode: {match_mode}. "
+                f"Valid values are: {', '.join(MATCH_MODES)}",
+            }
+
+        bind = self.session.get_bind()
+        with advisory_lock(
+            bind,
+            RECONCILIATION_RUN_LOCK,
+            wait=on_conflict == "wait",
+            timeout=lock_timeout,
+        ) as acquired:
+            if acquired:
+                return self._populate_reconciliation_table(publish_mode, match_mode)
+
+        if on_conflict == "join":
+            with advisory_lock(
+                bind, RECONCILIATION_RUN_LOCK, timeout=lock_timeout
+            ) as finished:
+                pass
+            if finished:
+                return {
+                    "success": True,
+                    "joined": True,
+                    "message": "Joined the reconciliation run in progress",
+                }
+
+        return {
+            "success": False,
+            "skipped": True,
+            "message": "Another reconciliation run is in progress",
+        }
+
+    def _populate_reconciliation_table(self, publish_mode, match_mode="line"):
+        try:
+            summary = {
+                "total_records": 0,
+                "matched_records": 0,
+                "mapped_records": 0,
+                "item_matched_records": 0,
+                "catering_only_records": 0,
+                "air_only_records": 0,
+            }
+            record_groups = self._match_flight_date_groups(
+                summary, compare_flight_totals=match_mode == "flight"
             )
 
-            if not air_records:
-                air_records = self.session.query(AirCompanyInvoiceReport).all()
-
-            if not catering_records:
-                catering_records = self.session.query(CateringInvoiceReport).all()
-
-            catering_by_date = {}
-            catering_by_date_class = {}
-            catering_by_date_facility = {}
-
-            for cat in catering_records:
-                date_key = cat.FltDate
-                class_key = (cat.FltDate, (cat.Class or "").strip().upper())
-                facility_key = (cat.FltDate, cat.Facility)
-
-                if date_key:
-                    catering_by_date.setdefault(date_key, []).append(cat)
-                if cat.Class and date_key:
-                    catering_by_date_class.setdefault(class_key, []).append(cat)
-                if cat.Facility and date_key:
-                    catering_by_date_facility.setdefault(facility_key, []).append(cat)
-
-            processed_catering_ids = set()
-            reconciliation_records = []
-            matched_count = 0
-            air_only_count = 0
-
-            for i, air in enumerate(air_records):
-                matched = False
-                date_class_key = (air.FlightDate, (air.Class or "").strip().upper())
-                available = catering_by_date_class.get(date_class_key, [])
-
-                for cat in available:
-                    if cat.Id not in processed_catering_ids:
-                        reconciliation_records.append(
-                            self._create_matched_reconciliation_record(air, cat)
-                        )
-                        processed_catering_ids.add(cat.Id)
-                        matched = True
-                        matched_count += 1
-                        break
-
-                if not matched and air.FlightDate:
-                    for cat in catering_by_date.get(air.FlightDate, []):
-                        if cat.Id not in processed_catering_ids:
-                            reconciliation_records.append(
-                                self._create_matched_reconciliation_record(air, cat)
-                            )
-                            processed_catering_ids.add(cat.Id)
-                            matched = True
-                            matched_count += 1
-                            break
-
-                if not matched:
-                    reconciliation_records.append(
-                        self._create_air_only_reconciliation_record(air)
-                    )
-                    air_only_count += 1
-
-            catering_only_count = 0
-            for cat in catering_records:
-                if cat.Id not in processed_catering_ids:
-                    reconciliation_records.append(
-                        self._create_catering_only_reconciliation_record(cat)
-                    )
-                    catering_only_count += 1
-
-            if reconciliation_records:
-                self.session.bulk_save_objects(reconciliation_records)
-                self.session.flush()
-
-            self._calculate_reconciliation_differences()
+            if publish_mode == "swap":
+                write_summary = self._publish_reconciliation_swap(record_groups)
+            else:
+                write_summary = self._write_reconciliation_diff_groups(record_groups)
 
+            if match_mode == "flight":
+                summary[
+                    "invoice_total_differences"
+                ] = self.reconciliation_repository.rebuild_invoice_total_differences()
             self.session.commit()
 
             return {
                 "success": True,
                 "message": "Reconciliation table populated successfully",
-                "summary": {
-                    "total_records": len(reconciliation_records),
-                    "matched_records": matched_count,
-                    "catering_only_records": catering_only_count,
-                    "air_only_records": air_only_count,
-                },
+                "summary": {**summary, **write_summary},
             }
 
         except Exception as e:
@@ -565,38 +739,550 @@ class ReconciliationService:
                 "message": f"Error populating reconciliation table: {str(e)}",
             }
 
-    def _calculate_reconciliation_differences(self):
-        """Calculate differences and update flags for matched records"""
-        try:
-            matched_records = (
-                self.session.query(Reconciliation)
-                .filter(Reconciliation.Air == "Yes", Reconciliation.Cat == "Yes")
-                .all()
+    def reconcile_flight_date(self, flight_date, match_mode="line"):
+        """
+        Rebuild the reconciliation rows of a single flight date (None for
+        undated source rows) as a diff, without committing. This is the unit
+        of work of a ReconciliationJob shard; match_mode is as for
+        populate_reconciliation_table.
+
+        Returns:
+            (summary counts, seconds spent per phase)
+        """
+        started = time.perf_counter()
+        air_records = self.reconciliation_repository.get_air_records_by_flight_date(
+            flight_date
+        )
+        catering_records = (
+            self.reconciliation_repository.get_catering_records_by_flight_date(
+                flight_date
+            )
+        )
+        loaded = time.perf_counter()
+
+        mappings = self._load_match_mappings()
+        counts = {}
+        if match_mode == "flight":
+            air_records, catering_records, counts = self._compare_flight_totals(
+                air_records, catering_records, mappings
+            )
+        reconciliation_records, match_counts = self._match_reconciliation_records(
+            air_records, catering_records, mappings
+        )
+        counts.update(match_counts)
+        matched = time.perf_counter()
+
+        write_summary = self._write_reconciliation_diff(
+            reconciliation_records,
+            self.reconciliation_repository.get_row_states_by_flight_date(flight_date),
+        )
+        written = time.perf_counter()
+
+        summary = {
+            "total_records": len(reconciliation_records),
+            **counts,
+            **write_summary,
+        }
+        timings = {
+            "load": loaded - started,
+            "match": matched - loaded,
+            "write": written - matched,
+        }
+        return summary, timings
+
+    def _iter_flight_date_groups(self):
+        """
+        Stream the active source rows of both invoice tables and yield
+        (flight date, air rows, catering rows) one flight date at a time, in
+        flight date order with undated rows last. Only one date group of each
+        table is held in memory.
+        """
+        air_groups = (
+            (flight_date, list(rows))
+            for flight_date, rows in groupby(
+                self.reconciliation_repository.stream_air_records(),
+                key=attrgetter("FlightDate"),
+            )
+        )
+        catering_groups = (
+            (flight_date, list(rows))
+            for flight_date, rows in groupby(
+                self.reconciliation_repository.stream_catering_records(),
+                key=attrgetter("FltDate"),
+            )
+        )
+
+        air = next(air_groups, None)
+        cat = next(catering_groups, None)
+        while air is not None or cat is not None:
+            air_order = _flight_date_order(air[0]) if air is not None else None
+            cat_order = _flight_date_order(cat[0]) if cat is not None else None
+
+            if cat is None or (air is not None and air_order < cat_order):
+                yield air[0], air[1], []
+                air = next(air_groups, None)
+            elif air is None or cat_order < air_order:
+                yield cat[0], [], cat[1]
+                cat = next(catering_groups, None)
+            else:
+                yield air[0], air[1], cat[1]
+                air = next(air_groups, None)
+                cat = next(catering_groups, None)
+
+    def _match_flight_date_groups(self, summary, compare_flight_totals=False):
+        """
+        Yield (flight date, reconciliation rows) for each flight date group,
+        adding the match counts to summary as the groups are consumed.
+
+        With compare_flight_totals each group is first compared on flight
+        totals and only the lines of discrepant flights are matched.
+        """
+        mappings = self._load_match_mappings()
+        for (
+            flight_date,
+            air_records,
+            catering_records,
+        ) in self._iter_flight_date_groups():
+            counts = {}
+            if compare_flight_totals:
+                air_records, catering_records, counts = self._compare_flight_totals(
+                    air_records, catering_records, mappings
+                )
+
+            reconciliation_records, match_counts = self._match_reconciliation_records(
+                air_records, catering_records, mappings
+            )
+            counts.update(match_counts)
+            summary["total_records"] += len(reconciliation_records)
+            for key, value in counts.items():
+                summary[key] = summary.get(key, 0) + value
+            yield flight_date, reconciliation_records
+
+    def _compare_flight_totals(self, air_records, catering_records, mappings):
+        """
+        Aggregate both sources to flights (date, Inflair flight number, Inflair
+        class) in one pass and compare quantity and amount totals.
+
+        Returns:
+            (air rows of discrepant flights, catering rows of discrepant
+            flights, flight counts)
+        """
+        flights = {}
+
+        def flight(key):
+            if key not in flights:
+                flights[key] = {
+                    "air": [],
+                    "cat": [],
+                    "qty": [0, 0],
+                    "amount": [0.0, 0.0],
+                }
+            return flights[key]
+
+        for air in air_records:
+            totals = flight(self._air_flight_key(air, mappings))
+            totals["air"].append(air)
+            totals["qty"][0] += self._safe_int(air.Qty, 0)
+            totals["amount"][0] += self._safe_float(air.SubTotal, 0.0)
+
+        for cat in catering_records:
+            totals = flight(
+                (cat.FltDate, _flight_number_key(cat.FltNo), _normalize_code(cat.Class))
+            )
+            totals["cat"].append(cat)
+            totals["qty"][1] += self._safe_int(cat.Qty, 0)
+            totals["amount"][1] += self._safe_float(cat.TotalAmount, 0.0)
+
+        discrepant_air = []
+        discrepant_catering = []
+        reconciled_count = 0
+        for (flight_date, _, _), totals in flights.items():
+            air_qty, cat_qty = totals["qty"]
+            air_amount, cat_amount = (round(amount, 2) for amount in totals["amount"])
+            reconciled = (
+                flight_date is not None
+                and totals["air"]
+                and totals["cat"]
+                and air_qty == cat_qty
+                and abs(cat_amount - air_amount) <= 0.01
+            )
+            if reconciled:
+                reconciled_count += 1
+            else:
+                discrepant_air.extend(totals["air"])
+                discrepant_catering.extend(totals["cat"])
+
+        return (
+            discrepant_air,
+            discrepant_catering,
+            {
+                "reconciled_flights": reconciled_count,
+                "discrepant_flights": len(flights) - reconciled_count,
+            },
+        )
+
+    def _air_flight_key(self, air, mappings):
+        """Flight of an air row in Inflair terms, for flight-level totals"""
+        flight_numbers = mappings.flight_numbers.get(
+            _normalize_code(air.FlightNo)
+        ) or mappings.flight_numbers.get(_normalize_code(air.FlightNoRed))
+        flight_number = min(flight_numbers) if flight_numbers else air.FlightNo
+
+        air_class = _normalize_code(air.Class)
+        classes = mappings.classes.get(air_class)
+        flight_class = min(classes) if classes else air_class
+
+        return air.FlightDate, _flight_number_key(flight_number), flight_class
+
+    def _load_match_mappings(self):
+        """
+        Hash lookups from normalized Promeus flight numbers, classes and
+        service codes to the sets of Inflair codes they map to, from the
+        ingested mapping tables
+        """
+        repository = self.reconciliation_repository
+        return MatchMappings(
+            flight_numbers=_code_lookup(repository.get_flight_number_mappings()),
+            classes=_code_lookup(repository.get_flight_class_mappings()),
+            item_codes=_code_lookup(repository.get_item_code_mappings()),
+        )
+
+    def _match_reconciliation_records(
+        self, air_records, catering_records, mappings=None
+    ):
+        """
+        Pair air and catering source rows into reconciliation rows.
+
+        Each air row has a flight bucket of candidate catering rows. If its
+        flight number is in FlightNumberMapping, the bucket is (date, mapped
+        flight number, class), with the class translated through
+        FlightClassMapping when mapped and flight numbers compared by
+        _flight_number_key. Otherwise the bucket is (date, class), falling
+        back to the whole date. Bucket keys start with their kind ("flight",
+        "class" or "date"), so keys of different kinds never collide.
+
+        Lines are paired in two passes over hash indexes. First an air row
+        takes a catering line of its bucket whose AlBillCode or Itemcode
+        matches its ServiceCode (directly or through the mapped item codes),
+        looked up in an index of (bucket key, item code). Then the rows still
+        unpaired take any free line of their bucket.
+
+        Matching only ever pairs rows of the same flight date, so it can run
+        over all rows at once or one date shard at a time.
+
+        Returns:
+            (reconciliation rows as column dictionaries, counts by match kind)
+        """
+        if mappings is None:
+            mappings = self._load_match_mappings()
+
+        catering_by_bucket = {}
+        catering_by_item = {}
+        for cat in catering_records:
+            date_key = cat.FltDate
+            if not date_key:
+                continue
+            class_key = _normalize_code(cat.Class)
+            flight_key = _flight_number_key(cat.FltNo)
+            bucket_keys = [("date", date_key)]
+            if class_key:
+                bucket_keys.append(("class", date_key, class_key))
+                if flight_key:
+                    bucket_keys.append(("flight", date_key, flight_key, class_key))
+
+            item_codes = {
+                _normalize_code(cat.AlBillCode),
+                _normalize_code(cat.Itemcode),
+            } - {None}
+            for bucket_key in bucket_keys:
+                catering_by_bucket.setdefault(bucket_key, deque()).append(cat)
+                for item_code in item_codes:
+                    catering_by_item.setdefault(
+                        (bucket_key, item_code), deque()
+                    ).append(cat)
+
+        buckets = [self._air_bucket_keys(air, mappings) for air in air_records]
+        matches = [None] * len(air_records)
+        processed_catering_ids = set()
+
+        for position, air in enumerate(air_records):
+            service_code = _normalize_code(air.ServiceCode)
+            if not service_code:
+                continue
+            item_codes = sorted(
+                mappings.item_codes.get(service_code, set()) | {service_code}
+            )
+            matches[position] = self._take_first_unmatched(
+                catering_by_item,
+                [
+                    (bucket_key, item_code)
+                    for bucket_key in buckets[position][1]
+                    for item_code in item_codes
+                ],
+                processed_catering_ids,
             )
+        item_matched_count = sum(match is not None for match in matches)
+
+        for position, air in enumerate(air_records):
+            if matches[position] is None:
+                matches[position] = self._take_first_unmatched(
+                    catering_by_bucket, buckets[position][1], processed_catering_ids
+                )
+
+        reconciliation_records = []
+        matched_count = 0
+        mapped_count = 0
+        air_only_count = 0
+        for air, cat, (is_mapped, _) in zip(air_records, matches, buckets):
+            if cat is not None:
+                reconciliation_records.append(
+                    self._create_matched_reconciliation_record(air, cat)
+                )
+                matched_count += 1
+                mapped_count += is_mapped
+            else:
+                reconciliation_records.append(
+                    self._create_air_only_reconciliation_record(air)
+                )
+                air_only_count += 1
+
+        catering_only_count = 0
+        for cat in catering_records:
+            if cat.Id not in processed_catering_ids:
+                reconciliation_records.append(
+                    self._create_catering_only_reconciliation_record(cat)
+                )
+                catering_only_count += 1
+
+        return reconciliation_records, {
+            "matched_records": matched_count,
+            "mapped_records": mapped_count,
+            "item_matched_records": item_matched_count,
+            "catering_only_records": catering_only_count,
+            "air_only_records": air_only_count,
+        }
+
+    def _air_bucket_keys(self, air, mappings):
+        """
+        Catering index keys of the flight bucket of an air row, most specific
+        first, and whether they come from a flight number mapping
+        """
+        if not air.FlightDate:
+            return False, []
 
-            for record in matched_records:
-                record.DifQty = "No"
-                record.DifPrice = "No"
-                record.AmountDif = "0.00"
-                record.QtyDif = "0"
+        air_class = _normalize_code(air.Class)
+        classes = sorted(mappings.classes.get(air_class) or ({air_class} - {None}))
+        flight_numbers = mappings.flight_numbers.get(
+            _normalize_code(air.FlightNo)
+        ) or mappings.flight_numbers.get(_normalize_code(air.FlightNoRed))
 
-                air_qty = self._safe_int(record.AirQty, 0)
-                cat_qty = self._safe_int(record.CatQty, 0)
-                air_subtotal = self._safe_float(record.AirSubTotal, 0.0)
-                cat_total = self._safe_float(record.CatTotalAmount, 0.0)
+        if flight_numbers:
+            flight_keys = sorted(
+                {_flight_number_key(number) for number in flight_numbers}
+            )
+            return True, [
+                ("flight", air.FlightDate, flight_key, flight_class)
+                for flight_key in flight_keys
+                for flight_class in classes
+            ]
+        return False, [
+            *(("class", air.FlightDate, flight_class) for flight_class in classes),
+            ("date", air.FlightDate),
+        ]
 
-                if air_qty != cat_qty:
-                    record.DifQty = "Yes"
-                    record.QtyDif = str(cat_qty - air_qty)
+    def _take_first_unmatched(self, index, keys, processed_ids):
+        """Take the first unmatched catering row under keys and mark it matched"""
+        for key in keys:
+            cat = _take_unmatched(index.get(key), processed_ids)
+            if cat is not None:
+                processed_ids.add(cat.Id)
+                return cat
+        return None
 
-                if abs(air_subtotal - cat_total) > 0.01:
-                    record.DifPrice = "Yes"
-                    record.AmountDif = str(round(cat_total - air_subtotal, 2))
+    def _write_reconciliation_diff(
+        self, reconciliation_records, existing_states, current_time=None, summary=None
+    ):
+        """
+        Apply the freshly computed rows to the Reconciliation table as a diff
+        keyed by Id and RowHash against existing_states, the {Id: (RowHash,
+        Excluido, AnnotationCount)} of the same flight date. Rows in
+        existing_states that are not in reconciliation_records are soft
+        deleted, except rows with annotations, which stay as they are.
+        """
+        if current_time is None:
+            current_time = datetime.now()
+        if summary is None:
+            summary = {
+                "inserted_records": 0,
+                "updated_records": 0,
+                "unchanged_records": 0,
+                "soft_deleted_records": 0,
+                "kept_annotated_records": 0,
+            }
+
+        inserts = []
+        updates = []
+        for record in reconciliation_records:
+            state = existing_states.pop(record["Id"], None)
+            if state is None:
+                record["DataCriacao"] = current_time
+                inserts.append(record)
+            elif state[0] != record["RowHash"] or state[1]:
+                record["DataAtualizacao"] = current_time
+                updates.append(record)
+            else:
+                summary["unchanged_records"] += 1
 
-            self.session.flush()
+        self.reconciliation_repository.insert_rows(inserts)
+        self.reconciliation_repository.update_rows(updates)
+        summary["inserted_records"] += len(inserts)
+        summary["updated_records"] += len(updates)
+
+        vanished_ids = []
+        for record_id, (_, excluded, annotation_count) in existing_states.items():
+            if excluded:
+                continue
+            if annotation_count:
+                summary["kept_annotated_records"] += 1
+            else:
+                vanished_ids.append(record_id)
+        self.reconciliation_repository.soft_delete_by_ids(vanished_ids, current_time)
+        summary["soft_deleted_records"] += len(vanished_ids)
+
+        return summary
+
+    def _write_reconciliation_diff_groups(self, record_groups):
+        """
+        _write_reconciliation_diff over an iterable of (flight date, rows)
+        groups. Only the row states of the current flight date are loaded,
+        and every group is written before the next one is computed. Rows of
+        flight dates that no longer appear in any group are soft deleted at
+        the end in one statement.
+        """
+        current_time = datetime.now()
+        summary = {
+            "inserted_records": 0,
+            "updated_records": 0,
+            "unchanged_records": 0,
+            "soft_deleted_records": 0,
+            "kept_annotated_records": 0,
+        }
+        flight_dates = []
+        for flight_date, reconciliation_records in record_groups:
+            flight_dates.append(flight_date)
+            self._write_reconciliation_diff(
+                reconciliation_records,
+                self.reconciliation_repository.get_row_states_by_flight_date(
+                    flight_date
+                ),
+                current_time,
+                summary,
+            )
+
+        summary[
+            "soft_deleted_records"
+        ] += self.reconciliation_repository.soft_delete_outside_flight_dates(
+            flight_dates, current_time
+        )
+
+        return summary
+
+    def _publish_reconciliation_swap(self, record_groups):
+        """
+        Build the freshly computed row groups into the staging table and swap
+        it in.
+
+        The load and index builds are committed before the live table is
+        touched, so readers keep seeing the complete current version until the
+        short swap transaction commits.
+        """
+        created_at = datetime.now()
+        published_count = 0
+        self.reconciliation_repository.create_staging_table()
+        for _, reconciliation_records in record_groups:
+            self.reconciliation_repository.insert_staging_rows(
+                reconciliation_records, created_at
+            )
+            published_count += len(reconciliation_records)
+        self.reconciliation_repository.finalize_staging_table()
+        self.session.commit()
+
+        carried_over = self.reconciliation_repository.publish_staging_table()
+        self.session.commit()
+
+        self.reconciliation_repository.validate_annotation_foreign_keys()
+        self.session.commit()
+
+        return {
+            "published_records": published_count,
+            "carried_over_records": carried_over,
+        }
+
+    def rollback_reconciliation_publish(self):
+        """
+        Swap the version replaced by the last swap publish back in. The
+        version being replaced is kept, so the rollback can itself be undone.
+        """
+        try:
+            with advisory_lock(self.session.get_bind(), RECONCILIATION_RUN_LOCK):
+                carried_over = self.reconciliation_repository.restore_previous_table()
+                self.session.commit()
+
+                self.reconciliation_repository.validate_annotation_foreign_keys()
+                self.session.commit()
+
+            return {
+                "success": True,
+                "message": "Previous reconciliation version restored successfully",
+                "summary": {"carried_over_records": carried_over},
+            }
 
         except Exception as e:
-            raise Exception(f"Error calculating differences: {str(e)}")
+            self.session.rollback()
+            print(f"❌ ERROR: {str(e)}")
+            return {
+                "success": False,
+                "message": f"Error restoring previous reconciliation version: {str(e)}",
+            }
+
+    def _reconciliation_id(self, air_record=None, cat_record=None):
+        """Deterministic Reconciliation Id for a pair of source rows"""
+        air_id = air_record.Id if air_record is not None else ""
+        cat_id = cat_record.Id if cat_record is not None else ""
+        return uuid.uuid5(RECONCILIATION_ID_NAMESPACE, f"{air_id}|{cat_id}")
+
+    def _finalize_reconciliation_record(self, record):
+        """Add the Id-independent bookkeeping columns and the RowHash"""
+        record["Ativo"] = True
+        record["Excluido"] = False
+        payload = "\x1f".join(
+            "" if record.get(column) is None else str(record.get(column))
+            for column in RECONCILIATION_CONTENT_COLUMNS
+        )
+        record["RowHash"] = hashlib.md5(payload.encode("utf-8")).hexdigest()
+        return record
+
+    def _apply_reconciliation_differences(self, record):
+        """Calculate differences and update flags for a matched record"""
+        record["DifQty"] = "No"
+        record["DifPrice"] = "No"
+        record["AmountDif"] = "0.00"
+        record["QtyDif"] = "0"
+
+        air_qty = self._safe_int(record["AirQty"], 0)
+        cat_qty = self._safe_int(record["CatQty"], 0)
+        air_subtotal = self._safe_float(record["AirSubTotal"], 0.0)
+        cat_total = self._safe_float(record["CatTotalAmount"], 0.0)
+
+        if air_qty != cat_qty:
+            record["DifQty"] = "Yes"
+            record["QtyDif"] = str(cat_qty - air_qty)
+
+        if abs(air_subtotal - cat_total) > 0.01:
+            record["DifPrice"] = "Yes"
+            record["AmountDif"] = str(round(cat_total - air_subtotal, 2))
+
+        return record
 
     def _safe_int(self, value, default=0):
         """Safely convert string to int with default"""
@@ -618,134 +1304,84 @@ class ReconciliationService:
         except (ValueError, TypeError):
             return default
 
-    def _create_matched_reconciliation_record(self, air_record, cat_record):
-        """Create a reconciliation record for matched air and catering records"""
-        return Reconciliation(
-            Id=uuid.uuid4(),
-            DataCriacao=datetime.now(),
-            Ativo=True,
-            Excluido=False,
-            # Air Company data
-            AirSupplier=air_record.Supplier,
-            AirFlightDate=air_record.FlightDate,
-            AirFlightNo=air_record.FlightNo,
-            AirDep=air_record.Dep,
-            AirArr=air_record.Arr,
-            AirClass=air_record.Class,
-            AirInvoicedPax=air_record.InvoicedPax,
-            AirServiceCode=air_record.ServiceCode,
-            AirSupplierCode=air_record.SupplierCode,
-            AirServiceDescription=air_record.ServiceDescription,
-            AirAircraft=air_record.Aircraft,
-            AirQty=str(air_record.Qty) if air_record.Qty is not None else "0",
-            AirUnitPrice=(
+    def _air_reconciliation_values(self, air_record):
+        """Reconciliation column values taken from an air company record"""
+        return {
+            "AirSupplier": air_record.Supplier,
+            "AirFlightDate": air_record.FlightDate,
+            "AirFlightNo": air_record.FlightNo,
+            "AirDep": air_record.Dep,
+            "AirArr": air_record.Arr,
+            "AirClass": air_record.Class,
+            "AirInvoicedPax": air_record.InvoicedPax,
+            "AirServiceCode": air_record.ServiceCode,
+            "AirSupplierCode": air_record.SupplierCode,
+            "AirServiceDescription": air_record.ServiceDescription,
+            "AirAircraft": air_record.Aircraft,
+            "AirQty": str(air_record.Qty) if air_record.Qty is not None else "0",
+            "AirUnitPrice": (
                 str(air_record.UnitPrice) if air_record.UnitPrice is not None else "0"
             ),
-            AirSubTotal=(
+            "AirSubTotal": (
                 str(air_record.SubTotal) if air_record.SubTotal is not None else "0.00"
             ),
-            AirTax=str(air_record.Tax) if air_record.Tax is not None else "0.00",
-            AirTotalIncTax=(
+            "AirTax": str(air_record.Tax) if air_record.Tax is not None else "0.00",
+            "AirTotalIncTax": (
                 str(air_record.TotalIncTax)
                 if air_record.TotalIncTax is not None
                 else "0.00"
             ),
-            AirCurrency=air_record.Currency,
-            AirItemStatus=air_record.ItemStatus,
-            AirInvoiceStatus=air_record.InvoiceStatus,
-            AirInvoiceDate=air_record.InvoiceDate,
-            AirPaidDate=air_record.PaidDate,
-            AirFlightNoRed=air_record.FlightNoRed,
-            # Catering data
-            CatFacility=cat_record.Facility,
-            CatFltDate=cat_record.FltDate,
-            CatFltNo=cat_record.FltNo,
-            CatFltInv=cat_record.FltInv,
-            CatClass=cat_record.Class,
-            CatItemGroup=cat_record.ItemGroup,
-            CatItemcode=cat_record.Itemcode,
-            CatItemDesc=cat_record.ItemDesc,
-            CatAlBillCode=cat_record.AlBillCode,
-            CatAlBillDesc=cat_record.AlBillDesc,
-            CatBillCatg=cat_record.BillCatg,
-            CatUnit=cat_record.Unit,
-            CatPax=cat_record.Pax,
-            CatQty=cat_record.Qty,
-            CatUnitPrice=cat_record.UnitPrice,
-            CatTotalAmount=cat_record.TotalAmount,
-            # Flags
-            Air="Yes",
-            Cat="Yes",
-        )
+            "AirCurrency": air_record.Currency,
+            "AirItemStatus": air_record.ItemStatus,
+            "AirInvoiceStatus": air_record.InvoiceStatus,
+            "AirInvoiceDate": air_record.InvoiceDate,
+            "AirPaidDate": air_record.PaidDate,
+            "AirFlightNoRed": air_record.FlightNoRed,
+        }
+
+    def _catering_reconciliation_values(self, cat_record):
+        """Reconciliation column values taken from a catering record"""
+        return {
+            "CatFacility": cat_record.Facility,
+            "CatFltDate": cat_record.FltDate,
+            "CatFltNo": cat_record.FltNo,
+            "CatFltInv": cat_record.FltInv,
+            "CatClass": cat_record.Class,
+            "CatItemGroup": cat_record.ItemGroup,
+            "CatItemcode": cat_record.Itemcode,
+            "CatItemDesc": cat_record.ItemDesc,
+            "CatAlBillCode": cat_record.AlBillCode,
+            "CatAlBillDesc": cat_record.AlBillDesc,
+            "CatBillCatg": cat_record.BillCatg,
+            "CatUnit": cat_record.Unit,
+            "CatPax": cat_record.Pax,
+            "CatQty": cat_record.Qty,
+            "CatUnitPrice": cat_record.UnitPrice,
+            "CatTotalAmount": cat_record.TotalAmount,
+        }
+
+    def _create_matched_reconciliation_record(self, air_record, cat_record):
+        """Create a reconciliation row for matched air and catering records"""
+        record = {"Id": self._reconciliation_id(air_record, cat_record)}
+        record.update(self._air_reconciliation_values(air_record))
+        record.update(self._catering_reconciliation_values(cat_record))
+        record["Air"] = "Yes"
+        record["Cat"] = "Yes"
+        self._apply_reconciliation_differences(record)
+        return self._finalize_reconciliation_record(record)
 
     def _create_air_only_reconciliation_record(self, air_record):
-        """Create a reconciliation record for air-only records"""
-        return Reconciliation(
-            Id=uuid.uuid4(),
-            DataCriacao=datetime.now(),
-            Ativo=True,
-            Excluido=False,
-            # Air Company data
-            AirSupplier=air_record.Supplier,
-            AirFlightDate=air_record.FlightDate,
-            AirFlightNo=air_record.FlightNo,
-            AirDep=air_record.Dep,
-            AirArr=air_record.Arr,
-            AirClass=air_record.Class,
-            AirInvoicedPax=air_record.InvoicedPax,
-            AirServiceCode=air_record.ServiceCode,
-            AirSupplierCode=air_record.SupplierCode,
-            AirServiceDescription=air_record.ServiceDescription,
-            AirAircraft=air_record.Aircraft,
-            AirQty=str(air_record.Qty) if air_record.Qty is not None else "0",
-            AirUnitPrice=(
-                str(air_record.UnitPrice) if air_record.UnitPrice is not None else "0"
-            ),
-            AirSubTotal=(
-                str(air_record.SubTotal) if air_record.SubTotal is not None else "0.00"
-            ),
-            AirTax=str(air_record.Tax) if air_record.Tax is not None else "0.00",
-            AirTotalIncTax=(
-                str(air_record.TotalIncTax)
-                if air_record.TotalIncTax is not None
-                else "0.00"
-            ),
-            AirCurrency=air_record.Currency,
-            AirItemStatus=air_record.ItemStatus,
-            AirInvoiceStatus=air_record.InvoiceStatus,
-            AirInvoiceDate=air_record.InvoiceDate,
-            AirPaidDate=air_record.PaidDate,
-            AirFlightNoRed=air_record.FlightNoRed,
-            # Flags
-            Air="Yes",
-            Cat="No",
-        )
+        """Create a reconciliation row for air-only records"""
+        record = {"Id": self._reconciliation_id(air_record=air_record)}
+        record.update(self._air_reconciliation_values(air_record))
+        record["Air"] = "Yes"
+        record["Cat"] = "No"
+        return self._finalize_reconciliation_record(record)
 
     def _create_catering_only_reconciliation_record(self, cat_record):
-        """Create a reconciliation record for catering-only records"""
-        return Reconciliation(
-            Id=uuid.uuid4(),
-            DataCriacao=datetime.now(),
-            Ativo=True,
-            Excluido=False,
-            # Catering data
-            CatFacility=cat_record.Facility,
-            CatFltDate=cat_record.FltDate,
-            CatFltNo=cat_record.FltNo,
-            CatFltInv=cat_record.FltInv,
-            CatClass=cat_record.Class,
-            CatItemGroup=cat_record.ItemGroup,
-            CatItemcode=cat_record.Itemcode,
-            CatItemDesc=cat_record.ItemDesc,
-            CatAlBillCode=cat_record.AlBillCode,
-            CatAlBillDesc=cat_record.AlBillDesc,
-            CatBillCatg=cat_record.BillCatg,
-            CatUnit=cat_record.Unit,
-            CatPax=cat_record.Pax,
-            CatQty=cat_record.Qty,
-            CatUnitPrice=cat_record.UnitPrice,
-            CatTotalAmount=cat_record.TotalAmount,
-            # Flags
-            Air="No",
-            Cat="Yes",
-        )
+        """Create a reconciliation row for catering-only records"""
+        record = {"Id": self._reconciliation_id(cat_record=cat_record)}
+        record.update(self._catering_reconciliation_values(cat_record))
+        record["Air"] = "No"
+        record["Cat"] = "Yes"
+        return self._finalize_reconciliation_record(record)
@@ -24,6 +24,11 @@ def mock_reconciliation_repository(mock_db_session):
     """Mock reconciliation repository"""
     repo = Mock(spec=ReconciliationRepository)
     repo.session = mock_db_session
+    repo.get_flight_number_mappings.return_value = []
+    repo.get_flight_class_mappings.return_value = []
+    repo.get_item_code_mappings.return_value = []
+    repo.get_row_states_by_flight_date.return_value = {}
+    repo.soft_delete_outside_flight_dates.return_value = 0
     return repo
 
 
@@ -0,0 +1,56 @@
+from unittest.mock import Mock
+
+from src.common.advisory_lock import advisory_lock, advisory_lock_key
+
+
+def _bind(*results):
+    connection = Mock()
+    connection.execution_options.return_value = connection
+    connection.execute.return_value.scalar.side_effect = list(results)
+    bind = Mock()
+    bind.connect.return_value = connection
+    return bind, connection
+
+
+class TestAdvisoryLock:
+    """Test cases for the advisory lock context manager"""
+
+    def test_key_is_stable_signed_64_bit(self):
+        key = advisory_lock_key("reconciliation:run")
+
+        assert key == advisory_lock_key("reconciliation:run")
+        assert key != advisory_lock_key("reconciliation:other")
+        assert -(2**63) <= key < 2**63
+
+    def test_acquired_lock_is_released(self):
+        bind, connection = _bind(True, True)
+
+        with advisory_lock(bind, "run") as acquired:
+            assert acquired is True
+
+        # try lock, then unlock
+        assert connection.execute.call_count == 2
+        connection.close.assert_called_once()
+
+    def test_no_wait_gives_up_after_one_attempt(self):
+        bind, connection = _bind(False)
+
+        with advisory_lock(bind, "run", wait=False) as acquired:
+            assert acquired is False
+
+        assert connection.execute.call_count == 1
+        connection.close.assert_called_once()
+
+    def test_wait_retries_until_free(self):
+        bind, connection = _bind(False, False, True, True)
+
+        with advisory_lock(bind, "run", poll_interval=0) as acquired:
+            assert acquired is True
+
+        assert connection.execute.call_count == 4
+
+    def test_wait_gives_up_at_timeout(self):
+        bind, connection = _bind(False, False, False)
+
+        with advisory_lock(bind, "run", timeout=0, poll_interval=0) as acquired:
+            assert acquired is False
@@ -7,15 +7,73 @@ from unittest.mock import MagicMock, Mock, mock_open, patch
 import numpy as np
 import pandas as pd
 import pytest
+from openpyxl import Workbook
 
+from common.rejects import report_rejected
 from services.ccs_file_readers_service import (
+    DATE_REJECTED,
+    EXCEL_ENGINE_ENV,
     FileReadersService,
+    drop_last,
+    excel_engine,
+    extract_digits,
     format_date,
+    frame_below_header,
     group_data_by_class,
+    normalize_text,
+    parse_dates,
     save_json,
+    to_text,
+    zero_pad,
 )
 
 
+@pytest.fixture(autouse=True)
+def openpyxl_engine(monkeypatch):
+    """Read workbooks with openpyxl whatever engines are installed"""
+    monkeypatch.delenv(EXCEL_ENGINE_ENV, raising=False)
+    monkeypatch.setattr(
+        "services.ccs_file_readers_service.calamine_available", lambda: False
+    )
+
+
+def _recon_report_frame():
+    """Inflair recon report rows as read below the header, with the 2 footer rows"""
+    df = pd.DataFrame(
+        {
+            "Facility": ["LIS ", None, "LIS", "Total", "Printed"],
+            "Flt Date": ["15/01/2024", None, "16/01/24", None, None],
+            "Flt No.": [45, None, 123, None, None],
+            "Flt Inv": ["INV001", None, "INV002", None, None],
+            "Class": ["Y", None, " C ", None, None],
+        }
+    )
+    for column in [
+        "Item Group",
+        "Item code",
+        "Item Desc",
+        "A/L Bill Code",
+        "A/L Bill Desc",
+        "Bill Catg",
+        "Unit",
+    ]:
+        df[column] = ["X", None, "X", None, None]
+    df["PAX"] = [100, None, 80, None, None]
+    df["Qty"] = [2.0, None, np.nan, 3.0, None]
+    df["Unit Price"] = [10.0, None, 5.5, None, None]
+    df["Total Amount"] = [20.0, None, 0.0, 20.0, None]
+    return df
+
+
+def _recon_report_sheet():
+    """The recon report as read with header=None: title rows, header, data"""
+    df = _recon_report_frame()
+    title = [["Inflair Billing Recon Report"] + [None] * (len(df.columns) - 1)]
+    blank = [[None] * len(df.columns)]
+    rows = title + blank + [list(df.columns)] + df.values.tolist()
+    return pd.DataFrame(rows)
+
+
 class MockDataFrame(Mock):
     """Custom Mock that allows column assignment to work with tolist()"""
 
@@ -46,41 +104,6 @@ class MockDataFrame(Mock):
         return self
 
 
-class SimpleMockDF:
-    def __init__(self):
-        self.columns = _MockListWithTolist(["Facility", "Flt Date", "Flt No."])
-        self.dropna = Mock(return_value=self)
-        self.rename = Mock(return_value=self)
-        self.replace = Mock(return_value=self)
-        self.__contains__ = Mock(return_value=True)
-        self.__setitem__ = Mock()
-        self.iloc = Mock()
-        self.iloc.__getitem__ = Mock(return_value=self)
-
-    def __len__(self):
-        return 5
-
-    def __getitem__(self, key):
-        return self
-
-    def notna(self):
-        return self
-
-    def __setattr__(self, name, value):
-        if name == "columns" and isinstance(value, list):
-            value = _MockListWithTolist(value)
-        super().__setattr__(name, value)
-
-    def rename(self, columns=None, **kwargs):
-        if columns:
-            new_columns = [columns.get(col, col) for col in self.columns]
-            self.columns = _MockListWithTolist(new_columns)
-        return self
-
-    def to_dict(self, orient="records"):
-        return [{"facility": "Test"}]
-
-
 class _MockListWithTolist(list):
     """A list that has a tolist() method"""
 
@@ -197,7 +220,7 @@ class TestFileReadersService:
         result = service.billing_inflair_invoice_report("/path/to/file.xlsx")
 
         mock_read_excel.assert_called_once_with(
-            "/path/to/file.xlsx", skiprows=12, header=None
+            "/path/to/file.xlsx", engine="openpyxl", skiprows=12, header=None
         )
         assert result == [{"test": "data"}]
 
@@ -246,32 +269,30 @@ class TestFileReadersService:
     @patch("pandas.read_excel")
     def test_billing_promeus_invoice_report_success(self, mock_read_excel, service):
         """Test successful billing promeus invoice report reading"""
-        # Create mock DataFrame with expected columns
-        mock_df = Mock()
-        mock_df.columns = [
-            "SUPPLIER",
-            "FLIGHT DATE",
-            "FLIGHT NO.",
-            "DEP",
-            "ARR",
-            "CLASS",
-        ]
-        mock_df.dropna = Mock(return_value=mock_df)
-        mock_df.reset_index = Mock(return_value=mock_df)
-        mock_df.rename = Mock(return_value=mock_df)
-        mock_df.__contains__ = Mock(return_value=True)
-        mock_df.__getitem__ = Mock(return_value=Mock())
-        mock_df.__setitem__ = Mock()
-        mock_df.select_dtypes = Mock(return_value=Mock(columns=["col1"]))
-        mock_df.replace = Mock(return_value=mock_df)
-        mock_df.to_dict = Mock(return_value=[{"test": "data"}])
-
-        mock_read_excel.return_value = mock_df
+        mock_read_excel.return_value = pd.DataFrame(
+            {
+                "SUPPLIER": [" Inflair ", "Inflair"],
+                "FLIGHT DATE": ["2024-01-15", "2024-01-16"],
+                "FLIGHT NO.": ["ZZ0123", "ZZ0456"],
+                "DEP": ["LCA", "ATH"],
+                "ARR": ["ATH", "LCA"],
+                "CLASS": ["Y", "C"],
+                "INVOICE DATE": pd.to_datetime(["2024-02-01", None]),
+            }
+        )
+        service.air_company_invoice_repository.insert_new_frame = Mock()
 
-        result = service.billing_promeus_invoice_report("/path/to/file.xlsx")
+        result = service.billing_promeus_invoice_report(
+            "/path/to/file.xlsx", return_records=True
+        )
 
-        mock_read_excel.assert_called_once_with("/path/to/file.xlsx", header=0)
-        assert result is None  # Method doesn't return data, just inserts to DB
+        mock_read_excel.assert_called_once_with(
+            "/path/to/file.xlsx", engine="openpyxl", header=0
+        )
+        assert result[0]["Supplier"] == "Inflair"
+        assert result[0]["FlightNoRed"] == "0123"
+        assert result[0]["InvoiceDate"] == date(2024, 2, 1)
+        assert result[1]["InvoiceDate"] is None
 
     @patch("pandas.read_excel")
     def test_billing_promeus_invoice_report_missing_columns(
@@ -290,35 +311,42 @@ class TestFileReadersService:
     def test_billing_promeus_invoice_report_db_insertion_success(
         self, mock_read_excel, service
     ):
-        """Test successful database insertion in billing promeus invoice report"""
-        mock_df = Mock()
-        mock_df.columns = [
-            "SUPPLIER",
-            "FLIGHT DATE",
-            "FLIGHT NO.",
-            "DEP",
-            "ARR",
-            "CLASS",
-        ]
-        mock_df.dropna = Mock(return_value=mock_df)
-        mock_df.reset_index = Mock(return_value=mock_df)
-        mock_df.rename = Mock(return_value=mock_df)
-        mock_df.__contains__ = Mock(return_value=True)
-        mock_df.__getitem__ = Mock(return_value=Mock())
-        mock_df.__setitem__ = Mock()
-        mock_df.select_dtypes = Mock(return_value=Mock(columns=[]))
-        mock_df.replace = Mock(return_value=mock_df)
-        mock_df.to_dict = Mock(return_value=[{"test": "data"}])
+        """Test the invoice DataFrame goes to the database without records"""
+        mock_read_excel.return_value = pd.DataFrame(
+            {
+                "SUPPLIER": ["Inflair", "Inflair"],
+                "FLIGHT DATE": ["2024-01-15", "2024-01-16"],
+                "FLIGHT NO.": ["ZZ0123", "ZZ0456"],
+                "DEP": ["LCA", "ATH"],
+                "ARR": ["ATH", "LCA"],
+                "QTY": [3, None],
+            }
+        )
+        service.dirty_date_repository = Mock()
+        service.air_company_invoice_repository.insert_new_frame = Mock(return_value=2)
 
-        mock_read_excel.return_value = mock_df
+        result = service.billing_promeus_invoice_report("/path/to/file.xlsx")
 
-        # Mock successful DB insertion
-        service.air_company_invoice_repository.insert_air_company_invoice = Mock()
+        assert result == 2
+        df = service.air_company_invoice_repository.insert_new_frame.call_args[0][0]
+        assert df["FlightNo"].tolist() == ["ZZ0123", "ZZ0456"]
+        assert df["FlightDate"].tolist() == ["2024-01-15", "2024-01-16"]
+        service.dirty_date_repository.mark_dates.assert_called_once_with(
+            {date(2024, 1, 15), date(2024, 1, 16)}
+        )
+
+    def test_mark_dirty_flight_dates_parses_values(self, service):
+        """ISO strings, D/M/Y strings and dates all become flight dates"""
+        service.dirty_date_repository = Mock()
+        service.dirty_date_repository.mark_dates.return_value = 2
 
-        service.billing_promeus_invoice_report("/path/to/file.xlsx")
+        marked = service.mark_dirty_flight_dates(
+            ["2024-01-05", "05/01/2024", date(2024, 1, 6), None]
+        )
 
-        service.air_company_invoice_repository.insert_air_company_invoice.assert_called_once_with(
-            [{"test": "data"}]
+        assert marked == 2
+        service.dirty_date_repository.mark_dates.assert_called_once_with(
+            {date(2024, 1, 5), date(2024, 1, 6), None}
         )
 
     @patch("pandas.read_excel")
@@ -326,40 +354,32 @@ class TestFileReadersService:
         self, mock_read_excel, service
     ):
         """Test database insertion error handling in billing promeus invoice report"""
-        mock_df = Mock()
-        mock_df.columns = [
-            "SUPPLIER",
-            "FLIGHT DATE",
-            "FLIGHT NO.",
-            "DEP",
-            "ARR",
-            "CLASS",
-        ]
-        mock_df.dropna = Mock(return_value=mock_df)
-        mock_df.reset_index = Mock(return_value=mock_df)
-        mock_df.rename = Mock(return_value=mock_df)
-        mock_df.__contains__ = Mock(return_value=True)
-        mock_df.__getitem__ = Mock(return_value=Mock())
-        mock_df.__setitem__ = Mock()
-        mock_df.select_dtypes = Mock(return_value=Mock(columns=[]))
-        mock_df.replace = Mock(return_value=mock_df)
-        mock_df.to_dict = Mock(return_value=[{"test": "data"}])
-
-        mock_read_excel.return_value = mock_df
+        mock_read_excel.return_value = pd.DataFrame(
+            {
+                "SUPPLIER": ["Inflair"],
+                "FLIGHT DATE": ["2024-01-15"],
+                "FLIGHT NO.": ["ZZ0123"],
+                "DEP": ["LCA"],
+                "ARR": ["ATH"],
+            }
+        )
 
         # Mock DB insertion error
-        service.air_company_invoice_repository.insert_air_company_invoice = Mock(
+        service.air_company_invoice_repository.insert_new_frame = Mock(
             side_effect=Exception("DB Error")
         )
+        service.dirty_date_repository = Mock()
 
-        # Should not raise exception, just print error
-        service.billing_promeus_invoice_report("/path/to/file.xlsx")
+        # Raised so that the ingestion is recorded as failed
+        with pytest.raises(Exception, match="DB Error"):
+            service.billing_promeus_invoice_report("/path/to/file.xlsx")
+        service.dirty_date_repository.mark_dates.assert_not_called()
 
     @patch("os.path.splitext")
     @patch(
         "builtins.open",
         new_callable=mock_open,
-        read_data="Facility,Data\nRow1,Value1\nRow2,Value2",
+        read_data="Report\nFacility,Data\nRow1,Value1\nRow2,Value2",
     )
     @patch("pandas.read_csv")
     def test_billing_inflair_recon_report_csv_success(
@@ -367,50 +387,18 @@ class TestFileReadersService:
     ):
         """Test successful CSV billing inflair recon report reading"""
         mock_splitext.return_value = ("/path/to/file", ".csv")
-
-        mock_df = MockDataFrame()
-        mock_df.__len__ = Mock(return_value=5)  # Mock len() to return > 2
-        mock_df.dropna = Mock(return_value=mock_df)
-        mock_df.iloc = Mock()
-        mock_df.iloc.__getitem__ = Mock(
-            return_value=mock_df
-        )  # Mock iloc[:-2] to return df
-
-        # Mock columns to behave like pandas Index
-        mock_columns = _MockListWithTolist(["Facility", "Flt Date", "Flt No."])
-        mock_df.columns = mock_columns
-
-        mock_df.rename = Mock(return_value=mock_df)
-        mock_df.__contains__ = Mock(return_value=True)
-
-        def mock_getitem(key):
-            if key == "facility":
-                mock_series = Mock()
-                # Return a mock that behaves like a boolean Series
-                mock_bool_series = Mock()
-                mock_bool_series.__getitem__ = Mock(return_value=True)  # For indexing
-                mock_bool_series.__len__ = Mock(return_value=5)
-                mock_series.notna = Mock(return_value=mock_bool_series)
-                return mock_series
-            elif isinstance(key, Mock):
-                # Handle boolean indexing: df[boolean_series]
-                return mock_df  # Return the same DataFrame (filtered)
-            else:
-                return Mock()
-
-        mock_df.__getitem__ = Mock(side_effect=mock_getitem)
-        mock_df.__setitem__ = Mock()
-        mock_df.replace = Mock(return_value=mock_df)
-        mock_df.to_dict = Mock(
-            return_value=[{"facility": "Test", "flt_date": "2023-01-01"}]
-        )
-
-        mock_read_csv.return_value = mock_df
+        mock_read_csv.return_value = _recon_report_frame()
 
         result = service.billing_inflair_recon_report("/path/to/file.csv")
 
-        mock_read_csv.assert_called_once()
-        assert result == [{"facility": "Test", "flt_date": "2023-01-01"}]
+        mock_read_csv.assert_called_once_with("/path/to/file.csv", skiprows=1)
+        assert [
+            (record["facility"], record["flt_date"], record["flt_no"])
+            for record in result
+        ] == [("LIS", date(2024, 1, 15), "045"), ("LIS", date(2024, 1, 16), "123")]
+        assert result[1]["class_"] == "C"
+        assert result[0]["qty"] == "2"
+        assert result[1]["qty"] is None
 
     @patch("os.path.splitext")
     @patch("pandas.read_excel")
@@ -419,55 +407,14 @@ class TestFileReadersService:
     ):
         """Test successful Excel billing inflair recon report reading"""
         mock_splitext.return_value = ("/path/to/file", ".xlsx")
-
-        # Mock for header detection
-        mock_df_temp = Mock()
-        mock_row = Mock()
-        mock_row.__getitem__ = Mock(return_value="Facility")
-        mock_df_temp.iterrows = Mock(return_value=[(0, mock_row)])
-
-        # Mock for main data reading
-        mock_df = MockDataFrame()
-        mock_df.__len__ = Mock(return_value=5)  # Mock len() to return > 2
-        mock_df.dropna = Mock(return_value=mock_df)
-        mock_df.iloc = Mock()
-        mock_df.iloc.__getitem__ = Mock(
-            return_value=mock_df
-        )  # Mock iloc[:-2] to return df
-
-        # Mock columns to behave like pandas Index
-        mock_columns = _MockListWithTolist(["Facility", "Flt Date", "Flt No."])
-        mock_df.columns = mock_columns
-
-        mock_df.rename = Mock(return_value=mock_df)
-        mock_df.__contains__ = Mock(return_value=True)
-
-        def mock_getitem(key):
-            if key == "facility":
-                mock_series = Mock()
-                # Return a mock that behaves like a boolean Series
-                mock_bool_series = Mock()
-                mock_bool_series.__getitem__ = Mock(return_value=True)  # For indexing
-                mock_bool_series.__len__ = Mock(return_value=5)
-                mock_series.notna = Mock(return_value=mock_bool_series)
-                return mock_series
-            elif isinstance(key, Mock):
-                # Handle boolean indexing: df[boolean_series]
-                return mock_df  # Return the same DataFrame (filtered)
-            else:
-                return Mock()
-
-        mock_df.__getitem__ = Mock(side_effect=mock_getitem)
-        mock_df.__setitem__ = Mock()
-        mock_df.replace = Mock(return_value=mock_df)
-        mock_df.to_dict = Mock(return_value=[{"facility": "Test"}])
-
-        mock_read_excel.side_effect = [mock_df_temp, mock_df]
+        mock_read_excel.return_value = _recon_report_sheet()
 
         result = service.billing_inflair_recon_report("/path/to/file.xlsx")
 
-        assert len(mock_read_excel.call_args_list) == 2
-        assert result == [{"facility": "Test"}]
+        mock_read_excel.assert_called_once_with(
+            "/path/to/file.xlsx", engine="openpyxl", header=None
+        )
+        assert [record["flt_no"] for record in result] == ["045", "123"]
 
     @patch("os.path.splitext")
     def test_billing_inflair_recon_report_unsupported_format(
@@ -484,183 +431,110 @@ class TestFileReadersService:
         self, mock_read_excel, service
     ):
         """Test successful database insertion in billing inflair recon report"""
-        # Mock file reading
-        with patch("os.path.splitext", return_value=("/path/to/file", ".xlsx")), patch(
-            "pandas.read_excel"
-        ) as mock_read_excel:
-
-            # Mock for header detection
-            mock_df_temp = Mock()
-            mock_row = Mock()
-            mock_row.__getitem__ = Mock(return_value="Facility")
-            mock_df_temp.iterrows = Mock(return_value=[(0, mock_row)])
-
-            mock_df = MockDataFrame()
-            mock_df.__len__ = Mock(return_value=5)  # Mock len() to return > 2
-            mock_df.dropna = Mock(return_value=mock_df)
-            # Mock columns to behave like pandas Index
-            mock_columns = _MockListWithTolist(["Facility", "Flt Date", "Flt No."])
-            mock_df.columns = mock_columns
-
-            mock_df.rename = Mock(return_value=mock_df)
-            mock_df.__contains__ = Mock(return_value=True)
-
-            def mock_getitem(key):
-                if key == "facility":
-                    mock_series = Mock()
-                    # Return a mock that behaves like a boolean Series
-                    mock_bool_series = Mock()
-                    mock_bool_series.__getitem__ = Mock(
-                        return_value=True
-                    )  # For indexing
-                    mock_bool_series.__len__ = Mock(return_value=5)
-                    mock_series.notna = Mock(return_value=mock_bool_series)
-                    return mock_series
-                elif isinstance(key, Mock):
-                    # Handle boolean indexing: df[boolean_series]
-                    return mock_df  # Return the same DataFrame (filtered)
-                else:
-                    return Mock()
+        with patch("os.path.splitext", return_value=("/path/to/file", ".xlsx")):
+            mock_read_excel.return_value = _recon_report_sheet()
+            service.catering_invoice_repository.insert_frame = Mock()
 
-            mock_df.__getitem__ = Mock(side_effect=mock_getitem)
-            mock_df.__setitem__ = Mock()
-            mock_df.replace = Mock(return_value=mock_df)
-            mock_df.to_dict = Mock(
-                return_value=[
-                    {
-                        "facility": "Test",
-                        "flt_date": "2023-01-01",
-                        "flt_no": "123",
-                        "flt_inv": "INV001",
-                        "class_": "A",
-                        "item_group": "Food",
-                        "itemcode": "F001",
-                        "item_desc": "Test Item",
-                        "al_bill_code": "ABC",
-                        "al_bill_desc": "Test Bill",
-                        "bill_catg": "Category",
-                        "unit": "kg",
-                        "pax": "100",
-                        "qty": "50",
-                        "unit_price": "10.0",
-                        "total_amount": "500.0",
-                    }
-                ]
+            result = service.billing_inflair_recon_report(
+                "/path/to/file.xlsx", return_records=False
             )
 
-            mock_read_excel.side_effect = [mock_df_temp, mock_df]
-
-            # Mock successful DB insertion
-            service.catering_invoice_repository.bulk_insert = Mock()
-
-            result = service.billing_inflair_recon_report("/path/to/file.xlsx")
-
-            service.catering_invoice_repository.bulk_insert.assert_called_once()
+            assert result == 2
+            service.catering_invoice_repository.insert_frame.assert_called_once()
+            df = service.catering_invoice_repository.insert_frame.call_args[0][0]
+            assert df["flt_no"].tolist() == ["045", "123"]
+            assert df["flt_date"].iloc[0] == date(2024, 1, 15)
+            stages = service.metrics.as_dict()
+            assert stages["parse"]["rows"] == 2
+            assert stages["normalize"]["rows"] == 2
 
     @patch("pandas.read_excel")
-    @patch("pandas.to_numeric")
-    def test_pricing_read_inflair_success(
-        self, mock_to_numeric, mock_read_excel, service
-    ):
+    def test_pricing_read_inflair_success(self, mock_read_excel, service):
         """Test successful pricing read inflair"""
-        mock_df = Mock()
-        mock_df.columns = ["id", "airline_code", "item_code", "start_date", "end_date"]
-
-        # Mock DataFrame operations
-        mock_id_series = Mock()
-        mock_id_series.astype = Mock(return_value=Mock())
-        mock_match_result = pd.Series([False, False, False])
-        mock_id_series.astype.return_value.str.match = Mock(
-            return_value=mock_match_result
+        mock_read_excel.return_value = pd.DataFrame(
+            [
+                [
+                    "1",
+                    "ZZ",
+                    "TEST123",
+                    "01/01/2024",
+                    "31/12/24",
+                    "CC",
+                    "EA",
+                    100.5,
+                    "EUR",
+                    pd.Timestamp("2023-12-20"),
+                    "10:00",
+                    "user",
+                    "New",
+                    "2024",
+                ],
+                [
+                    "---",
+                    None,
+                    None,
+                    None,
+                    None,
+                    None,
+                    None,
+                    None,
+                    None,
+                    None,
+                    None,
+                    None,
+                    None,
+                    None,
+                ],
+                [
+                    "2",
+                    "ZZ",
+                    "TEST456",
+                    "01/01/2024",
+                    "not a date",
+                    "CC",
+                    "EA",
+                    "7.1234",
+                    "EUR",
+                    None,
+                    "10:00",
+                    "user",
+                    "New",
+                    "2024",
+                ],
+            ]
         )
 
-        mock_item_code_series = Mock()
-        mock_item_code_series.notna = Mock(return_value=pd.Series([True]))
-
-        def mock_getitem(key):
-            if isinstance(key, pd.Series) and key.dtype == bool:
-                # When df[boolean_series] is called, return the df itself
-                return mock_df
-            elif isinstance(key, str) and key == "id":
-                return mock_id_series
-            elif isinstance(key, str) and key == "item_code":
-                return mock_item_code_series
-            elif isinstance(key, str) and key == "price":
-                return Mock(ndim=1)  # Mock Series for price column
-            else:
-                return Mock()
-
-        mock_df.__getitem__ = Mock(side_effect=mock_getitem)
-        mock_df.__setitem__ = Mock()
-        mock_df.replace = Mock(return_value=mock_df)
-        mock_df.to_dict = Mock(return_value=[{"item_code": "TEST123", "price": 100.50}])
-
-        mock_to_numeric.return_value.round = Mock(return_value=Mock())
-
-        mock_read_excel.return_value = mock_df
-
         result = service.pricing_read_inflair("/path/to/file.xlsx")
 
-        mock_read_excel.assert_called_once_with("/path/to/file.xlsx", skiprows=8)
-        assert result == [{"item_code": "TEST123", "price": 100.50}]
+        mock_read_excel.assert_called_once_with(
+            "/path/to/file.xlsx", engine="openpyxl", skiprows=8
+        )
+        assert [record["item_code"] for record in result] == ["TEST123", "TEST456"]
+        assert result[0]["price"] == 100.5
+        assert result[1]["price"] == 7.123
+        assert result[0]["start_date"] == date(2024, 1, 1)
+        assert result[0]["end_date"] == date(2024, 12, 31)
+        assert result[0]["created_date"] == date(2023, 12, 20)
+        assert result[1]["end_date"] is None
+        assert result[1]["created_date"] is None
 
     @patch("pandas.read_excel")
     def test_pricing_read_promeus_with_flight_classes_success(
         self, mock_read_excel, service
     ):
         """Test successful pricing read promeus with flight classes"""
-        # Create mock DataFrame with iterrows
-        mock_df = Mock()
-        mock_row_data = {
-            0: "Business Class",
-            2: "Service Code",
-            3: "Description",
-            4: "USD",
-            5: 150.00,
-        }
-        mock_row = Mock()
-        mock_row.__getitem__ = Mock(side_effect=lambda key: mock_row_data.get(key))
-
-        mock_df.iterrows = Mock(
-            return_value=[
-                (0, mock_row),  # Class header
-                (
-                    1,
-                    Mock(__getitem__=Mock(return_value="Data")),
-                ),  # Data row with __getitem__
+        mock_read_excel.return_value = pd.DataFrame(
+            [
+                ["Price History Report", None, None, None, None, None],
+                [" Business Class ", None, None, None, None, None],
+                ["Facility", None, "Service Code", "Description", "Currency", "Price"],
+                ["LIS ", None, " BML ", "Breakfast", "EUR", 12.5],
+                ["LIS", None, "SNK", None, "EUR", 3.0],
+                ["Economy Class", None, None, None, None, None],
+                ["OPO", None, "BML", "Breakfast", "EUR", 8.0],
             ]
         )
 
-        # Mock DataFrame operations for flight class filtering
-        mock_flight_class_series = Mock()
-        mock_flight_class_series.str = Mock()
-        mock_flight_class_series.str.contains = Mock(
-            return_value=pd.Series([True, False, True])
-        )
-
-        mock_price_series = Mock()
-        mock_valid_from_series = Mock()
-        mock_valid_to_series = Mock()
-
-        def mock_getitem(key):
-            if key == "flight_class":
-                return mock_flight_class_series
-            elif key == "price":
-                return mock_price_series
-            elif key == "valid_from":
-                return mock_valid_from_series
-            elif key == "valid_to":
-                return mock_valid_to_series
-            else:
-                return Mock()
-
-        mock_df.__getitem__ = Mock(side_effect=mock_getitem)
-        mock_df.__setitem__ = Mock()
-        mock_df.replace = Mock(return_value=mock_df)
-        mock_df.to_dict = Mock(return_value=[{"flight_class": "Y", "price": 200.00}])
-
-        mock_read_excel.return_value = mock_df
-
         result = service.pricing_read_promeus_with_flight_classes("/path/to/file.xlsx")
 
         mock_read_excel.assert_called_once_with(
@@ -669,7 +543,46 @@ class TestFileReadersService:
             engine="openpyxl",
             header=None,
         )
-        assert isinstance(result, list)
+        assert result == [
+            {
+                "class": "Business Class",
+                "facility": "LIS ",
+                "service_code": " BML ",
+                "description": "Breakfast",
+                "currency": "EUR",
+                "price": 12.5,
+            },
+            {
+                "class": "Economy Class",
+                "facility": "OPO",
+                "service_code": "BML",
+                "description": "Breakfast",
+                "currency": "EUR",
+                "price": 8.0,
+            },
+        ]
+
+    @patch("pandas.read_excel")
+    def test_pricing_read_promeus_rows_before_first_class(
+        self, mock_read_excel, service
+    ):
+        """Test data rows before any class header and a repeated header row"""
+        mock_read_excel.return_value = pd.DataFrame(
+            [
+                ["Facility", None, "Service Code", "Description", "Currency", "Price"],
+                ["LIS", None, "BML", "Breakfast", None, 12.5],
+                [7, None, None, None, None, None],
+                ["Facility", None, "Service Code", "Description", "Currency", "Price"],
+            ]
+        )
+
+        result = service.pricing_read_promeus_with_flight_classes("/path/to/file.xlsx")
+
+        assert [(record["class"], record["facility"]) for record in result] == [
+            (None, "LIS"),
+            (None, "Facility"),
+        ]
+        assert pd.isna(result[0]["currency"])
 
     @patch("pandas.read_excel")
     def test_read_flight_class_mapping_success(self, mock_read_excel, service):
@@ -899,6 +812,155 @@ class TestFileReadersService:
 
         service.flight_number_mapping_repository.bulk_insert.assert_called_once()
 
+    @patch("pandas.read_excel")
+    @patch("pandas.ExcelFile")
+    def test_read_flight_mappings_replaces_both_tables(
+        self, mock_excel_file, mock_read_excel, service, mock_session
+    ):
+        """Test the mapping workbook is opened once and both tables replaced"""
+        workbook = mock_excel_file.return_value.__enter__.return_value
+        mock_read_excel.side_effect = [
+            pd.DataFrame({"Class": [" Y "], "A/L Bill Code": ["BML"]}),
+            pd.DataFrame(
+                {"Promeus Code": ["TP0085", None], "Inflair Code": ["85", None]}
+            ),
+        ]
+
+        result = service.read_flight_mappings("/path/to/file.xlsx")
+
+        mock_excel_file.assert_called_once_with("/path/to/file.xlsx", engine="openpyxl")
+        assert [call.args[0] for call in mock_read_excel.call_args_list] == [
+            workbook,
+            workbook,
+        ]
+        assert result == {
+            "flight_class_mapping": [{"promeus_class": "Y", "al_bill_code": "BML"}],
+            "flight_number_mapping": [
+                {"air_company_flight_number": "TP0085", "catering_flight_number": "85"}
+            ],
+        }
+        service.flight_class_mapping_repository.replace_all.assert_called_once()
+        service.flight_number_mapping_repository.replace_all.assert_called_once()
+        mock_session.commit.assert_called_once()
+
+    @patch("pandas.read_excel")
+    @patch("pandas.ExcelFile")
+    def test_read_flight_mappings_keeps_tables_on_empty_sheet(
+        self, mock_excel_file, mock_read_excel, service, mock_session
+    ):
+        """Test an empty sheet does not wipe the mapping tables"""
+        mock_read_excel.side_effect = [
+            pd.DataFrame({"Class": [None]}),
+            pd.DataFrame({"Promeus Code": ["TP0085"], "Inflair Code": ["85"]}),
+        ]
+
+        with pytest.raises(ValueError, match="Please share the correct file"):
+            service.read_flight_mappings("/path/to/file.xlsx")
+
+        service.flight_class_mapping_repository.replace_all.assert_not_called()
+        mock_session.commit.assert_not_called()
+
+    def test_billing_inflair_recon_report_streams_in_batches(
+        self, service, tmp_path, monkeypatch
+    ):
+        """Test streamed recon files are inserted batch by batch"""
+        monkeypatch.setattr("services.ccs_file_readers_service.STREAM_BATCH_SIZE", 1)
+        service.dirty_date_repository = Mock()
+        path = str(tmp_path / "recon.xlsx")
+        workbook = Workbook()
+        for row in _recon_report_sheet().values.tolist():
+            workbook.active.append([None if pd.isna(value) else value for value in row])
+        workbook.save(path)
+
+        result = service.billing_inflair_recon_report(path, stream=True)
+
+        assert result == 2
+        batches = [
+            call[0][0]
+            for call in service.catering_invoice_repository.insert_frame.call_args_list
+        ]
+        assert [df["flt_no"].tolist() for df in batches] == [["045"], ["123"]]
+        assert batches[0]["flt_date"].iloc[0] == date(2024, 1, 15)
+        assert batches[1]["pax"].iloc[0] == "80"
+        assert all(
+            call.kwargs["commit"] is False
+            for call in service.catering_invoice_repository.insert_frame.call_args_list
+        )
+        service.session.commit.assert_called_once()
+        service.dirty_date_repository.mark_dates.assert_called_once_with(
+            {date(2024, 1, 15), date(2024, 1, 16)}
+        )
+
+    def test_billing_promeus_invoice_report_stream_logs_inserted_rows(
+        self, service, tmp_path, monkeypatch, capsys
+    ):
+        """Test streamed Promeus files return the rows read and log the inserts"""
+        monkeypatch.setattr("services.ccs_file_readers_service.STREAM_BATCH_SIZE", 1)
+        service.dirty_date_repository = Mock()
+        service.air_company_invoice_repository.insert_new_frame = Mock(
+            side_effect=[1, 0]
+        )
+        path = str(tmp_path / "invoices.xlsx")
+        workbook = Workbook()
+        workbook.active.append(["SUPPLIER", "FLIGHT DATE", "FLIGHT NO.", "DEP", "ARR"])
+        for _ in range(2):
+            workbook.active.append(["Inflair", "2024-01-15", "ZZ0123", "LCA", "ATH"])
+        workbook.save(path)
+
+        result = service.billing_promeus_invoice_report(path, stream=True)
+
+        assert result == 2
+        assert "Successfully inserted 1 of 2 air company invoice records" in (
+            capsys.readouterr().out
+        )
+        service.session.commit.assert_called_once()
+
+    def test_billing_inflair_recon_report_stream_failure_stores_nothing(
+        self, service, tmp_path, monkeypatch
+    ):
+        """Test a failed batch rolls back the whole streamed file and raises"""
+        monkeypatch.setattr("services.ccs_file_readers_service.STREAM_BATCH_SIZE", 1)
+        service.dirty_date_repository = Mock()
+        service.catering_invoice_repository.insert_frame.side_effect = [
+            1,
+            Exception("DB Error"),
+        ]
+        path = str(tmp_path / "recon.xlsx")
+        workbook = Workbook()
+        for row in _recon_report_sheet().values.tolist():
+            workbook.active.append([None if pd.isna(value) else value for value in row])
+        workbook.save(path)
+
+        with pytest.raises(Exception, match="DB Error"):
+            service.billing_inflair_recon_report(path, stream=True)
+
+        service.session.commit.assert_not_called()
+        service.session.rollback.assert_called_once()
+        service.dirty_date_repository.mark_dates.assert_not_called()
+
+    def test_pricing_read_promeus_streams_class_across_batches(self, service, tmp_path):
+        """Test the section class carries over from one batch to the next"""
+        path = str(tmp_path / "prices.xlsx")
+        workbook = Workbook()
+        workbook.active.title = "Price History Report"
+        for row in [
+            ["Business Class"],
+            ["Facility", None, "Service Code", "Description", "Currency", "Price"],
+            ["LIS", None, "BML", "Breakfast", "EUR", 12.5],
+            ["OPO", None, "SNK", "Snack", "EUR", 3],
+        ]:
+            workbook.active.append(row)
+        workbook.save(path)
+
+        batches = list(
+            service.stream_pricing_promeus_with_flight_classes(path, batch_size=3)
+        )
+
+        assert [
+            [(record["class"], record["service_code"]) for record in batch]
+            for batch in batches
+        ] == [[("Business Class", "BML")], [("Business Class", "SNK")]]
+
 
 class TestUtilityFunctions:
     """Test cases for utility functions"""
@@ -943,6 +1005,116 @@ class TestUtilityFunctions:
         result = format_date("")
         assert result is None
 
+    def test_parse_dates_mixed_values(self):
+        """Test parse_dates with timestamps, dates and both text formats"""
+        values = pd.Series(
+            [
+                pd.Timestamp("2023-01-15"),
+                date(2023, 1, 16),
+                "17/01/2023",
+                " 18/01/23 ",
+                None,
+                np.nan,
+                "",
+            ],
+            index=range(10, 17),
+        )
+
+        result = parse_dates(values)
+
+        assert list(result.index) == list(range(10, 17))
+        assert result.tolist() == [
+            date(2023, 1, 15),
+            date(2023, 1, 16),
+            date(2023, 1, 17),
+            date(2023, 1, 18),
+            None,
+            None,
+            None,
+        ]
+
+    def test_parse_dates_collects_rejects(self, capsys):
+        """Test parse_dates counts each unparseable value instead of printing"""
+        rejects = {}
+        values = pd.Series(["invalid-date", "15/01/2023", "invalid-date", "2023-13"])
+
+        result = parse_dates(values, rejects)
+
+        assert result.tolist() == [None, date(2023, 1, 15), None, None]
+        assert rejects == {"invalid-date": 2, "2023-13": 1}
+        assert capsys.readouterr().out == ""
+
+        counts = report_rejected(
+            "reader", {"flt_date": rejects, "end_date": {}}, DATE_REJECTED
+        )
+        output = capsys.readouterr().out
+        assert "reader: 3 flt_date values could not be parsed as dates" in output
+        assert counts == {"flt_date": 3}
+        assert "2 distinct" in output
+        assert "end_date" not in output
+
+    def test_excel_engine_prefers_calamine(self, monkeypatch):
+        """Test excel_engine picks calamine when installed, else openpyxl/xlrd"""
+        assert excel_engine("/path/to/file.xlsx") == "openpyxl"
+        assert excel_engine("/path/to/file.XLS") == "xlrd"
+
+        monkeypatch.setattr(
+            "services.ccs_file_readers_service.calamine_available", lambda: True
+        )
+        assert excel_engine("/path/to/file.xls") == "calamine"
+
+        monkeypatch.setenv(EXCEL_ENGINE_ENV, "openpyxl")
+        assert excel_engine("/path/to/file.xlsx") == "openpyxl"
+
+    def test_drop_last(self):
+        """Test drop_last leaves out the trailing items like iloc[:-count]"""
+        assert list(drop_last(range(5), 2)) == [0, 1, 2]
+        assert list(drop_last(range(2), 2)) == [0, 1]
+
+    def test_frame_below_header(self):
+        """Test frame_below_header names the rows after the header row"""
+        sheet = pd.DataFrame(
+            [["Report", None, None], ["Facility", None, "Qty"], ["LIS", None, 2]]
+        )
+
+        df = frame_below_header(sheet, 1)
+
+        assert df.columns.tolist() == ["Facility", "Unnamed: 1", "Qty"]
+        assert df.to_dict(orient="records") == [
+            {"Facility": "LIS", "Unnamed: 1": None, "Qty": 2}
+        ]
+        assert pd.api.types.is_integer_dtype(df["Qty"])
+
+    def test_code_normalizers(self):
+        """Test the vectorized flight number and text normalizers"""
+        values = pd.Series(["ZZ0123", " 45 ", 5, 45.0, None, np.nan, "ABC"])
+
+        assert extract_digits(values).tolist() == [
+            "0123",
+            "45",
+            "5",
+            "45",
+            None,
+            None,
+            None,
+        ]
+        assert zero_pad(values, 3).tolist() == [
+            "ZZ0123",
+            "045",
+            "005",
+            "045",
+            None,
+            None,
+            "ABC",
+        ]
+        assert to_text(pd.Series([2.0, 2.5, np.nan, None])).tolist() == [
+            "2",
+            "2.5",
+            None,
+            None,
+        ]
+        assert normalize_text(pd.Series([" a ", 1, None])).tolist() == ["a", 1, None]
+
     def test_group_data_by_class_success(self):
         """Test successful data grouping by class"""
         data = [
@@ -1054,28 +1226,17 @@ class TestErrorHandling:
         self, mock_read_excel, service
     ):
         """Test database insertion error handling in billing inflair recon report"""
-        with patch("os.path.splitext", return_value=("/path/to/file", ".xlsx")), patch(
-            "pandas.read_excel"
-        ) as mock_read_excel:
-
-            # Mock for header detection
-            mock_df_temp = Mock()
-            mock_row = Mock()
-            mock_row.__getitem__ = Mock(return_value="Facility")
-            mock_df_temp.iterrows = Mock(return_value=[(0, mock_row)])
-
-            mock_df = SimpleMockDF()
-
-            mock_read_excel.side_effect = [mock_df_temp, mock_df]
+        with patch("os.path.splitext", return_value=("/path/to/file", ".xlsx")):
+            mock_read_excel.return_value = _recon_report_sheet()
 
             # Mock DB insertion error
-            service.catering_invoice_repository.bulk_insert = Mock(
+            service.catering_invoice_repository.insert_frame = Mock(
                 side_effect=Exception("DB Error")
             )
 
-            # Should not raise exception
-            result = service.billing_inflair_recon_report("/path/to/file.xlsx")
-            assert result == [{"facility": "Test"}]
+            # Raised so that the ingestion is recorded as failed
+            with pytest.raises(Exception, match="DB Error"):
+                service.billing_inflair_recon_report("/path/to/file.xlsx")
 
     @patch("pandas.read_excel")
     def test_read_flight_class_mapping_db_insertion_error(
@@ -0,0 +1,102 @@
+import uuid
+from datetime import date
+from unittest.mock import Mock
+
+import pandas as pd
+
+from src.common.copy_frame import copy_frame, frame_to_table
+from src.models.schema_ccs import AirCompanyInvoiceReport, CateringInvoiceReport
+
+
+def _session():
+    cursor = Mock()
+    cursor.copy_expert.side_effect = lambda sql, buffer: copied.append(
+        (sql, buffer.read())
+    )
+    copied = []
+    session = Mock()
+    session.connection.return_value.connection.cursor.return_value = cursor
+    return session, cursor, copied
+
+
+class TestFrameToTable:
+    """Test cases for shaping DataFrames into table columns"""
+
+    def test_renames_drops_and_fills_defaults(self):
+        df = pd.DataFrame(
+            {"facility": ["LIS", "OPO"], "flt_no": ["045", None], "other": [1, 2]}
+        )
+
+        frame = frame_to_table(
+            df,
+            CateringInvoiceReport.__table__,
+            {"facility": "Facility", "flt_no": "FltNo"},
+        )
+
+        assert list(frame.columns) == ["Facility", "FltNo", "Id", "Ativo", "Excluido"]
+        assert frame["Ativo"].tolist() == [True, True]
+        assert frame["Excluido"].tolist() == [False, False]
+        assert all(isinstance(value, uuid.UUID) for value in frame["Id"])
+        assert frame["Id"].nunique() == 2
+
+    def test_casts_integer_columns(self):
+        df = pd.DataFrame({"Qty": [15.0, None, "3"]})
+
+        frame = frame_to_table(df, AirCompanyInvoiceReport.__table__)
+
+        assert frame["Qty"].tolist()[0] == 15
+        assert frame["Qty"].isna().tolist() == [False, True, False]
+
+    def test_collects_values_that_are_not_numbers(self):
+        df = pd.DataFrame({"Qty": ["3", "n/a", " ", "n/a", "x"]})
+        rejects = {}
+
+        frame = frame_to_table(df, AirCompanyInvoiceReport.__table__, rejects=rejects)
+
+        assert frame["Qty"].isna().tolist() == [False, True, True, True, True]
+        assert rejects == {"Qty": {"n/a": 2, "x": 1}}
+
+    def test_reports_values_that_are_not_numbers(self, capsys):
+        df = pd.DataFrame({"Qty": ["3", "n/a"]})
+
+        frame_to_table(df, AirCompanyInvoiceReport.__table__)
+
+        output = capsys.readouterr().out
+        assert "1 Qty values are not numbers and were stored as NULL" in output
+        assert "'n/a'" in output
+
+
+class TestCopyFrame:
+    """Test cases for copying DataFrames with COPY"""
+
+    def test_writes_csv_with_null_marker(self):
+        session, cursor, copied = _session()
+        df = pd.DataFrame(
+            {
+                "Facility": ["LIS", None, 'A "quoted", value'],
+                "FltDate": [date(2024, 1, 15), None, date(2024, 1, 16)],
+                "FltNo": ["045", "", "123"],
+            }
+        )
+
+        assert copy_frame(session, CateringInvoiceReport.__table__, df) == 3
+
+        sql, body = copied[0]
+        assert sql == (
+            'COPY ccs."CateringInvoiceReport" ("Facility", "FltDate", "FltNo") '
+            "FROM STDIN WITH (FORMAT csv, NULL '\\N')"
+        )
+        assert body.splitlines() == [
+            "LIS,2024-01-15,045",
+            "\\N,\\N,",
+            '"A ""quoted"", value",2024-01-16,123',
+        ]
+        cursor.close.assert_called_once()
+
+    def test_copies_into_target(self):
+        session, _, copied = _session()
+        df = pd.DataFrame({"FlightNo": ["TP0085"]})
+
+        copy_frame(session, AirCompanyInvoiceReport.__table__, df, target='"Stage"')
+
+        assert copied[0][0].startswith('COPY "Stage" ("FlightNo") FROM STDIN')
@@ -0,0 +1,46 @@
+import gzip
+import json
+from datetime import date
+from unittest.mock import patch
+
+import pytest
+
+from src.common.output_store import flatten_records, write_records
+
+
+class TestWriteRecords:
+    """Test cases for offloading reader output"""
+
+    def test_writes_gzipped_json_lines_to_directory(self, tmp_path):
+        records = [{"flt_no": "045", "flt_date": date(2024, 1, 15)}, {"flt_no": None}]
+
+        pointer = write_records(records, str(tmp_path / "out"), "manifest-id")
+
+        assert pointer == {
+            "location": str(tmp_path / "out" / "manifest-id.jsonl.gz"),
+            "format": "jsonl",
+            "records": 2,
+        }
+        with gzip.open(pointer["location"], "rt") as output:
+            lines = [json.loads(line) for line in output]
+        assert lines == [{"flt_no": "045", "flt_date": "2024-01-15"}, {"flt_no": None}]
+
+    def test_uploads_to_s3_prefix(self):
+        with patch("src.common.output_store.upload_file") as mock_upload:
+            pointer = write_records([{"a": 1}], "s3://bucket/reads/", "manifest-id")
+
+        assert pointer["location"] == "s3://bucket/reads/manifest-id.jsonl.gz"
+        key, bucket, _ = mock_upload.call_args[0]
+        assert (key, bucket) == ("reads/manifest-id.jsonl.gz", "bucket")
+
+    def test_rejects_unknown_format(self, tmp_path):
+        with pytest.raises(ValueError, match="Unsupported output format"):
+            write_records([], str(tmp_path), "manifest-id", "csv")
+
+    def test_flattens_grouped_records(self):
+        data = {"Business": [{"code": "BML"}], "Economy": [{"code": "SNK"}]}
+
+        assert flatten_records(data) == [
+            {"group": "Business", "code": "BML"},
+            {"group": "Economy", "code": "SNK"},
+        ]
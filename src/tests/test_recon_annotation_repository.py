@@ -0,0 +1,116 @@
+import uuid
+from unittest.mock import Mock
+
+import pytest
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import Session
+
+from enums.status_enum import StatusEnum
+from models.schema_ccs import ReconAnnotation
+from repositories.recon_annotation_repository import ReconAnnotationRepository
+
+
+class TestReconAnnotationRepository:
+    """Test cases for ReconAnnotationRepository"""
+
+    @pytest.fixture
+    def mock_session(self):
+        """Mock database session"""
+        return Mock(spec=Session)
+
+    @pytest.fixture
+    def repository(self, mock_session):
+        return ReconAnnotationRepository(mock_session)
+
+    def test_create_flushes_without_commit(self, repository, mock_session):
+        """Creating an annotation must leave the transaction to the caller"""
+        reconciliation_id = uuid.uuid4()
+
+        annotation = repository.create(
+            reconciliation_id=reconciliation_id,
+            annotation="Checked with supplier",
+            status=StatusEnum.APPROVED,
+        )
+
+        assert annotation.ReconciliationId == reconciliation_id
+        assert annotation.Status == StatusEnum.APPROVED
+        assert annotation.DataCriacao == annotation.DataAtualizacao
+        mock_session.add.assert_called_once_with(annotation)
+        mock_session.flush.assert_called_once()
+        mock_session.commit.assert_not_called()
+        mock_session.refresh.assert_not_called()
+
+    def test_update_flushes_without_commit(self, repository, mock_session):
+        existing = ReconAnnotation(uuid.uuid4(), "old text")
+        repository.get_by_id = Mock(return_value=existing)
+
+        result = repository.update(
+            annotation_id=uuid.uuid4(), annotation="new text", status=StatusEnum.CLOSED
+        )
+
+        assert result is existing
+        assert existing.Annotation == "new text"
+        assert existing.Status == StatusEnum.CLOSED
+        mock_session.flush.assert_called_once()
+        mock_session.commit.assert_not_called()
+
+    def test_update_not_found(self, repository, mock_session):
+        repository.get_by_id = Mock(return_value=None)
+
+        assert repository.update(annotation_id=uuid.uuid4(), annotation="x") is None
+        mock_session.flush.assert_not_called()
+
+    def test_delete_is_soft_and_flushes(self, repository, mock_session):
+        existing = ReconAnnotation(uuid.uuid4(), "text")
+        existing.Ativo = True
+        existing.Excluido = False
+        repository.get_by_id = Mock(return_value=existing)
+
+        assert repository.delete(uuid.uuid4()) is True
+        assert existing.Ativo is False
+        assert existing.Excluido is True
+        mock_session.flush.assert_called_once()
+        mock_session.commit.assert_not_called()
+
+    def test_create_error_does_not_rollback(self, repository, mock_session):
+        """Rollback is owned by the request lifecycle, not the repository"""
+        mock_session.flush.side_effect = Exception("db down")
+
+        with pytest.raises(Exception, match="db down"):
+            repository.create(reconciliation_id=uuid.uuid4(), annotation="text")
+
+        mock_session.rollback.assert_not_called()
+
+    def test_writes_refresh_reconciliation_summary(self, repository, mock_session):
+        reconciliation_id = uuid.uuid4()
+        existing = ReconAnnotation(reconciliation_id, "text")
+        repository.get_by_id = Mock(return_value=existing)
+        repository.refresh_reconciliation_summaries = Mock()
+
+        repository.update(annotation_id=uuid.uuid4(), status=StatusEnum.APPROVED)
+        repository.delete(uuid.uuid4())
+        repository.create(reconciliation_id=reconciliation_id, annotation="new")
+
+        assert repository.refresh_reconciliation_summaries.call_count == 3
+        for call in repository.refresh_reconciliation_summaries.call_args_list:
+            assert call.args == ([reconciliation_id],)
+
+    def test_create_locks_no_key_update_after_insert(self, repository, mock_session):
+        """
+        The FK of the flushed INSERT holds KEY SHARE on the reconciliation
+        row, so the summary lock taken after it must not be FOR UPDATE
+        """
+        repository.create(reconciliation_id=uuid.uuid4(), annotation="text")
+
+        steps = [name for name, _, _ in mock_session.mock_calls]
+        assert steps == ["add", "flush", "execute", "execute"]
+        lock, summary = [call.args[0] for call in mock_session.execute.call_args_list]
+        lock_sql = str(lock.compile(dialect=postgresql.dialect()))
+        assert lock_sql.endswith("FOR NO KEY UPDATE")
+        assert summary.is_update
+        assert summary.table.name == "Reconciliation"
+
+    def test_refresh_summary_skips_empty(self, repository, mock_session):
+        repository.refresh_reconciliation_summaries([])
+
+        mock_session.execute.assert_not_called()
@@ -0,0 +1,183 @@
+import uuid
+from datetime import datetime
+from unittest.mock import Mock
+
+import pytest
+from sqlalchemy.orm import Session
+
+from enums.status_enum import StatusEnum
+from services.recon_annotation_service import (
+    MAX_BULK_ANNOTATIONS,
+    ReconAnnotationService,
+)
+
+
+class TestBulkSaveAnnotations:
+    """Test cases for ReconAnnotationService.bulk_save_annotations"""
+
+    @pytest.fixture
+    def service(self):
+        service = ReconAnnotationService(Mock(spec=Session))
+        service.annotation_repository = Mock()
+        service.reconciliation_repository = Mock()
+        service.annotation_repository.bulk_create.side_effect = lambda rows: [
+            {
+                "Id": uuid.uuid4(),
+                "ReconciliationId": row["reconciliation_id"],
+                "Annotation": row["annotation"],
+                "Status": row["status"],
+            }
+            for row in rows
+        ]
+        service.annotation_repository.bulk_update.return_value = datetime(2024, 1, 1)
+        return service
+
+    def test_rejects_empty_and_oversized_requests(self, service):
+        assert service.bulk_save_annotations([])["success"] is False
+        assert service.bulk_save_annotations(None)["success"] is False
+
+        result = service.bulk_save_annotations(
+            [{"reconciliation_id": str(uuid.uuid4()), "annotation": "x"}]
+            * (MAX_BULK_ANNOTATIONS + 1)
+        )
+        assert result["success"] is False
+        service.annotation_repository.bulk_create.assert_not_called()
+
+    def test_validates_ids_with_one_query_and_inserts_once(self, service):
+        found = uuid.uuid4()
+        missing = uuid.uuid4()
+        service.reconciliation_repository.get_existing_ids.return_value = {found}
+        service.annotation_repository.get_existing_ids.return_value = set()
+
+        result = service.bulk_save_annotations(
+            [
+                {
+                    "reconciliation_id": str(found),
+                    "annotation": "ok",
+                    "status": "APPROVED",
+                },
+                {"reconciliation_id": str(missing), "annotation": "ok"},
+                {"reconciliation_id": str(found), "annotation": "ok", "status": "BAD"},
+                {"reconciliation_id": "not-a-uuid", "annotation": "ok"},
+                {"reconciliation_id": str(found), "annotation": ""},
+            ]
+        )
+
+        assert result["success"] is True
+        data = result["data"]
+        assert (data["total"], data["succeeded"], data["failed"]) == (5, 1, 4)
+        assert [r["success"] for r in data["results"]] == [
+            True,
+            False,
+            False,
+            False,
+            False,
+        ]
+        assert data["results"][1]["error"] == "Reconciliation item not found"
+        assert data["results"][0]["data"]["Status"] == str(StatusEnum.APPROVED)
+
+        service.reconciliation_repository.get_existing_ids.assert_called_once()
+        assert set(
+            service.reconciliation_repository.get_existing_ids.call_args[0][0]
+        ) == {found, missing}
+        service.annotation_repository.bulk_create.assert_called_once()
+        rows = service.annotation_repository.bulk_create.call_args[0][0]
+        assert rows == [
+            {
+                "reconciliation_id": found,
+                "annotation": "ok",
+                "status": StatusEnum.APPROVED,
+            }
+        ]
+
+    def test_items_with_annotation_id_are_updates(self, service):
+        existing = uuid.uuid4()
+        service.reconciliation_repository.get_existing_ids.return_value = set()
+        service.annotation_repository.get_existing_ids.return_value = {existing}
+
+        result = service.bulk_save_annotations(
+            [
+                {"annotation_id": str(existing), "status": "CLOSED"},
+                {"annotation_id": str(uuid.uuid4()), "status": "CLOSED"},
+                {"annotation_id": str(existing)},
+            ]
+        )
+
+        results = result["data"]["results"]
+        assert results[0]["success"] is True
+        assert results[0]["data"]["Id"] == str(existing)
+        assert results[1]["error"] == "Annotation not found"
+        assert results[2]["success"] is False
+        service.annotation_repository.bulk_update.assert_called_once_with(
+            [
+                {
+                    "annotation_id": existing,
+                    "annotation": None,
+                    "status": StatusEnum.CLOSED,
+                }
+            ]
+        )
+        service.annotation_repository.bulk_create.assert_called_once_with([])
+
+    def test_repository_error_returns_failure(self, service):
+        service.reconciliation_repository.get_existing_ids.side_effect = Exception(
+            "db down"
+        )
+
+        result = service.bulk_save_annotations(
+            [{"reconciliation_id": str(uuid.uuid4()), "annotation": "x"}]
+        )
+
+        assert result == {
+            "success": False,
+            "error": "Failed to save annotations",
+            "data": None,
+        }
+
+
+class TestGetAnnotationsByReconciliationIds:
+    """Test cases for ReconAnnotationService.get_annotations_by_reconciliation_ids"""
+
+    @pytest.fixture
+    def service(self):
+        service = ReconAnnotationService(Mock(spec=Session))
+        service.annotation_repository = Mock()
+        return service
+
+    def test_groups_annotations_with_one_repository_call(self, service):
+        first, second = uuid.uuid4(), uuid.uuid4()
+        annotation = Mock()
+        annotation.serialize.return_value = {"Id": "a1"}
+        service.annotation_repository.get_by_reconciliation_ids.return_value = {
+            first: {"annotations": [annotation], "total_count": 3},
+            second: {"annotations": [], "total_count": 0},
+        }
+
+        result = service.get_annotations_by_reconciliation_ids(
+            [str(first), str(second), str(first)], limit_per_id=1
+        )
+
+        assert result["success"] is True
+        items = result["data"]["items"]
+        assert items[str(first)] == {"annotations": [{"Id": "a1"}], "total_count": 3}
+        assert items[str(second)] == {"annotations": [], "total_count": 0}
+        service.annotation_repository.get_by_reconciliation_ids.assert_called_once_with(
+            [first, second], limit_per_id=1, offset_per_id=0
+        )
+        service.db_session.query.assert_not_called()
+
+    @pytest.mark.parametrize(
+        "ids, kwargs",
+        [
+            ([], {}),
+            ("not-a-list", {}),
+            (["not-a-uuid"], {}),
+            ([str(uuid.uuid4())], {"limit_per_id": 0}),
+            ([str(uuid.uuid4())], {"offset_per_id": -1}),
+        ],
+    )
+    def test_invalid_requests(self, service, ids, kwargs):
+        result = service.get_annotations_by_reconciliation_ids(ids, **kwargs)
+
+        assert result["success"] is False
+        service.annotation_repository.get_by_reconciliation_ids.assert_not_called()
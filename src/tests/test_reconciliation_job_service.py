@@ -0,0 +1,323 @@
+import time
+import uuid
+from datetime import date, datetime, timedelta
+from unittest.mock import Mock, patch
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from src.enums.job_status_enum import JobStatusEnum
+from src.models.schema_ccs import ReconciliationJob
+from src.repositories.reconciliation_job_repository import ReconciliationJobRepository
+from src.repositories.reconciliation_repository import ReconciliationRepository
+from src.services.reconciliation_job_service import (
+    RECONCILIATION_JOB_STALE_SECONDS,
+    ReconciliationJobService,
+)
+from src.services.reconciliation_service import ReconciliationService
+
+
+@pytest.fixture
+def job():
+    return ReconciliationJob(
+        Id=uuid.uuid4(),
+        Status=JobStatusEnum.PENDING,
+        MatchMode="line",
+        ProcessedShards=0,
+        PhaseTimings={},
+        Summary={},
+    )
+
+
+@pytest.fixture
+def executor():
+    return Mock()
+
+
+@pytest.fixture
+def job_service(mock_db_session, executor, job):
+    service = ReconciliationJobService(mock_db_session, executor)
+    service.job_repository = Mock(spec=ReconciliationJobRepository)
+    service.job_repository.get_by_id.return_value = job
+    service.job_repository.create.return_value = job
+    service.job_repository.get_active_job.return_value = None
+    service.job_repository.expire_stale_jobs.return_value = []
+    service.reconciliation_repository = Mock(spec=ReconciliationRepository)
+    service.reconciliation_repository.get_source_flight_dates.return_value = [
+        date(2024, 1, 1),
+        date(2024, 1, 2),
+        None,
+    ]
+    service.reconciliation_repository.soft_delete_outside_flight_dates.return_value = 4
+    service.reconciliation_service = Mock(spec=ReconciliationService)
+    service.reconciliation_service.reconcile_flight_date.return_value = (
+        {"total_records": 2, "inserted_records": 1},
+        {"load": 0.5, "match": 0.25, "write": 1.0},
+    )
+    return service
+
+
+class TestRunJob:
+    """Test cases for ReconciliationJobService.run_job"""
+
+    def test_processes_every_shard_and_succeeds(
+        self, job_service, mock_db_session, job
+    ):
+        result = job_service.run_job(job.Id)
+
+        assert result["success"] is True
+        assert result["data"]["completed"] is True
+        assert job.Status == JobStatusEnum.SUCCEEDED
+        assert job.Shards == ["2024-01-01", "2024-01-02", None]
+        assert job.ProcessedShards == 3
+        assert job.Summary == {
+            "total_records": 6,
+            "inserted_records": 3,
+            "soft_deleted_records": 4,
+        }
+        assert job.PhaseTimings["write"] == 3.0
+        assert "plan" in job.PhaseTimings and "sweep" in job.PhaseTimings
+        reconciled = [
+            call.args[0]
+            for call in job_service.reconciliation_service.reconcile_flight_date.call_args_list
+        ]
+        assert reconciled == [date(2024, 1, 1), date(2024, 1, 2), None]
+        # planning, one commit per shard, and the final sweep
+        assert mock_db_session.commit.call_count == 5
+
+    def test_resumes_after_last_checkpoint(self, job_service, job):
+        job.Status = JobStatusEnum.FAILED
+        job.Shards = ["2024-01-01", "2024-01-02"]
+        job.ProcessedShards = 1
+
+        job_service.run_job(job.Id)
+
+        job_service.reconciliation_service.reconcile_flight_date.assert_called_once_with(
+            date(2024, 1, 2), match_mode="line"
+        )
+        job_service.reconciliation_repository.get_source_flight_dates.assert_not_called()
+        assert job.Status == JobStatusEnum.SUCCEEDED
+
+    def test_stops_at_deadline(self, job_service, job):
+        result = job_service.run_job(job.Id, deadline=time.monotonic() - 1)
+
+        assert result["success"] is True
+        assert result["data"]["completed"] is False
+        assert job.Status == JobStatusEnum.RUNNING
+        job_service.reconciliation_service.reconcile_flight_date.assert_not_called()
+
+    def test_busy_lock_leaves_job_untouched(self, job_service, job):
+        with patch(
+            "src.services.reconciliation_job_service.advisory_lock"
+        ) as mock_lock:
+            mock_lock.return_value.__enter__.return_value = False
+            result = job_service.run_job(job.Id, deadline=time.monotonic() + 5)
+
+        assert result["success"] is True
+        assert result["data"]["completed"] is False
+        assert job.Status == JobStatusEnum.PENDING
+        job_service.reconciliation_service.reconcile_flight_date.assert_not_called()
+        assert 0 < mock_lock.call_args.kwargs["timeout"] <= 5
+
+    def test_failure_keeps_checkpoint(self, job_service, mock_db_session, job):
+        job_service.reconciliation_service.reconcile_flight_date.side_effect = [
+            ({"total_records": 1}, {"load": 0.1}),
+            Exception("connection lost"),
+        ]
+
+        result = job_service.run_job(job.Id)
+
+        assert result["success"] is False
+        assert job.Status == JobStatusEnum.FAILED
+        assert job.Error == "connection lost"
+        assert job.ProcessedShards == 1
+        mock_db_session.rollback.assert_called_once()
+
+
+class TestStartJob:
+    """Test cases for starting and polling jobs"""
+
+    def test_start_job_submits_to_executor(self, job_service, executor, job):
+        result = job_service.start_job()
+
+        assert result["success"] is True
+        assert result["data"]["Status"] == "PENDING"
+        executor.submit.assert_called_once_with(job.Id)
+
+    def test_full_run_joins_active_full_run(self, job_service, executor, job):
+        job.FullRun = True
+        job.Status = JobStatusEnum.RUNNING
+        job_service.job_repository.get_active_job.return_value = job
+
+        result = job_service.start_job()
+
+        assert result["data"]["joined"] is True
+        assert result["data"]["Id"] == str(job.Id)
+        job_service.job_repository.create.assert_not_called()
+        executor.submit.assert_not_called()
+
+    def test_stale_jobs_are_expired_before_joining(self, job_service, executor, job):
+        stale_id = uuid.uuid4()
+        job_service.job_repository.expire_stale_jobs.return_value = [stale_id]
+
+        result = job_service.start_job()
+
+        job_service.job_repository.expire_stale_jobs.assert_called_once_with(
+            RECONCILIATION_JOB_STALE_SECONDS
+        )
+        job_service.job_repository.create.assert_called_once_with(
+            shards=None, match_mode="line"
+        )
+        assert result["data"]["Id"] == str(job.Id)
+        executor.submit.assert_called_once_with(job.Id)
+
+    def test_full_run_of_other_match_mode_does_not_join(
+        self, job_service, executor, job
+    ):
+        active_job = Mock(FullRun=True, MatchMode="line")
+        job_service.job_repository.get_active_job.return_value = active_job
+
+        job_service.start_job(match_mode="flight")
+
+        job_service.job_repository.create.assert_called_once_with(
+            shards=None, match_mode="flight"
+        )
+        executor.submit.assert_called_once_with(job.Id)
+
+    def test_start_job_rejects_unknown_match_mode(self, job_service, executor):
+        result = job_service.start_job(match_mode="invoice")
+
+        assert result["success"] is False
+        assert "Invalid match_mode" in result["error"]
+        executor.submit.assert_not_called()
+
+    def test_resume_rejects_succeeded_job(self, job_service, executor, job):
+        job.Status = JobStatusEnum.SUCCEEDED
+
+        result = job_service.resume_job(str(job.Id))
+
+        assert result["success"] is False
+        executor.submit.assert_not_called()
+
+    def test_status_of_unknown_job(self, job_service):
+        result = job_service.get_job_status("not-a-uuid")
+
+        assert result["success"] is False
+        assert result["error"] == "Job not found"
+        job_service.job_repository.get_by_id.assert_not_called()
+
+
+class TestTriggerDirtyDates:
+    """Test cases for the debounced dirty-date trigger"""
+
+    NOW = datetime(2024, 2, 1, 12, 0, 0)
+
+    def test_triggers_one_job_after_quiet_period(self, job_service, executor, job):
+        job_service.job_repository.get_dirty_date_window.return_value = (
+            self.NOW - timedelta(minutes=20),
+            self.NOW - timedelta(minutes=6),
+            self.NOW,
+        )
+        job_service.job_repository.get_active_job.return_value = None
+        job_service.job_repository.claim_dirty_dates.return_value = [
+            date(2024, 1, 30),
+            date(2024, 1, 31),
+        ]
+
+        result = job_service.trigger_dirty_dates()
+
+        assert result["data"]["triggered"] is True
+        job_service.job_repository.claim_dirty_dates.assert_called_once_with(
+            self.NOW - timedelta(minutes=6)
+        )
+        job_service.job_repository.create.assert_called_once_with(
+            shards=["2024-01-30", "2024-01-31"], match_mode="line"
+        )
+        executor.submit.assert_called_once_with(job.Id)
+
+    def test_waits_while_files_keep_arriving(self, job_service, executor):
+        job_service.job_repository.get_dirty_date_window.return_value = (
+            self.NOW - timedelta(minutes=10),
+            self.NOW - timedelta(minutes=1),
+            self.NOW,
+        )
+
+        result = job_service.trigger_dirty_dates()
+
+        assert result["data"]["triggered"] is False
+        job_service.job_repository.claim_dirty_dates.assert_not_called()
+        executor.submit.assert_not_called()
+
+    def test_max_delay_overrides_debounce(self, job_service):
+        job_service.job_repository.get_dirty_date_window.return_value = (
+            self.NOW - timedelta(hours=1),
+            self.NOW - timedelta(minutes=1),
+            self.NOW,
+        )
+        job_service.job_repository.get_active_job.return_value = None
+        job_service.job_repository.claim_dirty_dates.return_value = [date(2024, 1, 31)]
+
+        result = job_service.trigger_dirty_dates()
+
+        assert result["data"]["triggered"] is True
+
+    def test_waits_for_running_job(self, job_service):
+        job_service.job_repository.get_dirty_date_window.return_value = (
+            self.NOW - timedelta(minutes=20),
+            self.NOW - timedelta(minutes=6),
+            self.NOW,
+        )
+        job_service.job_repository.get_active_job.return_value = Mock()
+
+        result = job_service.trigger_dirty_dates()
+
+        assert result["data"]["triggered"] is False
+        job_service.job_repository.claim_dirty_dates.assert_not_called()
+        job_service.job_repository.expire_stale_jobs.assert_called_once_with(
+            RECONCILIATION_JOB_STALE_SECONDS
+        )
+
+    def test_date_scoped_job_skips_sweep(self, job_service, job):
+        job.Shards = ["2024-01-31"]
+        job.FullRun = False
+
+        job_service.run_job(job.Id)
+
+        assert job.Status == JobStatusEnum.SUCCEEDED
+        job_service.reconciliation_repository.soft_delete_outside_flight_dates.assert_not_called()
+
+    def test_flight_mode_job_uses_totals_on_every_shard(self, job_service, job):
+        job.Shards = ["2024-01-31"]
+        job.FullRun = False
+        job.MatchMode = "flight"
+        job_service.reconciliation_repository.rebuild_invoice_total_differences.return_value = (
+            7
+        )
+
+        job_service.run_job(job.Id)
+
+        job_service.reconciliation_service.reconcile_flight_date.assert_called_once_with(
+            date(2024, 1, 31), match_mode="flight"
+        )
+        assert job.Summary["invoice_total_differences"] == 7
+        assert job.Status == JobStatusEnum.SUCCEEDED
+
+
+class TestExpireStaleJobs:
+    """Test cases for ReconciliationJobRepository.expire_stale_jobs"""
+
+    def test_fails_open_jobs_without_recent_progress(self, mock_db_session):
+        stale_id = uuid.uuid4()
+        mock_db_session.execute.return_value = [Mock(Id=stale_id)]
+
+        job_ids = ReconciliationJobRepository(mock_db_session).expire_stale_jobs(60)
+
+        assert job_ids == [stale_id]
+        statement = mock_db_session.execute.call_args[0][0]
+        sql = str(statement.compile(dialect=postgresql.dialect()))
+        assert sql.startswith('UPDATE ccs."ReconciliationJob" SET "DataAtualizacao"')
+        assert (
+            'coalesce(ccs."ReconciliationJob"."DataAtualizacao", '
+            'ccs."ReconciliationJob"."DataCriacao") < LOCALTIMESTAMP - '
+        ) in sql
+        assert statement.compile().params["Status"] == JobStatusEnum.FAILED
@@ -0,0 +1,665 @@
+import uuid
+from datetime import date
+from unittest.mock import Mock, patch
+
+import pytest
+
+from src.enums.status_enum import StatusEnum
+
+
+class TestReviewFilters:
+    """Test cases for review-status filtering in get_paginated_reconciliation_data"""
+
+    def test_review_status_uses_summary_columns(
+        self,
+        reconciliation_service,
+        mock_reconciliation_repository,
+        sample_reconciliation_record,
+    ):
+        mock_reconciliation_repository.get_by_review.return_value = [
+            sample_reconciliation_record
+        ]
+        mock_reconciliation_repository.get_count_by_review.return_value = 1
+
+        result = reconciliation_service.get_paginated_reconciliation_data(
+            limit=10,
+            offset=0,
+            review_status="APPROVED",
+            sort_by="latest_annotation",
+            include_annotations=False,
+        )
+
+        no_other_filters = {
+            "start_date": None,
+            "end_date": None,
+            "flight_number": None,
+            "item_name": None,
+        }
+        mock_reconciliation_repository.get_by_review.assert_called_once_with(
+            "all", StatusEnum.APPROVED, None, True, 10, 0, **no_other_filters
+        )
+        mock_reconciliation_repository.get_count_by_review.assert_called_once_with(
+            "all", StatusEnum.APPROVED, None, **no_other_filters
+        )
+        sample_reconciliation_record.serialize.assert_called_once_with(
+            include_annotations=False
+        )
+        assert result["pagination"]["total"] == 1
+        assert result["filters"]["review_status"] == "APPROVED"
+
+    def test_has_annotations_without_status(
+        self, reconciliation_service, mock_reconciliation_repository
+    ):
+        mock_reconciliation_repository.get_by_review.return_value = []
+        mock_reconciliation_repository.get_count_by_review.return_value = 0
+
+        reconciliation_service.get_paginated_reconciliation_data(
+            filter_type="air_only", has_annotations=False
+        )
+
+        mock_reconciliation_repository.get_by_review.assert_called_once_with(
+            "air_only",
+            None,
+            False,
+            False,
+            100,
+            0,
+            start_date=None,
+            end_date=None,
+            flight_number=None,
+            item_name=None,
+        )
+        mock_reconciliation_repository.get_paginated.assert_not_called()
+
+    def test_review_filters_combine_with_other_filters(
+        self, reconciliation_service, mock_reconciliation_repository
+    ):
+        mock_reconciliation_repository.get_by_review.return_value = []
+        mock_reconciliation_repository.get_count_by_review.return_value = 0
+
+        result = reconciliation_service.get_paginated_reconciliation_data(
+            start_date="2024-01-01",
+            end_date="2024-01-31",
+            flight_number="TP0085",
+            item_name="Snack",
+            has_annotations=True,
+        )
+
+        other_filters = {
+            "start_date": date(2024, 1, 1),
+            "end_date": date(2024, 1, 31),
+            "flight_number": "TP0085",
+            "item_name": "Snack",
+        }
+        mock_reconciliation_repository.get_by_review.assert_called_once_with(
+            "all", None, True, False, 100, 0, **other_filters
+        )
+        mock_reconciliation_repository.get_count_by_review.assert_called_once_with(
+            "all", None, True, **other_filters
+        )
+        mock_reconciliation_repository.get_by_date_range.assert_not_called()
+        assert result["filters"]["flight_number"] == "TP0085"
+
+    def test_no_review_filters_keep_existing_path(
+        self, reconciliation_service, mock_reconciliation_repository
+    ):
+        mock_reconciliation_repository.get_paginated.return_value = []
+        mock_reconciliation_repository.get_count.return_value = 0
+
+        reconciliation_service.get_paginated_reconciliation_data()
+
+        mock_reconciliation_repository.get_paginated.assert_called_once_with(100, 0)
+        mock_reconciliation_repository.get_by_review.assert_not_called()
+
+
+class TestPopulateReconciliationTable:
+    """Test cases for the diff-based populate_reconciliation_table"""
+
+    @pytest.fixture
+    def source_rows(
+        self, mock_reconciliation_repository, sample_air_record, sample_catering_record
+    ):
+        mock_reconciliation_repository.stream_air_records.return_value = [
+            sample_air_record
+        ]
+        mock_reconciliation_repository.stream_catering_records.return_value = [
+            sample_catering_record
+        ]
+        return sample_air_record, sample_catering_record
+
+    def test_ids_are_derived_from_source_rows(
+        self, reconciliation_service, sample_air_record, sample_catering_record
+    ):
+        first = reconciliation_service._create_matched_reconciliation_record(
+            sample_air_record, sample_catering_record
+        )
+        second = reconciliation_service._create_matched_reconciliation_record(
+            sample_air_record, sample_catering_record
+        )
+        air_only = reconciliation_service._create_air_only_reconciliation_record(
+            sample_air_record
+        )
+
+        assert first["Id"] == second["Id"]
+        assert first["RowHash"] == second["RowHash"]
+        assert air_only["Id"] != first["Id"]
+
+    def test_row_hash_changes_with_amounts(
+        self, reconciliation_service, sample_air_record, sample_catering_record
+    ):
+        before = reconciliation_service._create_matched_reconciliation_record(
+            sample_air_record, sample_catering_record
+        )
+        sample_catering_record.TotalAmount = 2600.00
+        after = reconciliation_service._create_matched_reconciliation_record(
+            sample_air_record, sample_catering_record
+        )
+
+        assert before["Id"] == after["Id"]
+        assert before["RowHash"] != after["RowHash"]
+        assert after["DifPrice"] == "Yes"
+        assert after["AmountDif"] == "50.0"
+
+    def test_first_run_inserts_everything(
+        self, reconciliation_service, mock_reconciliation_repository, source_rows
+    ):
+        result = reconciliation_service.populate_reconciliation_table()
+
+        assert result["success"] is True
+        assert result["summary"]["matched_records"] == 1
+        assert result["summary"]["inserted_records"] == 1
+        inserted = mock_reconciliation_repository.insert_rows.call_args[0][0]
+        assert inserted[0]["DataCriacao"] is not None
+        mock_reconciliation_repository.update_rows.assert_called_once_with([])
+
+    def test_unchanged_rows_are_not_written(
+        self,
+        reconciliation_service,
+        mock_reconciliation_repository,
+        source_rows,
+    ):
+        air, cat = source_rows
+        expected = reconciliation_service._create_matched_reconciliation_record(
+            air, cat
+        )
+        vanished_id = uuid.uuid4()
+        mock_reconciliation_repository.get_row_states_by_flight_date.return_value = {
+            expected["Id"]: (expected["RowHash"], False, 0),
+            vanished_id: ("old", False, 0),
+        }
+
+        result = reconciliation_service.populate_reconciliation_table()
+
+        summary = result["summary"]
+        assert summary["unchanged_records"] == 1
+        assert summary["inserted_records"] == 0
+        assert summary["updated_records"] == 0
+        assert summary["soft_deleted_records"] == 1
+        mock_reconciliation_repository.get_row_states_by_flight_date.assert_called_once_with(
+            air.FlightDate
+        )
+        mock_reconciliation_repository.insert_rows.assert_called_once_with([])
+        deleted_ids = mock_reconciliation_repository.soft_delete_by_ids.call_args[0][0]
+        assert deleted_ids == [vanished_id]
+
+    def test_dates_gone_from_sources_are_swept(
+        self, reconciliation_service, mock_reconciliation_repository, source_rows
+    ):
+        mock_reconciliation_repository.soft_delete_outside_flight_dates.return_value = 3
+
+        result = reconciliation_service.populate_reconciliation_table()
+
+        assert result["summary"]["soft_deleted_records"] == 3
+
+    def test_soft_deleted_row_is_restored(
+        self,
+        reconciliation_service,
+        mock_reconciliation_repository,
+        source_rows,
+    ):
+        air, cat = source_rows
+        expected = reconciliation_service._create_matched_reconciliation_record(
+            air, cat
+        )
+        mock_reconciliation_repository.get_row_states_by_flight_date.return_value = {
+            expected["Id"]: (expected["RowHash"], True, 0)
+        }
+
+        result = reconciliation_service.populate_reconciliation_table()
+
+        assert result["summary"]["updated_records"] == 1
+        updated = mock_reconciliation_repository.update_rows.call_args[0][0]
+        assert updated[0]["Excluido"] is False
+
+    def test_groups_are_matched_and_written_per_flight_date(
+        self, reconciliation_service, mock_reconciliation_repository
+    ):
+        def source_row(row_id, flight_date, date_attr):
+            row = Mock(Id=row_id, Class="Y", Qty=1, TotalAmount=1.0)
+            setattr(row, date_attr, flight_date)
+            return row
+
+        mock_reconciliation_repository.stream_air_records.return_value = [
+            source_row("a1", date(2024, 1, 1), "FlightDate"),
+            source_row("a2", date(2024, 1, 3), "FlightDate"),
+            source_row("a3", None, "FlightDate"),
+        ]
+        mock_reconciliation_repository.stream_catering_records.return_value = [
+            source_row("c1", date(2024, 1, 1), "FltDate"),
+            source_row("c2", date(2024, 1, 2), "FltDate"),
+            source_row("c3", None, "FltDate"),
+        ]
+        groups = [
+            (flight_date, [row.Id for row in air], [row.Id for row in cat])
+            for flight_date, air, cat in reconciliation_service._iter_flight_date_groups()
+        ]
+        assert groups == [
+            (date(2024, 1, 1), ["a1"], ["c1"]),
+            (date(2024, 1, 2), [], ["c2"]),
+            (date(2024, 1, 3), ["a2"], []),
+            (None, ["a3"], ["c3"]),
+        ]
+
+        result = reconciliation_service.populate_reconciliation_table()
+
+        assert result["summary"]["total_records"] == 5
+        assert result["summary"]["matched_records"] == 1
+        assert result["summary"]["inserted_records"] == 5
+        assert mock_reconciliation_repository.insert_rows.call_count == 4
+        flight_dates = [date(2024, 1, 1), date(2024, 1, 2), date(2024, 1, 3), None]
+        assert [
+            call.args[0]
+            for call in mock_reconciliation_repository.get_row_states_by_flight_date.call_args_list
+        ] == flight_dates
+        assert mock_reconciliation_repository.soft_delete_by_ids.call_count == 4
+        sweep = mock_reconciliation_repository.soft_delete_outside_flight_dates
+        sweep.assert_called_once()
+        assert sweep.call_args[0][0] == flight_dates
+
+
+class TestMappedMatching:
+    """Test cases for FlightNumberMapping / FlightClassMapping aware matching"""
+
+    FLIGHT_DATE = date(2024, 3, 1)
+
+    def air(self, row_id, flight_no, flight_class):
+        return Mock(
+            Id=row_id,
+            FlightDate=self.FLIGHT_DATE,
+            FlightNo=flight_no,
+            FlightNoRed=None,
+            Class=flight_class,
+        )
+
+    def cat(self, row_id, flight_no, flight_class):
+        return Mock(
+            Id=row_id, FltDate=self.FLIGHT_DATE, FltNo=flight_no, Class=flight_class
+        )
+
+    def pairs(self, records):
+        return {
+            (record["AirFlightNo"], record.get("CatFltNo"))
+            for record in records
+            if record["Air"] == "Yes"
+        }
+
+    def test_mapped_flight_and_class_pick_the_right_row(
+        self, reconciliation_service, mock_reconciliation_repository
+    ):
+        mock_reconciliation_repository.get_flight_number_mappings.return_value = [
+            ("TP1001", "101"),
+            ("TP1002", "102"),
+        ]
+        mock_reconciliation_repository.get_flight_class_mappings.return_value = [
+            ("C", "J")
+        ]
+        air_rows = [self.air("a1", "TP1002", "c"), self.air("a2", "TP1001", "Y")]
+        cat_rows = [
+            self.cat("c1", "101", "Y"),
+            self.cat("c2", "102", "Y"),
+            self.cat("c3", "102", "J"),
+        ]
+
+        records, counts = reconciliation_service._match_reconciliation_records(
+            air_rows, cat_rows
+        )
+
+        assert self.pairs(records) == {("TP1002", "102"), ("TP1001", "101")}
+        assert counts["mapped_records"] == 2
+        assert counts["catering_only_records"] == 1
+
+    def test_mapped_flight_numbers_match_by_flight_key(
+        self, reconciliation_service, mock_reconciliation_repository
+    ):
+        mock_reconciliation_repository.get_flight_number_mappings.return_value = [
+            ("TP1001", "0101")
+        ]
+        air_rows = [self.air("a1", "TP1001", "Y")]
+        cat_rows = [self.cat("c1", "101", "Y")]
+        air_rows[0].Qty, air_rows[0].SubTotal = 2, "10.00"
+        cat_rows[0].Qty, cat_rows[0].TotalAmount = "2", "10.00"
+
+        records, counts = reconciliation_service._match_reconciliation_records(
+            air_rows, cat_rows
+        )
+        _, _, flight_counts = reconciliation_service._compare_flight_totals(
+            air_rows, cat_rows, reconciliation_service._load_match_mappings()
+        )
+
+        assert self.pairs(records) == {("TP1001", "101")}
+        assert counts["mapped_records"] == 1
+        assert flight_counts == {"reconciled_flights": 1, "discrepant_flights": 0}
+
+    def test_mapped_flight_does_not_fall_back_to_the_date(
+        self, reconciliation_service, mock_reconciliation_repository
+    ):
+        mock_reconciliation_repository.get_flight_number_mappings.return_value = [
+            ("TP1001", "101")
+        ]
+
+        records, counts = reconciliation_service._match_reconciliation_records(
+            [self.air("a1", "TP1001", "Y")], [self.cat("c1", "999", "Y")]
+        )
+
+        assert counts["matched_records"] == 0
+        assert counts["air_only_records"] == 1
+
+    def test_unmapped_flight_keeps_date_fallback(self, reconciliation_service):
+        records, counts = reconciliation_service._match_reconciliation_records(
+            [self.air("a1", "TP1001", "Y")], [self.cat("c1", "999", "J")]
+        )
+
+        assert counts["matched_records"] == 1
+        assert counts["mapped_records"] == 0
+
+    def test_lines_pair_by_item_code_within_the_flight(
+        self, reconciliation_service, mock_reconciliation_repository
+    ):
+        mock_reconciliation_repository.get_item_code_mappings.return_value = [
+            ("ML01", "10045")
+        ]
+        air_rows = [
+            self.air("a1", "TP1001", "Y"),
+            self.air("a2", "TP1001", "Y"),
+            self.air("a3", "TP1001", "Y"),
+        ]
+        air_rows[0].ServiceCode = "XX99"
+        air_rows[1].ServiceCode = "ML01"
+        air_rows[2].ServiceCode = "BV02"
+        cat_rows = [
+            self.cat("c1", "101", "Y"),
+            self.cat("c2", "101", "Y"),
+            self.cat("c3", "101", "Y"),
+        ]
+        cat_rows[0].AlBillCode, cat_rows[0].Itemcode = "BV02", None
+        cat_rows[1].AlBillCode, cat_rows[1].Itemcode = None, "10045"
+        cat_rows[2].AlBillCode, cat_rows[2].Itemcode = "ZZ00", None
+
+        records, counts = reconciliation_service._match_reconciliation_records(
+            air_rows, cat_rows
+        )
+
+        pairs = {
+            (record["AirServiceCode"], record["CatItemcode"] or record["CatAlBillCode"])
+            for record in records
+        }
+        assert pairs == {("XX99", "ZZ00"), ("ML01", "10045"), ("BV02", "BV02")}
+        assert counts["item_matched_records"] == 2
+        assert counts["matched_records"] == 3
+
+    def test_flight_mode_matches_only_discrepant_flights(
+        self, reconciliation_service, mock_reconciliation_repository
+    ):
+        air_rows = [
+            self.air("a1", "TP0101", "Y"),
+            self.air("a2", "TP0102", "Y"),
+        ]
+        cat_rows = [self.cat("c1", "101", "Y"), self.cat("c2", "102", "Y")]
+        for row in air_rows:
+            row.Qty, row.SubTotal = 10, "50.00"
+        cat_rows[0].Qty, cat_rows[0].TotalAmount = "10", "50.00"
+        cat_rows[1].Qty, cat_rows[1].TotalAmount = "12", "60.00"
+        mock_reconciliation_repository.stream_air_records.return_value = air_rows
+        mock_reconciliation_repository.stream_catering_records.return_value = cat_rows
+        result = reconciliation_service.populate_reconciliation_table(
+            match_mode="flight"
+        )
+
+        summary = result["summary"]
+        assert summary["reconciled_flights"] == 1
+        assert summary["discrepant_flights"] == 1
+        assert summary["total_records"] == 1
+        inserted = mock_reconciliation_repository.insert_rows.call_args[0][0]
+        assert inserted[0]["AirFlightNo"] == "TP0102"
+        mock_reconciliation_repository.rebuild_invoice_total_differences.assert_called_once()
+
+    def test_flight_mode_shard_keeps_annotated_lines(
+        self, reconciliation_service, mock_reconciliation_repository
+    ):
+        air = self.air("a1", "TP0101", "Y")
+        air.Qty, air.SubTotal = 10, "50.00"
+        cat = self.cat("c1", "101", "Y")
+        cat.Qty, cat.TotalAmount = "10", "50.00"
+        mock_reconciliation_repository.get_air_records_by_flight_date.return_value = [
+            air
+        ]
+        mock_reconciliation_repository.get_catering_records_by_flight_date.return_value = [
+            cat
+        ]
+        annotated_id, plain_id = uuid.uuid4(), uuid.uuid4()
+        mock_reconciliation_repository.get_row_states_by_flight_date.return_value = {
+            annotated_id: ("hash", False, 2),
+            plain_id: ("hash", False, 0),
+        }
+
+        summary, _ = reconciliation_service.reconcile_flight_date(
+            self.FLIGHT_DATE, match_mode="flight"
+        )
+
+        assert summary["reconciled_flights"] == 1
+        assert summary["total_records"] == 0
+        assert summary["soft_deleted_records"] == 1
+        assert summary["kept_annotated_records"] == 1
+        mock_reconciliation_repository.soft_delete_by_ids.assert_called_once()
+        assert mock_reconciliation_repository.soft_delete_by_ids.call_args[0][0] == [
+            plain_id
+        ]
+
+    def test_invalid_match_mode(self, reconciliation_service, mock_db_session):
+        result = reconciliation_service.populate_reconciliation_table(
+            match_mode="invoice"
+        )
+
+        assert result["success"] is False
+        assert "Invalid match_mode" in result["message"]
+
+
+class TestInvoiceTotalDifferences:
+    """Test cases for the BillingInvoiceTotalDifference computation and listing"""
+
+    def test_refresh_rebuilds_and_commits(
+        self, reconciliation_service, mock_reconciliation_repository, mock_db_session
+    ):
+        mock_reconciliation_repository.rebuild_invoice_total_differences.return_value = (
+            12
+        )
+
+        result = reconciliation_service.refresh_invoice_total_differences()
+
+        assert result["success"] is True
+        assert result["summary"]["invoice_total_differences"] == 12
+        mock_db_session.commit.assert_called_once()
+
+    def test_refresh_failure_rolls_back(
+        self, reconciliation_service, mock_reconciliation_repository, mock_db_session
+    ):
+        mock_reconciliation_repository.rebuild_invoice_total_differences.side_effect = (
+            Exception("boom")
+        )
+
+        result = reconciliation_service.refresh_invoice_total_differences()
+
+        assert result["success"] is False
+        mock_db_session.rollback.assert_called_once()
+        mock_db_session.commit.assert_not_called()
+
+    def test_largest_differences_are_paginated(
+        self, reconciliation_service, mock_reconciliation_repository
+    ):
+        record = Mock()
+        record.serialize.return_value = {"FltInv": "INV-1"}
+        repository = mock_reconciliation_repository
+        repository.get_largest_invoice_total_differences.return_value = [record]
+        repository.get_invoice_total_differences_count.return_value = 3
+
+        result = reconciliation_service.get_largest_invoice_total_differences(
+            limit=1, offset=0
+        )
+
+        assert result["data"] == [{"FltInv": "INV-1"}]
+        assert result["pagination"]["has_more"] is True
+        repository.get_largest_invoice_total_differences.assert_called_once_with(
+            limit=1, offset=0
+        )
+
+
+class TestSwapPublish:
+    """Test cases for the shadow-table swap publish mode"""
+
+    @pytest.fixture
+    def source_rows(
+        self, mock_reconciliation_repository, sample_air_record, sample_catering_record
+    ):
+        mock_reconciliation_repository.stream_air_records.return_value = [
+            sample_air_record
+        ]
+        mock_reconciliation_repository.stream_catering_records.return_value = [
+            sample_catering_record
+        ]
+        return sample_air_record, sample_catering_record
+
+    def test_swap_builds_staging_before_touching_live_table(
+        self,
+        reconciliation_service,
+        mock_reconciliation_repository,
+        mock_db_session,
+        source_rows,
+    ):
+        calls = Mock()
+        calls.attach_mock(mock_reconciliation_repository, "repository")
+        calls.attach_mock(mock_db_session.commit, "commit")
+        mock_reconciliation_repository.publish_staging_table.return_value = 2
+
+        result = reconciliation_service.populate_reconciliation_table(
+            publish_mode="swap"
+        )
+
+        assert result["success"] is True
+        assert result["summary"]["published_records"] == 1
+        assert result["summary"]["carried_over_records"] == 2
+        steps = [
+            call[0]
+            for call in calls.mock_calls
+            if not call[0].startswith("repository.session")
+        ]
+        assert steps == [
+            "repository.create_staging_table",
+            "repository.get_flight_number_mappings",
+            "repository.get_flight_class_mappings",
+            "repository.get_item_code_mappings",
+            "repository.stream_air_records",
+            "repository.stream_catering_records",
+            "repository.insert_staging_rows",
+            "repository.finalize_staging_table",
+            "commit",
+            "repository.publish_staging_table",
+            "commit",
+            "repository.validate_annotation_foreign_keys",
+            "commit",
+            "commit",
+        ]
+        mock_reconciliation_repository.get_row_states_by_flight_date.assert_not_called()
+
+    def test_failed_swap_rolls_back(
+        self,
+        reconciliation_service,
+        mock_reconciliation_repository,
+        mock_db_session,
+        source_rows,
+    ):
+        mock_reconciliation_repository.publish_staging_table.side_effect = Exception(
+            "lock timeout"
+        )
+
+        result = reconciliation_service.populate_reconciliation_table(
+            publish_mode="swap"
+        )
+
+        assert result["success"] is False
+        mock_db_session.rollback.assert_called_once()
+        mock_reconciliation_repository.validate_annotation_foreign_keys.assert_not_called()
+
+    def test_invalid_publish_mode(self, reconciliation_service, mock_db_session):
+        result = reconciliation_service.populate_reconciliation_table(
+            publish_mode="replace"
+        )
+
+        assert result["success"] is False
+        assert "Invalid publish_mode" in result["message"]
+        mock_db_session.query.assert_not_called()
+
+    def test_rollback_restores_previous_version(
+        self, reconciliation_service, mock_reconciliation_repository
+    ):
+        mock_reconciliation_repository.restore_previous_table.return_value = 0
+
+        result = reconciliation_service.rollback_reconciliation_publish()
+
+        assert result["success"] is True
+        mock_reconciliation_repository.validate_annotation_foreign_keys.assert_called_once()
+
+
+class TestRunLock:
+    """Test cases for serializing populate runs with the advisory lock"""
+
+    @pytest.fixture
+    def lock(self):
+        with patch("services.reconciliation_service.advisory_lock") as mock_lock:
+            yield mock_lock
+
+    def test_skip_returns_when_lock_is_held(
+        self, reconciliation_service, mock_db_session, lock
+    ):
+        lock.return_value.__enter__.return_value = False
+
+        result = reconciliation_service.populate_reconciliation_table(
+            on_conflict="skip"
+        )
+
+        assert result["success"] is False
+        assert result["skipped"] is True
+        assert lock.call_count == 1
+        assert lock.call_args.kwargs["wait"] is False
+        mock_db_session.query.assert_not_called()
+
+    def test_join_waits_without_recomputing(
+        self, reconciliation_service, mock_db_session, lock
+    ):
+        lock.return_value.__enter__.side_effect = [False, True]
+
+        result = reconciliation_service.populate_reconciliation_table(
+            on_conflict="join"
+        )
+
+        assert result["success"] is True
+        assert result["joined"] is True
+        assert lock.call_count == 2
+        mock_db_session.query.assert_not_called()
+
+    def test_invalid_on_conflict(self, reconciliation_service, lock):
+        result = reconciliation_service.populate_reconciliation_table(
+            on_conflict="queue"
+        )
+
+        assert result["success"] is False
+        lock.assert_not_called()
@@ -0,0 +1,60 @@
+import tracemalloc
+
+import pytest
+
+from src.common.stage_metrics import StageMetrics
+
+
+class TestStageMetrics:
+    """Test cases for per-stage ingestion metrics"""
+
+    def test_stage_records_time_rows_bytes_and_memory(self):
+        metrics = StageMetrics(trace_memory=False)
+
+        with metrics.stage("parse", bytes=2048):
+            pass
+        metrics.count("parse", rows=10)
+
+        stage = metrics.as_dict()["parse"]
+        assert stage["rows"] == 10
+        assert stage["bytes"] == 2048
+        assert stage["seconds"] >= 0
+        assert stage["peak_rss_mb"] > 0
+        assert "traced_peak_mb" not in stage
+
+    def test_repeated_stage_adds_up(self):
+        metrics = StageMetrics(trace_memory=False)
+
+        for rows in (3, 4):
+            with metrics.stage("write", rows=rows):
+                pass
+
+        assert metrics.as_dict()["write"]["rows"] == 7
+        assert list(metrics.timings()) == ["write"]
+
+    def test_failed_stage_is_still_recorded(self):
+        metrics = StageMetrics(trace_memory=False)
+
+        with pytest.raises(ValueError):
+            with metrics.stage("commit"):
+                raise ValueError("connection lost")
+
+        assert "commit" in metrics.timings()
+
+    def test_iterate_times_each_step(self):
+        metrics = StageMetrics(trace_memory=False)
+
+        assert list(metrics.iterate("parse", [1, 2, 3])) == [1, 2, 3]
+        assert "parse" in metrics.timings()
+
+    def test_traces_python_allocations(self):
+        metrics = StageMetrics(trace_memory=True)
+
+        try:
+            with metrics.stage("normalize"):
+                values = [str(value) for value in range(100000)]
+        finally:
+            tracemalloc.stop()
+
+        assert len(values) == 100000
+        assert metrics.as_dict()["normalize"]["traced_peak_mb"] > 0